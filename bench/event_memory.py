@@ -0,0 +1,69 @@
+"""Memory of the event model: slotted objects vs. the dicts they replaced.
+
+Run from the repository root:
+
+    python bench/event_memory.py [--events 20000]
+
+Parses a synthetic feed and measures with tracemalloc what keeping its
+events costs, once as ParsedEvent/EventView objects and once as the
+dict-per-event representation used before (a dict of the parsed fields per
+event, and a ~20 key dict with pre-rendered strings per selected event).
+"""
+import argparse
+import datetime
+import os
+import sys
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+sys.path.insert(0, HERE)
+
+import pytz  # noqa: E402
+
+from fallback_parse import make_feed  # noqa: E402
+from service import _fallback_parse, enrich_and_filter  # noqa: E402
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def legacy_enriched(view):
+    # What _enrich used to return for every selected event.
+    d = view.to_dict()
+    d['start_dt'] = view.start_local
+    d['end_dt'] = view.end_local
+    return d
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=20000, help='events in the synthetic feed')
+    args = parser.parse_args()
+
+    events = _fallback_parse(make_feed(args.events))
+    now = datetime.datetime(2028, 1, 1, tzinfo=pytz.utc)
+    tz = pytz.timezone('Europe/Berlin')
+
+    rows = []
+    _, slotted = measure(lambda: [type(ev).from_row(ev.row()) for ev in events])
+    _, dicts = measure(lambda: [dict(ev.items()) for ev in events])
+    rows.append(('parsed events', slotted, dicts))
+
+    views, slotted = measure(lambda: enrich_and_filter(events, now, tz))
+    _, dicts = measure(lambda: [legacy_enriched(v) for v in views])
+    rows.append(('selected events', slotted, dicts))
+
+    print("{0:<16} {1:>12} {2:>12} {3:>8}".format("", "slotted B/ev", "dicts B/ev", "ratio"))
+    for name, new, old in rows:
+        print("{0:<16} {1:>12.0f} {2:>12.0f} {3:>7.2f}x".format(
+            name, new / len(events), old / len(events), old / new))
+
+
+if __name__ == '__main__':
+    main()
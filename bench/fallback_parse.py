@@ -0,0 +1,67 @@
+"""Throughput of the fallback ICS parser on growing feeds.
+
+Run from the repository root:
+
+    python bench/fallback_parse.py [--max-mb 8]
+
+Prints the cost per event for feeds of doubling size. The parser is a
+single pass over the input, so the per-event cost should stay flat as the
+feed grows; a steadily rising column points at accidental quadratic work.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from service import _fallback_parse  # noqa: E402
+
+EVENT = (
+    "BEGIN:VEVENT\r\n"
+    "UID:event-{i}@bench\r\n"
+    "SUMMARY:Benchmark event number {i} with a reasonably long title\r\n"
+    "DESCRIPTION:Line one of a description\\nthat is long enough to be folde\r\n"
+    " d across two physical lines\\, like real feeds do\r\n"
+    "LOCATION:Room {room}\r\n"
+    "DTSTART;TZID=Europe/Berlin:2028{month:02d}{day:02d}T{hour:02d}0000\r\n"
+    "DTEND;TZID=Europe/Berlin:2028{month:02d}{day:02d}T{hour:02d}3000\r\n"
+    "BEGIN:VALARM\r\nACTION:DISPLAY\r\nDESCRIPTION:Reminder\r\nTRIGGER:-PT15M\r\nEND:VALARM\r\n"
+    "END:VEVENT\r\n"
+)
+
+
+def make_feed(count: int) -> str:
+    parts = ["BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"]
+    for i in range(count):
+        parts.append(EVENT.format(i=i, room=i % 50, month=i % 12 + 1, day=i % 28 + 1, hour=i % 24))
+    parts.append("END:VCALENDAR\r\n")
+    return "".join(parts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-mb', type=float, default=8.0, help='largest feed size to try')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per size, best is reported')
+    args = parser.parse_args()
+
+    print("{0:>8} {1:>9} {2:>10} {3:>10} {4:>9}".format("events", "size MB", "best s", "us/event", "MB/s"))
+    count = 1000
+    while True:
+        text = make_feed(count)
+        size_mb = len(text) / 1e6
+        if size_mb > args.max_mb:
+            break
+        best = float('inf')
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            events = _fallback_parse(text)
+            best = min(best, time.perf_counter() - started)
+        assert len(events) == count
+        print("{0:>8} {1:>9.2f} {2:>10.3f} {3:>10.1f} {4:>9.1f}".format(
+            count, size_mb, best, best / count * 1e6, size_mb / best))
+        count *= 2
+
+
+if __name__ == '__main__':
+    main()
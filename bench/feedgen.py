@@ -0,0 +1,139 @@
+"""Deterministic synthetic ICS feeds for the benchmarks.
+
+``generate`` builds a feed from a handful of knobs that drive the cost of
+the pipeline: number of VEVENTs, how many of them recur (and how densely),
+EXDATEs and RECURRENCE-ID overrides per series, the mix of TZID styles,
+line folding and the size of the free text. The same arguments always
+produce the same bytes, so timings from different runs (and machines) are
+comparable.
+
+All events lie around ``BASE``, a fixed date; benchmarks use it as "now".
+"""
+import datetime
+import random
+from typing import Sequence
+
+BASE = datetime.datetime(2030, 1, 7, 12, 0)
+
+# How a DTSTART/DTEND is written: plain UTC, IANA TZID, Windows TZID (as
+# Outlook does), a custom TZID with its own VTIMEZONE, floating and all-day.
+ZONE_STYLES = ('utc', 'iana', 'windows', 'custom', 'floating', 'date')
+
+_IANA = ('Europe/Berlin', 'America/New_York', 'Asia/Tokyo', 'Australia/Sydney')
+_WINDOWS = ('W. Europe Standard Time', 'Eastern Standard Time', 'Tokyo Standard Time')
+_CUSTOM = 'Bench Custom Time'
+_CUSTOM_VTIMEZONE = (
+    "BEGIN:VTIMEZONE\r\nTZID:{0}\r\n"
+    "BEGIN:STANDARD\r\nDTSTART:19701025T030000\r\nRRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU\r\n"
+    "TZOFFSETFROM:+0200\r\nTZOFFSETTO:+0100\r\nEND:STANDARD\r\n"
+    "BEGIN:DAYLIGHT\r\nDTSTART:19700329T020000\r\nRRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU\r\n"
+    "TZOFFSETFROM:+0100\r\nTZOFFSETTO:+0200\r\nEND:DAYLIGHT\r\n"
+    "END:VTIMEZONE\r\n"
+).format(_CUSTOM)
+_RULES = ('FREQ=DAILY', 'FREQ=WEEKLY', 'FREQ=WEEKLY;BYDAY=MO,WE,FR', 'FREQ=MONTHLY;BYMONTHDAY=15')
+_WORDS = ('planning', 'review', 'sync', 'standup', 'budget', 'launch', 'retro', 'design', 'hiring', 'offsite')
+
+
+def _fold(line: str) -> str:
+    # RFC 5545: at most 75 octets per line, continuation lines start with a space.
+    if len(line) <= 75:
+        return line + "\r\n"
+    parts = [line[:75]]
+    rest = line[75:]
+    while rest:
+        parts.append(" " + rest[:74])
+        rest = rest[74:]
+    return "\r\n".join(parts) + "\r\n"
+
+
+def _when(name: str, dt: datetime.datetime, style: str, index: int) -> str:
+    if style == 'utc':
+        return "{0}:{1:%Y%m%dT%H%M%S}Z".format(name, dt)
+    if style == 'iana':
+        return "{0};TZID={1}:{2:%Y%m%dT%H%M%S}".format(name, _IANA[index % len(_IANA)], dt)
+    if style == 'windows':
+        return "{0};TZID=\"{1}\":{2:%Y%m%dT%H%M%S}".format(name, _WINDOWS[index % len(_WINDOWS)], dt)
+    if style == 'custom':
+        return "{0};TZID=\"{1}\":{2:%Y%m%dT%H%M%S}".format(name, _CUSTOM, dt)
+    if style == 'date':
+        return "{0};VALUE=DATE:{1:%Y%m%d}".format(name, dt)
+    return "{0}:{1:%Y%m%dT%H%M%S}".format(name, dt)
+
+
+def _text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    text = " ".join(words)[:size]
+    # Something to unescape, like real descriptions.
+    return text.replace(" review", "\\, review").replace(" launch", "\\nlaunch")
+
+
+def generate(events: int = 1000, recurring: float = 0.1, occurrences: int = 52, exdates: int = 0,
+             overrides: int = 0, zones: Sequence[str] = ('utc', 'iana'), fold: bool = True,
+             description_bytes: int = 120, seed: int = 1) -> str:
+    """A feed with ``events`` VEVENTs.
+
+    A ``recurring`` fraction of them are series with an RRULE limited to
+    ``occurrences`` instances, each with ``exdates`` EXDATEs and
+    ``overrides`` RECURRENCE-ID exceptions (extra VEVENTs, not counted in
+    ``events``). Start times are spread over a year around ``BASE`` and
+    written in the ``zones`` styles in turn.
+    """
+    rng = random.Random(seed)
+    zones = tuple(zones) or ('utc',)
+    emit = _fold if fold else (lambda line: line + "\r\n")
+    out = ["BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//glance-ical-events//bench//EN\r\n"]
+    if 'custom' in zones:
+        out.append(_CUSTOM_VTIMEZONE)
+    stamp = "DTSTAMP:{0:%Y%m%dT%H%M%S}Z".format(BASE)
+    for i in range(events):
+        style = zones[i % len(zones)]
+        start = (BASE + datetime.timedelta(minutes=rng.randrange(-180 * 24 * 4, 180 * 24 * 4) * 15)).replace(second=0)
+        if style == 'date':
+            start = start.replace(hour=0, minute=0)
+            end = start + datetime.timedelta(days=1)
+        else:
+            end = start + datetime.timedelta(minutes=rng.choice((15, 30, 60, 90, 120)))
+        uid = "bench-{0}-{1}@glance-ical-events".format(seed, i)
+        lines = [
+            "BEGIN:VEVENT",
+            "UID:" + uid,
+            stamp,
+            _when("DTSTART", start, style, i),
+            _when("DTEND", end, style, i),
+            "SUMMARY:{0} {1} #{2}".format(rng.choice(_WORDS).title(), rng.choice(_WORDS), i),
+            "DESCRIPTION:" + _text(rng, description_bytes),
+            "LOCATION:Room {0}".format(rng.randrange(100)),
+            "STATUS:CONFIRMED",
+        ]
+        is_series = rng.random() < recurring
+        rule = rng.choice(_RULES)
+        if is_series:
+            lines.append("RRULE:{0};COUNT={1}".format(rule, occurrences))
+            step = datetime.timedelta(days=1 if rule == 'FREQ=DAILY' else 7)
+            for k in range(exdates):
+                lines.append(_when("EXDATE", start + step * (2 * k + 1), style, i))
+        lines.append("END:VEVENT")
+        out.extend(emit(line) for line in lines)
+        if is_series:
+            step = datetime.timedelta(days=1 if rule == 'FREQ=DAILY' else 7)
+            for k in range(overrides):
+                original = start + step * (2 * k + 2)
+                moved = original + datetime.timedelta(hours=1)
+                override = [
+                    "BEGIN:VEVENT",
+                    "UID:" + uid,
+                    stamp,
+                    _when("RECURRENCE-ID", original, style, i),
+                    _when("DTSTART", moved, style, i),
+                    _when("DTEND", moved + (end - start), style, i),
+                    "SUMMARY:Moved occurrence of #{0}".format(i),
+                    "END:VEVENT",
+                ]
+                out.extend(emit(line) for line in override)
+    out.append("END:VCALENDAR\r\n")
+    return "".join(out)
@@ -0,0 +1,172 @@
+"""A local HTTP stand-in for calendar servers.
+
+Serves ICS bodies from memory, with ``ETag`` / ``If-None-Match`` support,
+so the fetch path (urllib3 pool, streaming read, conditional GET) runs for
+real without touching the network. Misbehaving calendar servers can be
+imitated per feed with a ``Fault``: a delay before the answer, a body that
+trickles in over several seconds, or a share of 5xx answers.
+
+It can also run on its own, serving synthetic feeds (``/feed-0.ics`` ...),
+e.g. for a service running in Docker:
+
+    python bench/ics_server.py --port 9000 --feeds 20 --latency 0.5 --error-rate 0.05
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional
+
+
+class Fault:
+    """How a feed misbehaves: ``latency`` seconds before the headers,
+    ``drip`` seconds over which the body is sent in ``drip_chunks`` pieces,
+    and the fraction ``error_rate`` of requests answered with a 503."""
+
+    __slots__ = ('latency', 'drip', 'drip_chunks', 'error_rate')
+
+    def __init__(self, latency: float = 0.0, drip: float = 0.0, drip_chunks: int = 20, error_rate: float = 0.0):
+        self.latency = latency
+        self.drip = drip
+        self.drip_chunks = drip_chunks
+        self.error_rate = error_rate
+
+    def __repr__(self) -> str:
+        return 'Fault(latency={0}, drip={1}, error_rate={2})'.format(self.latency, self.drip, self.error_rate)
+
+
+NO_FAULT = Fault()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: 'FeedServer'
+
+    def do_GET(self) -> None:
+        path = self.path.split('?', 1)[0]
+        body = self.server.feeds.get(path)
+        if body is None:
+            self._answer(404, path)
+            self.send_error(404)
+            return
+        fault = self.server.faults.get(path, self.server.default_fault)
+        if fault.latency > 0:
+            time.sleep(fault.latency)
+        if fault.error_rate > 0 and self.server.roll() < fault.error_rate:
+            self._answer(503, path)
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        etag = '"{0}"'.format(hashlib.sha1(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self._answer(304, path)
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._answer(200, path, len(body))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/calendar; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        if fault.drip > 0:
+            step = -(-len(body) // max(1, fault.drip_chunks))
+            for i in range(0, len(body), step):
+                self.wfile.write(body[i:i + step])
+                self.wfile.flush()
+                time.sleep(fault.drip / max(1, fault.drip_chunks))
+        else:
+            self.wfile.write(body)
+
+    def _answer(self, status: int, path: str, size: int = 0) -> None:
+        with self.server.lock:
+            self.server.statuses[status] += 1
+            self.server.per_feed[path] += 1
+            self.server.bytes_sent += size
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class FeedServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, feeds: Dict[str, bytes], faults: Optional[Dict[str, Fault]] = None,
+                 default_fault: Fault = NO_FAULT, host: str = '127.0.0.1', port: int = 0, seed: int = 1):
+        super().__init__((host, port), _Handler)
+        self.feeds = feeds
+        self.faults = faults or {}
+        self.default_fault = default_fault
+        self.lock = threading.Lock()
+        self.statuses: Counter = Counter()
+        self.per_feed: Counter = Counter()
+        self.bytes_sent = 0
+        self._rng = random.Random(seed)
+
+    def roll(self) -> float:
+        with self.lock:
+            return self._rng.random()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return 'http://{0}:{1}'.format('127.0.0.1' if host in ('0.0.0.0', '') else host, port)
+
+    def requests(self) -> int:
+        with self.lock:
+            return sum(self.statuses.values())
+
+
+@contextmanager
+def serve(feeds: Dict[str, bytes], faults: Optional[Dict[str, Fault]] = None,
+          default_fault: Fault = NO_FAULT, host: str = '127.0.0.1', port: int = 0) -> Iterator[FeedServer]:
+    """Run a FeedServer for ``feeds`` (path -> body) in a background thread."""
+    server = FeedServer(feeds, faults, default_fault, host, port)
+    thread = threading.Thread(target=server.serve_forever, name='bench-ics-server', daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main() -> None:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import feedgen
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--feeds', type=int, default=20, help='number of feeds, /feed-0.ics ...')
+    parser.add_argument('--events', type=int, default=300, help='VEVENTs per feed')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each answer')
+    parser.add_argument('--drip', type=float, default=0.0, help='seconds over which each body is sent')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 503 answers')
+    args = parser.parse_args()
+
+    feeds = {'/feed-{0}.ics'.format(i): feedgen.generate(events=args.events, seed=i).encode('utf-8')
+             for i in range(args.feeds)}
+    fault = Fault(latency=args.latency, drip=args.drip, error_rate=args.error_rate)
+    with serve(feeds, default_fault=fault, host=args.host, port=args.port) as server:
+        print("Serving {0} feeds at {1}/feed-N.ics with {2}".format(len(feeds), server.base_url, fault))
+        try:
+            while True:
+                time.sleep(10)
+                print("upstream answers: {0}".format(dict(server.statuses)))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
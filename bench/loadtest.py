@@ -0,0 +1,320 @@
+"""Load test: many Glance dashboards polling ``/events``.
+
+Run from the repository root:
+
+    python bench/loadtest.py --spawn                     # start gunicorn like the dockerfile does
+    python bench/loadtest.py --spawn --scenario flaky --duration 120
+    python bench/loadtest.py --target http://127.0.0.1:8076 --feed-base http://host.docker.internal:9000
+
+A scenario is ``dashboards`` x ``widgets`` widgets. Every widget asks for a
+few feeds (merged when more than one) from a shared pool with a ``limit``,
+and polls again whenever its Glance ``cache:`` interval runs out. Popular
+feeds are shared by many widgets, as on real installations. The feeds come
+from a local mock calendar server (``ics_server``) on which some of them
+can be slow, drip their body or answer with 5xx errors.
+
+Real intervals are minutes long, so time is compressed by ``--time-scale``
+(60: a ``cache: 5m`` widget polls every 5 seconds). With ``--spawn`` the
+server's ``ICAL_FEED_CACHE_TTL`` and ``ICAL_RESPONSE_CACHE_BUCKET`` are
+compressed by the same factor, so the ratio of polls to upstream requests
+stays realistic. For a server started separately, set them yourself.
+
+The report has throughput, latency percentiles, errors by kind and the
+upstream amplification: how many requests reached the calendar servers per
+``/events`` request and per feed a widget asked for.
+"""
+import argparse
+import heapq
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, '..', 'src')
+sys.path.insert(0, SRC)
+sys.path.insert(0, HERE)
+
+import urllib3  # noqa: E402
+
+import config  # noqa: E402
+import feedgen  # noqa: E402
+from ics_server import FeedServer, Fault, serve  # noqa: E402
+
+# Misbehaving calendar servers a scenario can mix in.
+FAULTS: Dict[str, Fault] = {
+    'slow': Fault(latency=2.0),
+    'drip': Fault(drip=8.0),
+    'flaky': Fault(error_rate=0.5),
+}
+
+_TEAM = dict(dashboards=40, widgets=3, intervals=(300, 300, 900, 3600), limits=(5, 10, 10, 20),
+             feeds_per_widget=(1, 1, 1, 2, 3), pool=20, events=400, faults={})
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    'homelab': dict(dashboards=3, widgets=2, intervals=(300, 900, 3600), limits=(5, 10),
+                    feeds_per_widget=(1, 2), pool=4, events=300, faults={}),
+    'team': _TEAM,
+    'slow-upstream': dict(_TEAM, faults={'slow': 0.3}),
+    'drip': dict(_TEAM, faults={'drip': 0.2}),
+    'flaky': dict(_TEAM, faults={'flaky': 0.3}),
+    'mixed': dict(_TEAM, faults={'slow': 0.1, 'drip': 0.1, 'flaky': 0.1}),
+    'storm': dict(_TEAM, dashboards=150, widgets=4, intervals=(60, 300)),
+}
+
+
+class Widget:
+    __slots__ = ('query', 'interval', 'feeds')
+
+    def __init__(self, query: str, interval: float, feeds: int):
+        self.query = query
+        self.interval = interval
+        self.feeds = feeds
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def build_feeds(scenario: Dict[str, Any], rng: random.Random) -> Tuple[Dict[str, bytes], Dict[str, Fault]]:
+    """The feed pool (path -> body) and the faults of the misbehaving ones."""
+    paths = ['/feed-{0}.ics'.format(i) for i in range(scenario['pool'])]
+    feeds = {path: feedgen.generate(events=scenario['events'], seed=i).encode('utf-8')
+             for i, path in enumerate(paths)}
+    faults: Dict[str, Fault] = {}
+    shuffled = list(paths)
+    rng.shuffle(shuffled)
+    for name, share in sorted(scenario['faults'].items()):
+        for _ in range(max(1, int(round(share * len(paths))))):
+            if shuffled:
+                faults[shuffled.pop()] = FAULTS[name]
+    return feeds, faults
+
+
+def build_widgets(scenario: Dict[str, Any], feed_base: str, time_scale: float, rng: random.Random) -> List[Widget]:
+    paths = ['/feed-{0}.ics'.format(i) for i in range(scenario['pool'])]
+    # Zipf-like popularity: a few calendars (holidays, the team calendar)
+    # are on most dashboards.
+    weights = [1.0 / (i + 1) for i in range(len(paths))]
+    widgets = []
+    for _ in range(scenario['dashboards'] * scenario['widgets']):
+        count = min(len(paths), rng.choice(scenario['feeds_per_widget']))
+        chosen: List[str] = []
+        while len(chosen) < count:
+            path = rng.choices(paths, weights)[0]
+            if path not in chosen:
+                chosen.append(path)
+        params: List[Tuple[str, Any]] = [('url', feed_base + p) for p in chosen]
+        if count > 1:
+            params += [('label', p.strip('/').split('.')[0]) for p in chosen]
+        params.append(('limit', rng.choice(scenario['limits'])))
+        interval = rng.choice(scenario['intervals']) / time_scale
+        widgets.append(Widget('/events?' + urlencode(params), interval, count))
+    return widgets
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.lags: List[float] = []
+        self.outcomes: Counter = Counter()
+        self.feeds_asked = 0
+
+    def add(self, outcome: str, latency: float, lag: float, feeds: int) -> None:
+        with self.lock:
+            self.outcomes[outcome] += 1
+            self.latencies.append(latency)
+            self.lags.append(lag)
+            self.feeds_asked += feeds
+
+
+class Schedule:
+    """When each widget polls next. Like Glance, a widget polls again one
+    cache interval after its previous answer arrived, so a slow server is
+    polled less often instead of piling up requests."""
+
+    def __init__(self, widgets: List[Widget], began: float, sync_start: bool, rng: random.Random):
+        self.rng = rng
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.queue = [(began + (0 if sync_start else rng.uniform(0, w.interval)), i) for i, w in enumerate(widgets)]
+        heapq.heapify(self.queue)
+
+    def done(self, i: int, interval: float) -> None:
+        with self.cond:
+            self.in_flight -= 1
+            heapq.heappush(self.queue, (time.monotonic() + interval * self.rng.uniform(0.95, 1.05), i))
+            self.cond.notify()
+
+    def next(self, deadline: float) -> Optional[Tuple[float, int]]:
+        """The next (due time, widget) before ``deadline``; None once it passed."""
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    return None
+                if self.queue and self.queue[0][0] <= now:
+                    self.in_flight += 1
+                    return heapq.heappop(self.queue)
+                wait = self.queue[0][0] - now if self.queue else deadline - now
+                self.cond.wait(min(wait, deadline - now))
+
+    def drain(self) -> None:
+        with self.cond:
+            while self.in_flight:
+                self.cond.wait()
+
+
+def poll(http: urllib3.PoolManager, target: str, widgets: List[Widget], due: float, i: int, timeout: float,
+         recorder: Recorder, schedule: Schedule) -> None:
+    widget = widgets[i]
+    started = time.monotonic()
+    try:
+        response = http.request('GET', target + widget.query, timeout=timeout, retries=False)
+        outcome = str(response.status)
+    except urllib3.exceptions.TimeoutError:
+        outcome = 'timeout'
+    except urllib3.exceptions.HTTPError:
+        outcome = 'connection'
+    finally:
+        schedule.done(i, widget.interval)
+    recorder.add(outcome, time.monotonic() - started, started - due, widget.feeds)
+
+
+def run_load(widgets: List[Widget], target: str, duration: float, concurrency: int, timeout: float,
+             sync_start: bool, rng: random.Random) -> Recorder:
+    """Poll until ``duration`` seconds are over, then wait for the requests in flight."""
+    recorder = Recorder()
+    http = urllib3.PoolManager(maxsize=concurrency, block=True)
+    began = time.monotonic()
+    schedule = Schedule(widgets, began, sync_start, rng)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='dashboard') as pool:
+        while True:
+            item = schedule.next(began + duration)
+            if item is None:
+                break
+            due, i = item
+            pool.submit(poll, http, target, widgets, due, i, timeout, recorder, schedule)
+        schedule.drain()
+    return recorder
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn(workers: int, use_async: bool, time_scale: float) -> Tuple[subprocess.Popen, str]:
+    """Start the service with the dockerfile's command on a free local port."""
+    port = _free_port()
+    bind = '127.0.0.1:{0}'.format(port)
+    if use_async:
+        command = ['uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers)]
+    else:
+        command = ['gunicorn', 'app:app', '--bind', bind, '--workers', str(workers)]
+    env = dict(os.environ)
+    env['ICAL_FEED_CACHE_TTL'] = str(max(1, int(round(config.FEED_CACHE_TTL / time_scale))))
+    env['ICAL_RESPONSE_CACHE_BUCKET'] = str(max(1, int(round(config.RESPONSE_CACHE_BUCKET / time_scale))))
+    print("# {0} (ICAL_FEED_CACHE_TTL={1}, ICAL_RESPONSE_CACHE_BUCKET={2})".format(
+        ' '.join(command), env['ICAL_FEED_CACHE_TTL'], env['ICAL_RESPONSE_CACHE_BUCKET']))
+    process = subprocess.Popen(command, cwd=SRC, env=env, stdout=subprocess.DEVNULL)
+    target = 'http://' + bind
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit("{0} exited with status {1}".format(command[0], process.returncode))
+        try:
+            urllib3.request('GET', target + '/stats', timeout=1, retries=False)
+            return process, target
+        except urllib3.exceptions.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit("{0} did not start listening on {1}".format(command[0], bind))
+
+
+def report(recorder: Recorder, server: FeedServer, upstream_before: Counter, elapsed: float, pool: int) -> None:
+    total = sum(recorder.outcomes.values())
+    latencies = sorted(recorder.latencies)
+    lags = sorted(recorder.lags)
+    with server.lock:
+        upstream = server.statuses.copy()
+    upstream.subtract(upstream_before)
+    upstream_total = sum(upstream.values())
+    ok = recorder.outcomes.get('200', 0)
+    print()
+    print("requests        {0} in {1:.1f} s, {2:.1f} req/s".format(total, elapsed, total / elapsed if elapsed else 0))
+    print("latency ms      p50 {0:.1f}  p95 {1:.1f}  p99 {2:.1f}  max {3:.1f}".format(
+        *(percentile(latencies, f) * 1000 for f in (0.5, 0.95, 0.99, 1.0))))
+    print("errors          {0:.2%} ({1})".format(
+        (total - ok) / total if total else 0,
+        ', '.join('{0}: {1}'.format(k, v) for k, v in sorted(recorder.outcomes.items()) if k != '200') or 'none'))
+    print("upstream        {0} requests ({1})".format(
+        upstream_total, ', '.join('{0}: {1}'.format(k, v) for k, v in sorted(upstream.items()) if v) or 'none'))
+    print("amplification   {0:.3f} upstream requests per /events, {1:.3f} per feed asked for, "
+          "{2:.1f} per feed and minute".format(
+              upstream_total / total if total else 0,
+              upstream_total / recorder.feeds_asked if recorder.feeds_asked else 0,
+              upstream_total / pool / (elapsed / 60) if elapsed else 0))
+    print("client lag ms   p95 {0:.1f}  max {1:.1f}{2}".format(
+        percentile(lags, 0.95) * 1000, percentile(lags, 1.0) * 1000,
+        "  (load generator saturated, raise --concurrency)" if percentile(lags, 0.95) > 1 else ""))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', default='team', choices=sorted(SCENARIOS))
+    parser.add_argument('--duration', type=float, default=60, help='seconds of load')
+    parser.add_argument('--time-scale', type=float, default=60, help='divide cache intervals (and server TTLs with --spawn) by this')
+    parser.add_argument('--target', default='http://127.0.0.1:8076', help='base URL of the service')
+    parser.add_argument('--spawn', action='store_true', help='start the service locally like the dockerfile does')
+    parser.add_argument('--workers', type=int, default=2, help='worker processes for --spawn')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='spawn uvicorn (ICAL_ASYNC=1) instead of gunicorn')
+    parser.add_argument('--mock-host', default='127.0.0.1', help='address the mock calendar server listens on')
+    parser.add_argument('--mock-port', type=int, default=0)
+    parser.add_argument('--feed-base', help='feed URL prefix as seen by the service (default: the mock server address)')
+    parser.add_argument('--concurrency', type=int, default=64, help='requests in flight at most')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds before a request counts as timed out')
+    parser.add_argument('--sync-start', action='store_true', help='all widgets poll at once at the start (restart herd)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    scenario = SCENARIOS[args.scenario]
+    rng = random.Random(args.seed)
+    feeds, faults = build_feeds(scenario, rng)
+    process: Optional[subprocess.Popen] = None
+    with serve(feeds, faults, host=args.mock_host, port=args.mock_port) as server:
+        feed_base = args.feed_base or server.base_url
+        widgets = build_widgets(scenario, feed_base, args.time_scale, rng)
+        print("# {0}: {1} widgets on {2} dashboards, {3} feeds ({4}), time scale {5:g}".format(
+            args.scenario, len(widgets), scenario['dashboards'], len(feeds),
+            ', '.join('{0} {1}'.format(p, f) for p, f in sorted(faults.items())) or 'no faults', args.time_scale))
+        target = args.target
+        if args.spawn:
+            process, target = spawn(args.workers, args.use_async, args.time_scale)
+        try:
+            with server.lock:
+                before = server.statuses.copy()
+            started = time.monotonic()
+            recorder = run_load(widgets, target.rstrip('/'), args.duration, args.concurrency, args.timeout,
+                                args.sync_start, rng)
+            report(recorder, server, before, time.monotonic() - started, len(feeds))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(10)
+
+
+if __name__ == '__main__':
+    main()
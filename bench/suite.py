@@ -0,0 +1,207 @@
+"""Benchmark suite for the fetch/parse/select pipeline.
+
+Run from the repository root:
+
+    python bench/suite.py                       # run and print a table
+    python bench/suite.py --save baseline.json  # also store the results
+    python bench/suite.py --compare baseline.json [--tolerance 0.15]
+
+Every scenario is a synthetic feed from ``feedgen.generate`` (fixed seed,
+so the input is identical between runs). For each one it measures
+
+* ``fetch``  - ``fetch_raw_events`` against a local HTTP server, cold caches
+* ``parse``  - ``parse_feed`` of the body, cold parse cache
+* ``fallback`` - ``_fallback_parse``
+* ``index``  - ``select_events`` on a freshly parsed list, building its index
+* ``select`` - ``select_events`` with a widget sized limit, index built, as
+  every request after the first for a feed runs it
+* ``select-linear`` - the same on a plain list, without the index
+* ``materialize`` - building the response dicts of every upcoming event
+
+and reports throughput (events per second), latency percentiles and the
+peak memory of one traced run. ``--compare`` prints the change against a
+stored run and exits with status 1 if any p50 latency or peak memory grew
+by more than the tolerance, so it can gate a CI job. Compare runs made on
+the same machine only.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+sys.path.insert(0, HERE)
+
+import pytz  # noqa: E402
+
+import feedgen  # noqa: E402
+import service  # noqa: E402
+from ics_server import serve  # noqa: E402
+from intervals import IndexedEvents  # noqa: E402
+from service import _fallback_parse, fetch_raw_events, materialize, parse_feed, select_events  # noqa: E402
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    'small': dict(events=200),
+    'medium': dict(events=1000),
+    'recurring': dict(events=150, recurring=0.5, occurrences=104, exdates=3, overrides=2),
+    'zones': dict(events=500, zones=feedgen.ZONE_STYLES),
+    'unfolded': dict(events=1000, fold=False),
+    'large-text': dict(events=500, description_bytes=4096),
+}
+
+LIMIT = 10
+NOW = pytz.utc.localize(feedgen.BASE)
+WINDOW = (NOW - datetime.timedelta(days=14), NOW + datetime.timedelta(days=365))
+DISPLAY_TZ = pytz.timezone('Europe/Berlin')
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _clear_caches() -> None:
+    service.feed_cache.clear()
+    service.parse_cache.clear()
+
+
+def run(fn: Callable[[], int], iterations: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """Time ``fn`` (which returns the number of events it handled)."""
+    samples = []
+    count = 0
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        count = fn()
+        samples.append(time.perf_counter() - started)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples.sort()
+    p50 = percentile(samples, 0.5)
+    return {
+        'events': count,
+        'iterations': iterations,
+        'events_per_s': count / p50 if p50 > 0 else 0.0,
+        'p50_ms': p50 * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'max_ms': samples[-1] * 1000,
+        'peak_kib': peak / 1024,
+    }
+
+
+def bench_scenario(name: str, params: Dict[str, Any], base_url: str, iterations: int) -> Dict[str, Dict[str, float]]:
+    text = feedgen.generate(**params)
+    url = '{0}/{1}.ics'.format(base_url, name)
+    start, end = WINDOW
+    body = text.encode('utf-8')
+    raw = fetch_raw_events(url, start, end, None, None)
+    plain = list(raw)
+    now_local = NOW.astimezone(DISPLAY_TZ)
+    upcoming = select_events(raw, now_local, DISPLAY_TZ, None)
+
+    def index() -> int:
+        select_events(IndexedEvents(plain), now_local, DISPLAY_TZ, LIMIT)
+        return len(plain)
+
+    def select(events: List[Any]) -> Callable[[], int]:
+        def fn() -> int:
+            select_events(events, now_local, DISPLAY_TZ, LIMIT)
+            return len(events)
+        return fn
+
+    return {
+        'fetch': run(lambda: len(fetch_raw_events(url, start, end, None, None)), iterations, setup=_clear_caches),
+        'parse': run(lambda: len(parse_feed(body, start, end)), iterations, setup=_clear_caches),
+        'fallback': run(lambda: len(_fallback_parse(text)), iterations),
+        'index': run(index, iterations),
+        'select': run(select(raw), iterations),
+        'select-linear': run(select(plain), iterations),
+        'materialize': run(lambda: len(materialize(upcoming)), iterations),
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> bool:
+    """Print the change against ``baseline``; False if something regressed."""
+    ok = True
+    print()
+    print("{0:<24} {1:>10} {2:>10} {3:>8}   {4:>10} {5:>10} {6:>8}".format(
+        "vs. baseline", "p50 ms", "was", "change", "peak KiB", "was", "change"))
+    for key, now in results.items():
+        was = baseline.get(key)
+        if was is None:
+            print("{0:<24} (not in baseline)".format(key))
+            continue
+        flags = []
+        cells = []
+        for metric in ('p50_ms', 'peak_kib'):
+            change = now[metric] / was[metric] - 1 if was[metric] else 0.0
+            if change > tolerance:
+                flags.append(metric)
+            cells += [now[metric], was[metric], change * 100]
+        print("{0:<24} {1:>10.2f} {2:>10.2f} {3:>+7.1f}%   {4:>10.0f} {5:>10.0f} {6:>+7.1f}%{7}".format(
+            key, *cells, "  <- slower" if 'p50_ms' in flags else "  <- bigger" if flags else ""))
+        ok = ok and not flags
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='only run these scenarios (repeatable)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the event count of every scenario (results are only comparable at the same scale)')
+    parser.add_argument('--save', metavar='FILE', help='write the results as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='compare against results written with --save')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed growth of p50 latency and peak memory for --compare (fraction)')
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    scenarios = {n: dict(SCENARIOS[n], events=max(1, int(SCENARIOS[n]['events'] * args.scale))) for n in names}
+    feeds = {'/{0}.ics'.format(n): feedgen.generate(**scenarios[n]).encode('utf-8') for n in names}
+    results: Dict[str, Dict[str, float]] = {}
+
+    print("{0:<24} {1:>7} {2:>12} {3:>9} {4:>9} {5:>9} {6:>10}".format(
+        "benchmark", "events", "events/s", "p50 ms", "p95 ms", "p99 ms", "peak KiB"))
+    with serve(feeds) as server:
+        for name in names:
+            size = len(feeds['/{0}.ics'.format(name)])
+            print("# {0}: {1:.2f} MB, {2}".format(name, size / 1e6, scenarios[name]))
+            for bench, r in bench_scenario(name, scenarios[name], server.base_url, args.iterations).items():
+                key = '{0}/{1}'.format(name, bench)
+                results[key] = r
+                print("{0:<24} {1:>7} {2:>12.0f} {3:>9.2f} {4:>9.2f} {5:>9.2f} {6:>10.0f}".format(
+                    key, r['events'], r['events_per_s'], r['p50_ms'], r['p95_ms'], r['p99_ms'], r['peak_kib']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'scale': args.scale, 'results': results}, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            stored = json.load(f)
+        if stored.get('scale', 1.0) != args.scale:
+            print("warning: baseline was run with --scale {0}".format(stored.get('scale', 1.0)))
+        if not compare(results, stored['results'], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
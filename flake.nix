@@ -26,6 +26,7 @@
             flask
             pytz
             icalevents
+            icalendar
             gunicorn
             python-dateutil
           ];
@@ -64,6 +65,7 @@
             python3Packages.flask
             python3Packages.pytz
             python3Packages.icalevents
+            python3Packages.icalendar
             python3Packages.gunicorn
             python3Packages.python-dateutil
             python3Packages.pip
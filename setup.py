@@ -7,14 +7,22 @@ setup(
     author="AWildLeon",
     url="https://github.com/AWildLeon/Glance-iCal-Events",
     package_dir={"": "src"},
-    py_modules=["app", "service"],
+    py_modules=["app", "service", "cache", "config", "prefetch", "recurrence", "timezones", "asgi", "upstream", "snapshots", "backends", "events", "responses", "metrics", "timing", "incremental", "intervals"],
     install_requires=[
         "flask",
         "pytz>=2023.0",
         "icalevents>=0.2.0",
+        "icalendar",
         "gunicorn",
         "python-dateutil>=2.8.2",
     ],
+    extras_require={
+        "asgi": ["uvicorn"],
+        "brotli": ["brotli"],
+        "http2": ["h2>=4,<5"],
+        "orjson": ["orjson"],
+        "redis": ["redis"],
+    },
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: System Administrators",
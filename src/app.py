@@ -1,9 +1,19 @@
 import logging
-from urllib.parse import unquote
-from flask import Flask, jsonify, request
-from service import get_events, clamp_int
+import time
+from typing import Any, Dict
+from urllib.parse import unquote, urlsplit
+from flask import Flask, Response, jsonify, request
+import config
+import metrics
+import responses
+import timing
+from prefetch import prefetcher
+from timezones import resolve as resolve_timezone
+from events import absolute_fields, parse_fields
+from service import get_events, get_merged_events, absolute_payload, clamp_int, cache_stats, FeedSpec, FeedTooLarge
 
 app = Flask(__name__)
+app.json = responses.JSONProvider(app)
 logger = logging.getLogger(__name__)
 
 
@@ -17,47 +27,211 @@ def index():
     }), 200
 
 
-@app.route('/events', methods=['GET'])
-def calendar_data():
+def all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    return dict(cache_stats(), response=responses.response_cache.stats())
+
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({"caches": all_cache_stats(), "prefetch": {"tracked": prefetcher.tracked()}}), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    if not config.METRICS_ENABLED:
+        return jsonify({"error": "Not found"}), 404
+    return Response(metrics.render(all_cache_stats()), content_type=metrics.CONTENT_TYPE)
+
+
+def _per_feed(args, name: str, count: int, shared: bool = True):
+    """Spread a repeated query parameter over ``count`` feeds.
+
+    A single value applies to every feed if ``shared``; otherwise exactly
+    one value per feed is expected, where an empty value means "not set"
+    for that feed.
+    """
+    values = args.getlist(name)
+    if not values:
+        return [None] * count
+    if len(values) == 1 and shared:
+        return values * count
+    if len(values) == count:
+        return [v or None for v in values]
+    if len(values) == 1:
+        raise ValueError("The feeds are on different servers, provide one '{0}' per feed".format(name))
+    raise ValueError("Provide either one '{0}' or one per feed".format(name))
+
+
+def _origin(url: str):
+    parts = urlsplit(url)
+    return parts.scheme.lower(), (parts.hostname or '').lower(), parts.port
 
-    raw_url = request.args.get('url', type=str)
-    encoded_url = request.args.get('encoded_url', type=str)
-    limit = request.args.get('limit', default=None, type=int)
-    lookback_days = request.args.get('lookback_days', default=14, type=int)
-    horizon_days = request.args.get('horizon_days', default=3650, type=int)
-    auth_user = request.args.get('username', type=str)
-    auth_pass = request.args.get('password', type=str)
 
-    if raw_url and encoded_url:
-        return jsonify({"error": "Provide only one of 'url' or 'encoded_url', not both"}), 400
+def events_query(args) -> Dict[str, Any]:
+    """Validate the ``/events`` query string (a werkzeug MultiDict).
 
-    if encoded_url:
-        ics_url = unquote(encoded_url)
+    Shared by the Flask view and the ASGI app. Raises ValueError with the
+    message for the 400 response.
+    """
+    raw_urls = args.getlist('url')
+    encoded_urls = args.getlist('encoded_url')
+    limit = args.get('limit', default=None, type=int)
+    lookback_days = args.get('lookback_days', default=14, type=int)
+    horizon_days = args.get('horizon_days', default=3650, type=int)
+    auth_user = args.get('username', type=str)
+    auth_pass = args.get('password', type=str)
+    expand = args.get('expand', default='full', type=str)
+    display_tz = args.get('tz', type=str)
+    fields = parse_fields(args.getlist('fields'))
+    relative = args.get('relative', default='1', type=str).lower()
+    profile = args.get('profile', default='0', type=str).lower() in ('1', 'true')
+
+    if raw_urls and encoded_urls:
+        raise ValueError("Provide only one of 'url' or 'encoded_url', not both")
+
+    if encoded_urls:
+        ics_urls = [unquote(u) for u in encoded_urls if u]
     else:
-        ics_url = raw_url
+        ics_urls = [u for u in raw_urls if u]
 
-    if not ics_url:
-        return jsonify({"error": "No URL provided"}), 400
+    if not ics_urls:
+        raise ValueError("No URL provided")
 
-    # Clamp values to avoid abuse / extreme ranges
-    lookback_days = clamp_int(lookback_days, 0, 90, 14)
-    horizon_days = clamp_int(horizon_days, 1, 3660, 3650)
+    if expand not in ('full', 'lazy'):
+        raise ValueError("'expand' must be 'full' or 'lazy'")
 
-    try:
+    if relative not in ('1', '0', 'true', 'false'):
+        raise ValueError("'relative' must be 0 or 1")
+    relative = relative in ('1', 'true')
+    if not relative:
+        fields = absolute_fields(fields)
+
+    if profile and not config.PROFILE_ENABLED:
+        raise ValueError("Profiling is not enabled on this server")
+
+    if display_tz and resolve_timezone(display_tz) is None:
+        raise ValueError("Unknown timezone in 'tz'")
+
+    if len(ics_urls) > config.MAX_FEEDS:
+        raise ValueError("Too many feeds, at most {0} are allowed".format(config.MAX_FEEDS))
+
+    if len(ics_urls) > 1:
+        # Credentials given once are never sent to another server than the
+        # one they were meant for.
+        same_origin = len({_origin(u) for u in ics_urls}) == 1
+        users = _per_feed(args, 'username', len(ics_urls), same_origin)
+        passwords = _per_feed(args, 'password', len(ics_urls), same_origin)
+        labels = _per_feed(args, 'label', len(ics_urls))
+        feeds = [FeedSpec(url=u, username=user, password=pw, label=label)
+                 for u, user, pw, label in zip(ics_urls, users, passwords, labels)]
+    else:
+        feeds = [FeedSpec(url=ics_urls[0], username=auth_user, password=auth_pass)]
+
+    return {
+        'feeds': feeds,
+        'limit': limit,
+        # Clamp values to avoid abuse / extreme ranges
+        'lookback_days': clamp_int(lookback_days, 0, 90, 14),
+        'horizon_days': clamp_int(horizon_days, 1, 3660, 3650),
+        'expand': expand,
+        'tz': display_tz,
+        'fields': fields,
+        'relative': relative,
+        'profile': profile,
+    }
+
+
+def track_feeds(query: Dict[str, Any]) -> None:
+    if config.PREFETCH_ENABLED:
+        for feed in query['feeds']:
+            prefetcher.track(feed['url'], query['lookback_days'], query['horizon_days'], feed['username'], feed['password'])
+
+
+def _cached_response(cached: responses.CachedResponse) -> Response:
+    headers = cached.headers()
+    if cached.matches(request.headers.get('If-None-Match')):
+        return Response(status=304, headers=headers)
+    return Response(cached.body, mimetype='application/json', headers=headers)
+
+
+def events_payload(query: Dict[str, Any], now) -> Dict[str, Any]:
+    """The ``/events`` JSON for a validated query, computed as of ``now``."""
+    feeds = query['feeds']
+    if len(feeds) > 1:
+        events_out = get_merged_events(
+            feeds,
+            lookback_days=query['lookback_days'],
+            horizon_days=query['horizon_days'],
+            limit=query['limit'],
+            include_ended=False,
+            expand=query['expand'],
+            tz=query['tz'],
+            fields=query['fields'],
+            now=now
+        )
+    else:
         events_out = get_events(
-            ics_url,
-            lookback_days=lookback_days,
-            horizon_days=horizon_days,
-            limit=limit,
+            feeds[0]['url'],
+            lookback_days=query['lookback_days'],
+            horizon_days=query['horizon_days'],
+            limit=query['limit'],
             include_ended=False,
-            username=auth_user,
-            password=auth_pass
+            username=feeds[0]['username'],
+            password=feeds[0]['password'],
+            expand=query['expand'],
+            tz=query['tz'],
+            fields=query['fields'],
+            now=now
         )
+    return {"events": events_out} if query['relative'] else absolute_payload(events_out, now, query['tz'])
+
+
+def profiled_payload(query: Dict[str, Any], now) -> Dict[str, Any]:
+    """``events_payload`` plus a ``profile`` of how it was computed."""
+    payload, functions = timing.profile_call(events_payload, query, now)
+    timings = timing.current()
+    stages = timings.milliseconds() if timings is not None else {}
+    return dict(payload, profile={"stagesMs": stages, "functions": functions})
+
+
+@app.route('/events', methods=['GET'])
+def calendar_data():
+    started = time.perf_counter()
+    with timing.collect() as timings:
+        resp = app.make_response(_events_response())
+    timings.add('total', time.perf_counter() - started)
+    resp.headers['Server-Timing'] = timings.header()
+    # errors and profiles
+    resp.headers.setdefault('Cache-Control', 'no-store')
+    return resp
+
+
+def _events_response():
+    try:
+        query = events_query(request.args)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    track_feeds(query)
+    key, now, expires = responses.bucket(query)
+    if not query['profile']:
+        cached = responses.lookup(key)
+        if cached is not None:
+            timing.note('cache', 'hit')
+            return _cached_response(cached)
+
+    try:
+        if query['profile']:
+            return jsonify(profiled_payload(query, now))
+        payload = events_payload(query, now)
+    except FeedTooLarge as exc:
+        logger.warning("Rejected feed: %s", exc)
+        return jsonify({"error": "Calendar feed is too large"}), 400
     except Exception:
         logger.exception("Failed to retrieve events")
         return jsonify({"error": "Failed to retrieve events"}), 400
 
-    return jsonify({"events": events_out})
+    return _cached_response(responses.store(key, query, payload, expires))
 
 
 if __name__ == "__main__":
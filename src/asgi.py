@@ -0,0 +1,230 @@
+"""ASGI entry point: ``uvicorn asgi:app``.
+
+Serves the same routes as the Flask app in ``app.py``, with the same query
+validation and JSON output, but a request waiting for its upstream feed no
+longer occupies a worker: the download runs on an I/O thread pool (sharing
+the urllib3 connection pool, the feed cache and its conditional GET logic
+with the sync mode) and is awaited, and parsing runs on a small separate
+pool. Hundreds of slow feeds can then be in flight per worker.
+"""
+import asyncio
+import datetime
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+
+import config
+import metrics
+import responses
+import service
+import timezones
+import timing
+from app import app as flask_app, all_cache_stats, events_query, profiled_payload, track_feeds, index as index_view
+from prefetch import prefetcher
+from service import EventView, FeedSpec, FeedTooLarge
+
+logger = logging.getLogger(__name__)
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(name: str, size: int) -> ThreadPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ThreadPoolExecutor(max_workers=max(1, size), thread_name_prefix='async-' + name)
+        return pool
+
+
+async def _run(name: str, size: int, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_pool(name, size), timing.bind(fn), *args)
+
+
+async def fetch_body(url: str, username: Optional[str], password: Optional[str]) -> bytes:
+    return await _run('fetch', config.ASYNC_FETCH_WORKERS, service.fetch_feed_body, url, username, password)
+
+
+def _select(feed: FeedSpec, url: str, body: bytes, start: datetime.datetime, end: datetime.datetime,
+            now_utc: datetime.datetime, limit: Optional[int], expand: str, local_tz,
+            include_ended: bool) -> List[EventView]:
+    # Requests for the same feed and window, here or on the WSGI path, wait
+    # for one parse or expansion instead of running their own.
+    if expand == 'lazy':
+        raw = service.coalesce_events(url, feed.get('username'), feed.get('password'), start, end,
+                                      lambda: service.lazy_events(body, start, end, now_utc, limit, url),
+                                      variant=('lazy', limit))
+    else:
+        raw = service.coalesce_events(url, feed.get('username'), feed.get('password'), start, end,
+                                      lambda: service.parse_feed(body, start, end, url))
+    return service.select_feed_events(url, raw, now_utc.astimezone(local_tz), local_tz, limit, include_ended=include_ended)
+
+
+async def _load(feed: FeedSpec, start, end, now_utc, limit, expand, local_tz, include_ended) -> List[EventView]:
+    url = service.normalize_ics_url(feed['url'])
+    body = await fetch_body(url, feed.get('username'), feed.get('password'))
+    return await _run('parse', config.ASYNC_PARSE_WORKERS, _select,
+                      feed, url, body, start, end, now_utc, limit, expand, local_tz, include_ended)
+
+
+async def get_events_async(url: str, lookback_days: int, horizon_days: int, limit: Optional[int],
+                           username: Optional[str], password: Optional[str], include_ended=False,
+                           expand: str = 'full', tz: Optional[str] = None,
+                           fields: Optional[Sequence[str]] = None,
+                           now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+    """Awaitable counterpart of ``service.get_events``."""
+    now_utc, start, end = service.fetch_window(lookback_days, horizon_days, now)
+    local_tz = timezones.display_zone(tz)
+    feed = FeedSpec(url=url, username=username, password=password)
+    events = await _load(feed, start, end, now_utc, limit, expand, local_tz, include_ended)
+    return service.materialize(events, fields, metrics.feed_id(service.normalize_ics_url(url)))
+
+
+async def get_merged_events_async(feeds: List[FeedSpec], lookback_days: int, horizon_days: int,
+                                  limit: Optional[int], include_ended=False, expand: str = 'full',
+                                  tz: Optional[str] = None, fields: Optional[Sequence[str]] = None,
+                                  now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+    """Awaitable counterpart of ``service.get_merged_events``."""
+    now_utc, start, end = service.fetch_window(lookback_days, horizon_days, now)
+    local_tz = timezones.display_zone(tz)
+    feed_limit = limit if limit is not None and limit >= 0 else None
+
+    async def load(index: int, feed: FeedSpec) -> List[EventView]:
+        events = await _load(feed, start, end, now_utc, feed_limit, expand, local_tz, include_ended)
+        return service.tag_feed(events, index, feed)
+
+    results = await asyncio.gather(*(load(i, feed) for i, feed in enumerate(feeds)), return_exceptions=True)
+    return service.materialize(service.merge_selected(list(results), limit), fields)
+
+
+async def events_response(args) -> Tuple[int, Any]:
+    """Status and payload for ``/events``; a successful answer is the
+    encoded ``responses.CachedResponse``."""
+    try:
+        query = events_query(args)
+    except ValueError as exc:
+        return 400, {"error": str(exc)}
+
+    track_feeds(query)
+    feeds = query['feeds']
+    key, now, expires = responses.bucket(query)
+    if not query['profile']:
+        cached = responses.lookup(key)
+        if cached is not None:
+            timing.note('cache', 'hit')
+            return 200, cached
+
+    try:
+        if query['profile']:
+            # cProfile only sees its own thread, so the profiled request
+            # runs the sync code path on a single worker thread.
+            return 200, await _run('parse', config.ASYNC_PARSE_WORKERS, profiled_payload, query, now)
+        if len(feeds) > 1:
+            events_out = await get_merged_events_async(
+                feeds,
+                lookback_days=query['lookback_days'],
+                horizon_days=query['horizon_days'],
+                limit=query['limit'],
+                include_ended=False,
+                expand=query['expand'],
+                tz=query['tz'],
+                fields=query['fields'],
+                now=now
+            )
+        else:
+            events_out = await get_events_async(
+                feeds[0]['url'],
+                lookback_days=query['lookback_days'],
+                horizon_days=query['horizon_days'],
+                limit=query['limit'],
+                include_ended=False,
+                username=feeds[0]['username'],
+                password=feeds[0]['password'],
+                expand=query['expand'],
+                tz=query['tz'],
+                fields=query['fields'],
+                now=now
+            )
+    except FeedTooLarge as exc:
+        logger.warning("Rejected feed: %s", exc)
+        return 400, {"error": "Calendar feed is too large"}
+    except Exception:
+        logger.exception("Failed to retrieve events")
+        return 400, {"error": "Failed to retrieve events"}
+    payload = {"events": events_out} if query['relative'] else service.absolute_payload(events_out, now, query['tz'])
+    return 200, responses.store(key, query, payload, expires)
+
+
+async def _dispatch(path: str, args) -> Tuple[int, Any]:
+    if path == '/events':
+        return await events_response(args)
+    if path == '/stats':
+        return 200, {"caches": all_cache_stats(), "prefetch": {"tracked": prefetcher.tracked()}}
+    if path == '/metrics' and config.METRICS_ENABLED:
+        return 200, metrics.render(all_cache_stats())
+    if path == '/':
+        with flask_app.app_context():
+            resp, status = index_view()
+        return status, resp.get_json()
+    return 404, {"error": "Not found"}
+
+
+async def _send_response(send, status: int, payload: Any, head: bool = False, if_none_match: Optional[str] = None,
+                         extra_headers: Sequence[Tuple[bytes, bytes]] = ()) -> None:
+    # str payloads are the /metrics text, everything else is JSON.
+    headers = [(b'content-type', b'application/json')]
+    if isinstance(payload, str):
+        headers = [(b'content-type', metrics.CONTENT_TYPE.encode('ascii'))]
+        body = payload.encode('utf-8')
+    elif isinstance(payload, responses.CachedResponse):
+        headers += [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in payload.headers()]
+        if payload.matches(if_none_match):
+            status, body = 304, b''
+        else:
+            body = payload.body
+    else:
+        body = responses.dumps(payload) + b'\n'
+    headers += list(extra_headers)
+    headers.append((b'content-length', str(len(body)).encode('ascii')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if head else body})
+
+
+async def app(scope, receive, send) -> None:
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                with _pools_lock:
+                    for pool in _pools.values():
+                        pool.shutdown(wait=False)
+                    _pools.clear()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+    if scope['method'] not in ('GET', 'HEAD'):
+        await _send_response(send, 405, {"error": "Method not allowed"})
+        return
+    query = scope.get('query_string', b'').decode('latin-1')
+    args = MultiDict(parse_qsl(query, keep_blank_values=True))
+    started = time.perf_counter()
+    with timing.collect() as timings:
+        status, payload = await _dispatch(scope['path'], args)
+    timings.add('total', time.perf_counter() - started)
+    extra = []
+    if scope['path'] == '/events':
+        extra.append((b'server-timing', timings.header().encode('latin-1')))
+        if not isinstance(payload, responses.CachedResponse):
+            # errors and profiles
+            extra.append((b'cache-control', b'no-store'))
+    if_none_match = dict(scope.get('headers') or []).get(b'if-none-match')
+    await _send_response(send, status, payload, head=scope['method'] == 'HEAD', extra_headers=extra,
+                         if_none_match=if_none_match.decode('latin-1') if if_none_match else None)
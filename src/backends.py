@@ -0,0 +1,377 @@
+"""Storage backends for the feed cache.
+
+``MemoryBackend`` keeps entries in the worker process, like the plain
+``LRUCache`` it extends. ``FileBackend`` and ``RedisBackend`` store them
+outside the process, so all gunicorn workers (and, with Redis, several
+hosts) share one copy and one download per feed. All of them offer the
+``LRUCache`` methods plus ``lock(key)``, a context manager that serialises
+downloads of the same feed across everyone sharing the backend.
+
+Shared backends only hold ``FeedEntry`` values, stored as a one line JSON
+header (validators and fetch time) followed by the raw body, never as
+pickles: whoever can write to the directory or the Redis server must not
+be able to run code in the workers.
+"""
+import abc
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, Hashable, Iterator, Optional
+
+import config
+from cache import FeedEntry, LRUCache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend(LRUCache):
+    """Per-process cache. Downloads are already deduplicated within the
+    process by ``SingleFlight``, so ``lock`` does nothing."""
+
+    shared = False
+
+    def lock(self, key: Hashable):
+        return contextlib.nullcontext()
+
+
+def _name(key: Hashable) -> str:
+    # Keys contain feed URLs, which may carry tokens; never store them as is.
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+
+_FORMAT = 1
+
+
+def _dumps(value: FeedEntry) -> bytes:
+    if not isinstance(value, FeedEntry):
+        raise TypeError("Shared cache backends only store FeedEntry values, not {0}".format(type(value).__name__))
+    # time.monotonic() means nothing to another process or host.
+    age = max(0.0, time.monotonic() - value.fetched_at)
+    header = {'v': _FORMAT, 'etag': value.etag, 'last_modified': value.last_modified, 'fetched': time.time() - age}
+    return json.dumps(header).encode('utf-8') + b'\n' + value.body
+
+
+def _loads(data: bytes) -> FeedEntry:
+    head, sep, body = data.partition(b'\n')
+    header = json.loads(head.decode('utf-8')) if sep else None
+    if not isinstance(header, dict) or header.get('v') != _FORMAT:
+        raise ValueError("Unknown shared cache entry format")
+    etag, last_modified, fetched = header.get('etag'), header.get('last_modified'), header.get('fetched')
+    if not (etag is None or isinstance(etag, str)) or not (last_modified is None or isinstance(last_modified, str)) \
+            or not isinstance(fetched, (int, float)):
+        raise ValueError("Malformed shared cache entry")
+    age = max(0.0, time.time() - fetched)
+    return FeedEntry(body, etag, last_modified, time.monotonic() - age)
+
+
+class SharedBackend(abc.ABC):
+    """Base for backends living outside the process.
+
+    Subclasses store opaque bytes under hashed names; errors of the
+    underlying store are logged and treated as misses. Entries younger than
+    ``FEED_CACHE_TTL`` are also kept in an ``LRUCache`` of the process, so
+    a fresh feed costs no file or Redis read per request.
+    """
+
+    shared = True
+
+    def __init__(self, max_entries: int, lock_timeout: float):
+        self.max_entries = max_entries
+        self.lock_timeout = lock_timeout
+        self.local = LRUCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @abc.abstractmethod
+    def _get(self, name: str) -> Optional[bytes]:
+        ...
+
+    @abc.abstractmethod
+    def _set(self, name: str, data: bytes) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _delete(self, name: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _names(self) -> Iterator[str]:
+        ...
+
+    @abc.abstractmethod
+    def _lock(self, name: str):
+        ...
+
+    def _failed(self, action: str) -> None:
+        self.errors += 1
+        logger.warning("Shared cache %s failed", action, exc_info=True)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.local.get(key)
+        if entry is not None and time.monotonic() - entry.fetched_at < config.FEED_CACHE_TTL:
+            self.hits += 1
+            return entry
+        return self.latest(key, default)
+
+    def latest(self, key: Hashable, default: Any = None) -> Any:
+        """Like ``get``, but always reads the shared store, to see what
+        other workers stored."""
+        try:
+            data = self._get(_name(key))
+            value = _loads(data) if data is not None else None
+        except Exception:
+            self._failed('read')
+            data = value = None
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.local.set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: FeedEntry) -> None:
+        if self.max_entries <= 0:
+            return
+        try:
+            self._set(_name(key), _dumps(value))
+        except Exception:
+            self._failed('write')
+            return
+        self.local.set(key, value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        value = self.latest(key, default)
+        self.local.pop(key)
+        try:
+            self._delete(_name(key))
+        except Exception:
+            self._failed('write')
+        return value
+
+    def clear(self) -> None:
+        self.local.clear()
+        try:
+            for name in list(self._names()):
+                self._delete(name)
+        except Exception:
+            self._failed('write')
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+        }
+
+    def __len__(self) -> int:
+        try:
+            return sum(1 for _ in self._names())
+        except Exception:
+            self._failed('read')
+            return 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        try:
+            return self._get(_name(key)) is not None
+        except Exception:
+            self._failed('read')
+            return False
+
+    @contextlib.contextmanager
+    def lock(self, key: Hashable):
+        """Hold the cross-process lock for ``key`` while the block runs.
+
+        If the lock cannot be taken within ``lock_timeout`` seconds (a stuck
+        worker, an unreachable server) the block runs anyway: a duplicate
+        download is better than a failed request.
+        """
+        try:
+            held = self._lock(_name(key))
+            acquired = held.__enter__()
+        except Exception:
+            self._failed('lock')
+            held, acquired = None, False
+        if not acquired:
+            logger.debug("Shared cache lock not acquired, continuing without it")
+        try:
+            yield
+        finally:
+            if held is not None:
+                try:
+                    held.__exit__(None, None, None)
+                except Exception:
+                    self._failed('unlock')
+
+
+class FileBackend(SharedBackend):
+    """One file per entry in ``directory``, for the workers of one host.
+
+    Entries are replaced atomically (write to a temporary file, then
+    rename) and locks are ``flock`` locks on a sibling ``.lock`` file, which
+    the kernel releases if a worker dies while holding one.
+    """
+
+    def __init__(self, directory: str, max_entries: int, lock_timeout: float = 20):
+        super().__init__(max_entries, lock_timeout)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str, suffix: str = '.bin') -> str:
+        return os.path.join(self.directory, name + suffix)
+
+    def _get(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self._path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _set(self, name: str, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(name))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.bin'):
+                with contextlib.suppress(OSError):
+                    entries.append((entry.stat().st_mtime, entry.path))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+            with contextlib.suppress(OSError):
+                os.unlink(path[:-len('.bin')] + '.lock')
+
+    def _delete(self, name: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self._path(name))
+
+    def _names(self) -> Iterator[str]:
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.bin'):
+                yield entry.name[:-len('.bin')]
+
+    @contextlib.contextmanager
+    def _lock(self, name: str):
+        if fcntl is None:
+            yield False
+            return
+        with open(self._path(name, '.lock'), 'a+b') as f:
+            deadline = time.monotonic() + self.lock_timeout
+            acquired = False
+            while True:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    acquired = True
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        break
+                    time.sleep(0.05)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class RedisBackend(SharedBackend):
+    """Entries in a Redis compatible server.
+
+    ``client`` needs ``get``, ``set`` (with ``ex``/``px``/``nx``), ``delete``
+    and ``scan_iter``, i.e. a ``redis.Redis`` or anything that looks like
+    one. Locks are ``SET NX PX`` keys with a random token.
+    """
+
+    def __init__(self, client, max_entries: int, expire: int, lock_timeout: float = 20, prefix: str = 'glance-ical:'):
+        super().__init__(max_entries, lock_timeout)
+        self.client = client
+        self.expire = expire
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, max_entries: int, expire: int, lock_timeout: float = 20) -> 'RedisBackend':
+        import redis
+        return cls(redis.Redis.from_url(url), max_entries, expire, lock_timeout)
+
+    def _get(self, name: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + name)
+
+    def _set(self, name: str, data: bytes) -> None:
+        self.client.set(self.prefix + name, data, ex=self.expire if self.expire > 0 else None)
+
+    def _delete(self, name: str) -> None:
+        self.client.delete(self.prefix + name)
+
+    def _names(self) -> Iterator[str]:
+        lock_prefix = self.prefix + 'lock:'
+        for raw in self.client.scan_iter(match=self.prefix + '*'):
+            key = raw.decode('utf-8') if isinstance(raw, bytes) else raw
+            if not key.startswith(lock_prefix):
+                yield key[len(self.prefix):]
+
+    @contextlib.contextmanager
+    def _lock(self, name: str):
+        key = self.prefix + 'lock:' + name
+        token = uuid.uuid4().hex
+        # The lock outlives a crashed holder by at most this long.
+        hold_ms = int(max(self.lock_timeout, config.UPSTREAM_READ_TIMEOUT) * 2000)
+        deadline = time.monotonic() + self.lock_timeout
+        acquired = False
+        while True:
+            if self.client.set(key, token, nx=True, px=hold_ms):
+                acquired = True
+                break
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                current = self.client.get(key)
+                if current in (token, token.encode('ascii')):
+                    self.client.delete(key)
+
+
+def create_backend(name: str, max_entries: int):
+    """Backend for the ``ICAL_CACHE_BACKEND`` setting ``name``.
+
+    Falls back to ``MemoryBackend`` if the configured one cannot be set up.
+    """
+    try:
+        if name == 'file':
+            return FileBackend(config.CACHE_DIR, max_entries, config.CACHE_LOCK_TIMEOUT)
+        if name == 'redis':
+            return RedisBackend.from_url(config.CACHE_REDIS_URL, max_entries, config.CACHE_EXPIRE, config.CACHE_LOCK_TIMEOUT)
+        if name != 'memory':
+            logger.warning("Unknown cache backend %r, using memory", name)
+    except Exception:
+        logger.exception("Cache backend %r unavailable, using memory", name)
+    return MemoryBackend(max_entries)
@@ -0,0 +1,156 @@
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    raw = os.environ.get(name)
+    if raw is None or raw.strip() == '':
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name)
+    if raw is None or raw.strip() == '':
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    raw = os.environ.get(name)
+    if raw is None or raw.strip() == '':
+        return default
+    return raw.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_str(name: str, default: str) -> str:
+    raw = os.environ.get(name)
+    if raw is None or raw.strip() == '':
+        return default
+    return raw.strip()
+
+
+# Zone used for start/end in responses when the request has no tz=
+# parameter. Empty means the host's local zone.
+DISPLAY_TZ = env_str('ICAL_DISPLAY_TZ', '')
+
+# Raw feed cache (conditional GET). Bodies are reused without contacting the
+# upstream for FEED_CACHE_TTL seconds and revalidated with ETag /
+# Last-Modified afterwards. FEED_CACHE_SIZE=0 disables the cache.
+FEED_CACHE_TTL = env_int('ICAL_FEED_CACHE_TTL', 300)
+FEED_CACHE_SIZE = env_int('ICAL_FEED_CACHE_SIZE', 64)
+
+# Feed bodies are read in chunks and the download is aborted once it grows
+# beyond MAX_FEED_BYTES. Bodies larger than STREAM_PARSE_BYTES skip
+# icalevents (which needs the whole document in memory, plus its object
+# tree) and go straight to the streaming fallback parser; that parser does
+# not expand recurrences, so this is off (0) by default.
+MAX_FEED_BYTES = env_int('ICAL_MAX_FEED_BYTES', 64 * 1024 * 1024)
+STREAM_PARSE_BYTES = env_int('ICAL_STREAM_PARSE_BYTES', 0)
+
+# Parsed event cache. Parsing and recurrence expansion is skipped when the
+# feed body is byte-identical to a previous request for the same window.
+# Windows are widened to multiples of PARSE_CACHE_BUCKET seconds so requests
+# made a few minutes apart share one entry.
+PARSE_CACHE_SIZE = env_int('ICAL_PARSE_CACHE_SIZE', 32)
+PARSE_CACHE_BUCKET = env_int('ICAL_PARSE_CACHE_BUCKET', 3600)
+
+# Background prefetcher. Feeds requested through /events are refreshed every
+# PREFETCH_INTERVAL seconds (+/- PREFETCH_JITTER as a fraction), backing off
+# up to PREFETCH_MAX_BACKOFF seconds while a feed keeps failing. Feeds nobody
+# asked for within PREFETCH_IDLE seconds are dropped again.
+PREFETCH_ENABLED = env_bool('ICAL_PREFETCH', False)
+PREFETCH_INTERVAL = env_float('ICAL_PREFETCH_INTERVAL', 240)
+PREFETCH_JITTER = env_float('ICAL_PREFETCH_JITTER', 0.1)
+PREFETCH_MAX_BACKOFF = env_float('ICAL_PREFETCH_MAX_BACKOFF', 3600)
+PREFETCH_IDLE = env_float('ICAL_PREFETCH_IDLE', 3600)
+
+# Multi-feed requests (/events with several url parameters). Feeds are
+# fetched concurrently on a shared pool of FEED_FETCH_WORKERS threads per
+# worker process; requests naming more than MAX_FEEDS feeds are rejected.
+FEED_FETCH_WORKERS = env_int('ICAL_FEED_FETCH_WORKERS', 8)
+MAX_FEEDS = env_int('ICAL_MAX_FEEDS', 20)
+
+# ASGI mode (asgi:app). Upstream downloads wait on a pool of
+# ASYNC_FETCH_WORKERS threads, so many slow feeds can be in flight without
+# holding up the event loop; parsing and expansion run on a separate pool of
+# ASYNC_PARSE_WORKERS threads so it cannot starve the downloads.
+ASYNC_FETCH_WORKERS = env_int('ICAL_ASYNC_FETCH_WORKERS', 64)
+ASYNC_PARSE_WORKERS = env_int('ICAL_ASYNC_PARSE_WORKERS', 2)
+
+# Parsing in worker processes. Feeds of at least PARSE_PROCESS_BYTES are
+# parsed in a pool of PARSE_PROCESSES processes, so a large feed does not
+# hold the GIL of the serving process; smaller ones are parsed inline where
+# the round trip would cost more than it saves. PARSE_PROCESSES=0 disables
+# the pool.
+PARSE_PROCESSES = env_int('ICAL_PARSE_PROCESSES', 0)
+PARSE_PROCESS_BYTES = env_int('ICAL_PARSE_PROCESS_BYTES', 1024 * 1024)
+
+# Feeds of at least INCREMENTAL_PARSE_BYTES are parsed incrementally: when
+# a new version arrives, only the VEVENTs (grouped by UID) that changed
+# since the previous version of the same feed and window are parsed again
+# (see incremental.py). 0 always parses the whole feed.
+INCREMENTAL_PARSE_BYTES = env_int('ICAL_INCREMENTAL_PARSE_BYTES', 1024 * 1024)
+
+# Upstream HTTP client (see upstream.py). Connections are kept alive per
+# host, up to UPSTREAM_POOL_MAXSIZE each for UPSTREAM_NUM_POOLS hosts; with
+# UPSTREAM_POOL_BLOCK a request waits for a free connection instead of
+# opening a throwaway one. Failed connects, reads and 429/5xx answers are
+# retried UPSTREAM_RETRIES times with exponential backoff starting at
+# UPSTREAM_BACKOFF seconds (or Retry-After, at most UPSTREAM_READ_TIMEOUT);
+# redirects are counted separately. UPSTREAM_HTTP2 needs the h2 package.
+UPSTREAM_NUM_POOLS = env_int('ICAL_UPSTREAM_NUM_POOLS', 32)
+UPSTREAM_POOL_MAXSIZE = env_int('ICAL_UPSTREAM_POOL_MAXSIZE', 10)
+UPSTREAM_POOL_BLOCK = env_bool('ICAL_UPSTREAM_POOL_BLOCK', False)
+UPSTREAM_RETRIES = env_int('ICAL_UPSTREAM_RETRIES', 2)
+UPSTREAM_BACKOFF = env_float('ICAL_UPSTREAM_BACKOFF', 0.5)
+UPSTREAM_CONNECT_TIMEOUT = env_float('ICAL_UPSTREAM_CONNECT_TIMEOUT', 5)
+UPSTREAM_READ_TIMEOUT = env_float('ICAL_UPSTREAM_READ_TIMEOUT', 15)
+UPSTREAM_HTTP2 = env_bool('ICAL_UPSTREAM_HTTP2', False)
+
+# On-disk snapshots of feed bodies (with their validators) and parsed
+# events, so a restarted or freshly deployed service starts warm. All
+# workers share the SQLite file at SNAPSHOT_PATH; the least recently used
+# entries are dropped once it holds more than SNAPSHOT_MAX_BYTES. An empty
+# path disables it.
+SNAPSHOT_PATH = env_str('ICAL_SNAPSHOT_PATH', '')
+SNAPSHOT_MAX_BYTES = env_int('ICAL_SNAPSHOT_MAX_BYTES', 256 * 1024 * 1024)
+
+# Where feed bodies are cached: 'memory' (per worker process), 'file'
+# (a directory shared by all workers on one host, using file locks) or
+# 'redis' (any Redis compatible server, shared by several hosts; needs the
+# redis package). With a shared backend only one worker downloads a feed
+# per FEED_CACHE_TTL; the others wait up to CACHE_LOCK_TIMEOUT seconds for
+# it. Shared entries expire after CACHE_EXPIRE seconds.
+CACHE_BACKEND = env_str('ICAL_CACHE_BACKEND', 'memory')
+CACHE_DIR = env_str('ICAL_CACHE_DIR', '/tmp/glance-ical-cache')
+CACHE_REDIS_URL = env_str('ICAL_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_EXPIRE = env_int('ICAL_CACHE_EXPIRE', 86400)
+CACHE_LOCK_TIMEOUT = env_float('ICAL_CACHE_LOCK_TIMEOUT', 20)
+
+# JSON encoding of responses: 'auto' uses orjson when it is installed and
+# the standard library otherwise, 'json' always uses the standard library.
+JSON_ENCODER = env_str('ICAL_JSON_ENCODER', 'auto')
+
+# Encoded /events responses are kept per query for RESPONSE_CACHE_BUCKET
+# seconds. Within a bucket every response is computed as of the start of the
+# bucket, so repeated requests get identical bytes (and ETag) from any
+# worker; secondsUntilStart and friends are therefore up to one bucket old.
+# A bucket of 0 computes every response against the current time.
+RESPONSE_CACHE_SIZE = env_int('ICAL_RESPONSE_CACHE_SIZE', 256)
+RESPONSE_CACHE_BUCKET = env_int('ICAL_RESPONSE_CACHE_BUCKET', 60)
+
+# Prometheus metrics at /metrics (per worker process). 0 turns both the
+# endpoint and the bookkeeping off.
+METRICS_ENABLED = env_bool('ICAL_METRICS', True)
+# Distinct feed label values per process; feeds beyond are labelled 'other'.
+METRICS_MAX_FEEDS = env_int('ICAL_METRICS_MAX_FEEDS', 100)
+
+# Allows ?profile=1 on /events, which returns a cProfile summary of the
+# request. Off by default: profiling is slow and reveals code internals.
+PROFILE_ENABLED = env_bool('ICAL_PROFILE', False)
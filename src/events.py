@@ -0,0 +1,233 @@
+"""Event objects of the internal pipeline.
+
+A feed expands to thousands of occurrences, most of which are filtered out
+or cut off by ``limit``. ``ParsedEvent`` therefore holds just the parsed
+fields in slots, and ``EventView`` (one selected occurrence in the display
+zone) computes the response fields only when the JSON dict is built at the
+response boundary. Both also support ``ev['field']`` / ``ev.get('field')``
+so code and tests reading them like the dicts they replaced keep working.
+"""
+import abc
+import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, Mapping, Optional, Sequence, Tuple
+
+_MISSING = object()
+
+
+class _Fields(abc.ABC):
+    """Read-only mapping access over ``__slots__``."""
+
+    __slots__ = ()
+
+    def __getitem__(self, name: str) -> Any:
+        value = self.get(name, _MISSING)
+        if value is _MISSING:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and self.get(name, _MISSING) is not _MISSING
+
+    @abc.abstractmethod
+    def get(self, name: str, default: Any = None) -> Any:
+        ...
+
+    @abc.abstractmethod
+    def keys(self) -> Iterator[str]:
+        ...
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return ((name, self[name]) for name in self.keys())
+
+
+class ParsedEvent(_Fields):
+    """One event (or one occurrence of a recurring event) as parsed."""
+
+    FIELDS = ('summary', 'uid', 'start', 'end', 'description', 'location', 'status',
+              'all_day', 'created', 'last_modified', 'url', 'recurrence_id', 'source')
+    __slots__ = FIELDS
+
+    def __init__(self, fields: Optional[Mapping[str, Any]] = None, **kwargs: Any):
+        if fields:
+            kwargs = dict(fields, **kwargs)
+        for name in self.FIELDS:
+            setattr(self, name, kwargs.pop(name, None))
+        if kwargs:
+            raise TypeError("Unknown event fields: {0}".format(', '.join(sorted(kwargs))))
+
+    @classmethod
+    def from_row(cls, row: Iterable[Any]) -> 'ParsedEvent':
+        """Build from values in ``FIELDS`` order."""
+        ev = cls.__new__(cls)
+        for name, value in zip(cls.FIELDS, row):
+            setattr(ev, name, value)
+        return ev
+
+    def row(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        if name in self.FIELDS:
+            return getattr(self, name)
+        return default
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        if name not in self.FIELDS:
+            raise KeyError(name)
+        setattr(self, name, value)
+
+    def keys(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ParsedEvent):
+            return NotImplemented
+        return self.row() == other.row()
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return "ParsedEvent({0!r}, {1!r})".format(self.summary, self.start)
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _days_remaining(v: 'EventView') -> Optional[int]:
+    if not v.event.all_day:
+        return None
+    return max(0, (v.end_local.date() - v.now_local.date()).days - (0 if v.ongoing else 1))
+
+
+# Response fields of EventView, computed on demand.
+_VIEW_FIELDS: Dict[str, Callable[['EventView'], Any]] = {
+    'name': lambda v: v.event.summary,
+    'uid': lambda v: v.event.uid,
+    'start': lambda v: v.start_local.isoformat(),
+    'end': lambda v: v.end_local.isoformat(),
+    'all_day': lambda v: v.event.all_day,
+    'secondsUntilStart': lambda v: (v.start_local - v.now_local).total_seconds(),
+    'secondsUntilEnd': lambda v: (v.end_local - v.now_local).total_seconds(),
+    'durationSeconds': lambda v: (v.end_local - v.start_local).total_seconds(),
+    'daysRemaining': _days_remaining,
+    'ongoing': lambda v: v.ongoing,
+    'url': lambda v: v.event.url,
+    'description': lambda v: v.event.description,
+    'location': lambda v: v.event.location,
+    'status': lambda v: v.event.status,
+    'created': lambda v: _iso(v.event.created),
+    'last_modified': lambda v: _iso(v.event.last_modified),
+    'recurrence_id': lambda v: v.event.recurrence_id,
+    'source': lambda v: v.event.source,
+}
+_TAG_FIELDS: Dict[str, Callable[['EventView'], Any]] = {
+    'feed': lambda v: v.feed,
+    'feedLabel': lambda v: v.feed_label,
+}
+
+
+# Everything /events can return, and the named sets ``fields=`` accepts.
+FIELD_NAMES = tuple(_VIEW_FIELDS) + tuple(_TAG_FIELDS)
+FIELD_PRESETS: Dict[str, Optional[Tuple[str, ...]]] = {
+    'all': None,
+    'compact': ('name', 'start', 'end', 'ongoing', 'url', 'feed', 'feedLabel'),
+}
+
+
+def parse_fields(values: Iterable[str]) -> Optional[Tuple[str, ...]]:
+    """Turn ``fields=`` values (comma separated and/or repeated) into the
+    field names to return, or None for all of them.
+
+    Raises ValueError for names that are neither a field nor a preset.
+    """
+    names = [n.strip() for v in values for n in v.split(',') if n.strip()]
+    if not names:
+        return None
+    selected: Dict[str, None] = {}
+    for name in names:
+        if name in FIELD_PRESETS:
+            preset = FIELD_PRESETS[name]
+            if preset is None:
+                return None
+            selected.update(dict.fromkeys(preset))
+        elif name in _VIEW_FIELDS or name in _TAG_FIELDS:
+            selected[name] = None
+        else:
+            raise ValueError("Unknown field '{0}', expected one of: {1}".format(
+                name, ', '.join(FIELD_NAMES + tuple(FIELD_PRESETS))))
+    return tuple(selected)
+
+
+# Fields that change every second; left out with ``relative=0``.
+RELATIVE_FIELDS = ('secondsUntilStart', 'secondsUntilEnd', 'daysRemaining')
+
+
+def absolute_fields(fields: Optional[Sequence[str]]) -> Tuple[str, ...]:
+    """``fields`` for ``relative=0``: without RELATIVE_FIELDS, and always
+    with ``start``/``end``, which ``validUntil`` is derived from.
+
+    Raises ValueError if a relative field was asked for explicitly.
+    """
+    if fields is None:
+        return tuple(n for n in FIELD_NAMES if n not in RELATIVE_FIELDS)
+    for name in fields:
+        if name in RELATIVE_FIELDS:
+            raise ValueError("Field '{0}' is not available with relative=0".format(name))
+    return tuple(dict.fromkeys(('start', 'end') + tuple(fields)))
+
+
+class EventView(_Fields):
+    """A selected occurrence, placed in the display zone relative to ``now``.
+
+    ``feed``/``feed_label`` are set for merged requests only, and only then
+    do ``feed``/``feedLabel`` appear in the output.
+    """
+
+    __slots__ = ('event', 'start_local', 'end_local', 'now_local', 'ongoing', 'feed', 'feed_label')
+
+    def __init__(self, event: ParsedEvent, start_local: datetime.datetime, end_local: datetime.datetime,
+                 now_local: datetime.datetime, ongoing: Optional[bool] = None):
+        self.event = event
+        self.start_local = start_local
+        self.end_local = end_local
+        self.now_local = now_local
+        self.ongoing = start_local <= now_local < end_local if ongoing is None else ongoing
+        self.feed: Optional[int] = None
+        self.feed_label: Optional[str] = None
+
+    def get(self, name: str, default: Any = None) -> Any:
+        field = _VIEW_FIELDS.get(name)
+        if field is None:
+            field = _TAG_FIELDS.get(name) if self.feed is not None else None
+            if field is None:
+                return default
+        return field(self)
+
+    def keys(self) -> Iterator[str]:
+        yield from _VIEW_FIELDS
+        if self.feed is not None:
+            yield from _TAG_FIELDS
+
+    def to_dict(self, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """The JSON object for this event, limited to ``fields`` if given.
+
+        Fields that are not requested are never computed.
+        """
+        if fields is None:
+            return {name: self.get(name) for name in self.keys()}
+        tagged = self.feed is not None
+        return {name: self.get(name) for name in fields if name in _VIEW_FIELDS or (tagged and name in _TAG_FIELDS)}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, EventView):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return "EventView({0!r}, {1!r})".format(self.event.summary, self.start_local)
@@ -0,0 +1,138 @@
+"""Incremental re-parsing of large feeds.
+
+Shared calendars are often megabytes of ICS of which only an event or two
+change between polls. ``split`` cuts a body into its VEVENT blocks, grouped
+by UID (a recurring event and its RECURRENCE-ID overrides have to be parsed
+together), and the *frame*: everything else, i.e. VCALENDAR properties such
+as X-WR-TIMEZONE and the VTIMEZONE definitions every event may refer to.
+
+A ``PartsState`` remembers, for one feed and window, the digest of the frame
+and of every group along with the events parsed from it. When a new version
+of the feed arrives only the groups whose bytes changed are put into a
+small document with the same frame and parsed; the events of all other
+groups are reused as they are.
+
+Events are attributed to their group by UID. Blocks whose UID a parser
+might not report back verbatim (missing, escaped or not ASCII, which
+icalevents replaces with a random one) form one group of their own, keyed
+``None``, that is parsed again whenever any of them changes.
+"""
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from events import ParsedEvent
+
+_VEVENT_RE = re.compile(rb'^BEGIN:VEVENT[ \t]*\r?\n.*?^END:VEVENT[ \t]*(?:\r?\n|\Z)', re.M | re.S | re.I)
+_NESTED_RE = re.compile(rb'^BEGIN:(?!VEVENT)[^\r\n]*\r?\n.*?^END:[^\r\n]*', re.M | re.S | re.I)
+_UID_RE = re.compile(rb'^UID(?:;[^:\r\n]*)?:([^\r\n]*(?:\r?\n[ \t][^\r\n]*)*)', re.M | re.I)
+_FOLD_RE = re.compile(rb'\r?\n[ \t]')
+_END_CALENDAR_RE = re.compile(rb'^END:VCALENDAR', re.M | re.I)
+# Many servers (Google Calendar among them) stamp every VEVENT with the time
+# of the export. Neither parser reads DTSTAMP, so it is left out of digests.
+_DTSTAMP_RE = re.compile(rb'^DTSTAMP[;:][^\r\n]*\r?\n', re.M | re.I)
+
+
+def _digest(parts: Iterable[bytes]) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(_DTSTAMP_RE.sub(b'', part))
+    return h.hexdigest()
+
+
+def block_uid(block: bytes) -> Optional[str]:
+    """The UID of a VEVENT block, or None if it has no usable one."""
+    if block.upper().count(b'BEGIN:') > 1:
+        # VALARMs may carry a UID of their own
+        block = _NESTED_RE.sub(b'', block)
+    match = _UID_RE.search(block)
+    if match is None:
+        return None
+    raw = _FOLD_RE.sub(b'', match.group(1))
+    try:
+        uid = raw.decode('ascii')
+    except UnicodeDecodeError:
+        return None
+    if not uid or '\\' in uid or uid != uid.strip():
+        return None
+    return uid
+
+
+class FeedParts:
+    """A feed body cut into its frame and VEVENT groups."""
+
+    def __init__(self, frame: bytes, groups: Dict[Optional[str], List[bytes]]):
+        self.frame = frame
+        self.groups = groups
+        self.frame_digest = _digest([frame])
+        self.digests = {uid: _digest(blocks) for uid, blocks in groups.items()}
+
+    def document(self, uids: Iterable[Optional[str]]) -> bytes:
+        """A calendar with the frame and only the groups ``uids``."""
+        blocks = [block for uid in uids for block in self.groups[uid]]
+        match = None
+        for match in _END_CALENDAR_RE.finditer(self.frame):
+            pass
+        cut = match.start() if match is not None else len(self.frame)
+        return b''.join([self.frame[:cut]] + blocks + [self.frame[cut:]])
+
+
+def split(body: bytes) -> FeedParts:
+    frame: List[bytes] = []
+    groups: Dict[Optional[str], List[bytes]] = {}
+    pos = 0
+    for match in _VEVENT_RE.finditer(body):
+        frame.append(body[pos:match.start()])
+        pos = match.end()
+        block = match.group(0)
+        groups.setdefault(block_uid(block), []).append(block)
+    frame.append(body[pos:])
+    return FeedParts(b''.join(frame), groups)
+
+
+class PartsState:
+    """The events of each group of one parsed version of a feed."""
+
+    __slots__ = ('frame_digest', 'groups', 'parser')
+
+    def __init__(self, frame_digest: str, groups: Dict[Optional[str], Tuple[str, List[ParsedEvent]]], parser: str):
+        self.frame_digest = frame_digest
+        # uid -> (digest of the group's blocks, its events)
+        self.groups = groups
+        # 'icalevents' or 'fallback', for all of the events
+        self.parser = parser
+
+    def events(self) -> List[ParsedEvent]:
+        return [ev for _, events in self.groups.values() for ev in events]
+
+
+def changed(parts: FeedParts, previous: Optional[PartsState]) -> List[Optional[str]]:
+    """The groups of ``parts`` that cannot be taken from ``previous``."""
+    if previous is None or previous.frame_digest != parts.frame_digest:
+        return list(parts.groups)
+    return [uid for uid, digest in parts.digests.items()
+            if uid not in previous.groups or previous.groups[uid][0] != digest]
+
+
+def assemble(parts: FeedParts, previous: Optional[PartsState], parsed_uids: List[Optional[str]],
+             events: List[ParsedEvent], parser: str) -> Optional[PartsState]:
+    """Combine ``events``, parsed by ``parser`` from the groups
+    ``parsed_uids``, with the unchanged groups of ``previous``, which the
+    caller made sure were parsed by the same parser.
+
+    Returns None if an event cannot be attributed to one of the parsed
+    groups, in which case the result must not be reused.
+    """
+    fresh: Dict[Optional[str], List[ParsedEvent]] = {uid: [] for uid in parsed_uids}
+    for ev in events:
+        uid = ev.uid if ev.uid in fresh and ev.uid is not None else None
+        if uid not in fresh:
+            return None
+        fresh[uid].append(ev)
+    groups: Dict[Optional[str], Tuple[str, List[ParsedEvent]]] = {}
+    for uid, digest in parts.digests.items():
+        if uid in fresh:
+            groups[uid] = (digest, fresh[uid])
+        else:
+            groups[uid] = previous.groups[uid]  # type: ignore[union-attr]
+    return PartsState(parts.frame_digest, groups, parser)
@@ -0,0 +1,117 @@
+"""A sorted index over the occurrences of a parsed feed.
+
+Every request asks the same two questions of a feed's occurrences: which
+are ongoing at ``now``, and which are the next ``limit`` to start after it.
+Parsed feeds are cached and shared between requests (see
+``service.parse_feed``), so instead of placing every occurrence in the
+display zone and comparing it with ``now`` each time, ``IndexedEvents``
+builds an ``OccurrenceIndex`` once per display zone and answers both
+questions with binary searches.
+
+Occurrences are kept sorted by start. "Next after t" is a bisection into
+the start times. For "ongoing at t" the occurrences are also grouped into
+classes of similar length (up to 1 s, 2 s, 4 s, ... 2**k s): an occurrence
+of a class can only still be running if it started less than 2**k seconds
+before ``t``, so each class needs one bisection and looks only at those.
+"""
+import bisect
+import datetime
+import math
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from events import ParsedEvent
+
+# (start, end) of an occurrence in the display zone
+SpanFunction = Callable[[ParsedEvent, Any], Tuple[datetime.datetime, datetime.datetime]]
+# start timestamp, end timestamp, local start, local end, event
+_Row = Tuple[float, float, datetime.datetime, datetime.datetime, ParsedEvent]
+# local start, local end, event, ongoing
+Selected = Tuple[datetime.datetime, datetime.datetime, ParsedEvent, bool]
+
+# Indexes kept per list, one per display zone that asked for it.
+MAX_ZONES = 4
+
+
+def _length_class(seconds: float) -> int:
+    return max(0, math.ceil(math.log2(seconds))) if seconds > 1 else 0
+
+
+class OccurrenceIndex:
+    def __init__(self, spans: Iterable[Tuple[datetime.datetime, datetime.datetime, ParsedEvent]]):
+        # sorted() is stable: occurrences with the same start keep the order
+        # of the feed, as they do when select_events sorts.
+        self._rows: List[_Row] = sorted(((s.timestamp(), e.timestamp(), s, e, ev) for s, e, ev in spans),
+                                        key=lambda row: row[0])
+        self._starts = [row[0] for row in self._rows]
+        classes: Dict[int, List[int]] = {}
+        for i, row in enumerate(self._rows):
+            classes.setdefault(_length_class(row[1] - row[0]), []).append(i)
+        # (longest length in the class, positions in _rows, their starts)
+        self._classes = [(2.0 ** c, positions, [self._starts[i] for i in positions])
+                         for c, positions in sorted(classes.items())]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def ongoing(self, now: float) -> List[int]:
+        """Positions of the occurrences with ``start <= now < end``, in order."""
+        found = []
+        for longest, positions, starts in self._classes:
+            for k in range(bisect.bisect_right(starts, now - longest), bisect.bisect_right(starts, now)):
+                i = positions[k]
+                if self._rows[i][1] > now:
+                    found.append(i)
+        found.sort()
+        return found
+
+    def following(self, now: float, count: Optional[int], include_ended: bool = False) -> List[int]:
+        """Positions of the first ``count`` (all if None) occurrences that are
+        not ongoing at ``now``: those starting after it, preceded by the
+        ended ones if ``include_ended``."""
+        rows = self._rows
+        found: List[int] = []
+        i = 0 if include_ended else bisect.bisect_right(self._starts, now)
+        while i < len(rows) and (count is None or len(found) < count):
+            start, end = rows[i][0], rows[i][1]
+            if start <= now < end:
+                pass  # ongoing, listed by ongoing()
+            elif include_ended or end > now:
+                found.append(i)
+            i += 1
+        return found
+
+    def select(self, now: float, limit: Optional[int], include_ended: bool = False) -> List[Selected]:
+        """What ``select_events`` returns: the ongoing occurrences by start,
+        then the following ones, ``limit`` in total."""
+        ongoing = self.ongoing(now)
+        if limit is not None:
+            ongoing = ongoing[:limit]
+        rest = None if limit is None else limit - len(ongoing)
+        following = self.following(now, rest, include_ended) if rest is None or rest > 0 else []
+        rows = self._rows
+        return ([(rows[i][2], rows[i][3], rows[i][4], True) for i in ongoing]
+                + [(rows[i][2], rows[i][3], rows[i][4], False) for i in following])
+
+
+class IndexedEvents(List[ParsedEvent]):
+    """The events of a parsed feed, with their ``OccurrenceIndex`` per
+    display zone built on first use. Like the plain lists it replaces, it
+    is shared between requests and must not be mutated."""
+
+    def __init__(self, events: Iterable[ParsedEvent] = ()):
+        super().__init__(events)
+        # (zone, index) pairs; a list, as not every tzinfo is hashable
+        self._indexes: List[Tuple[Any, OccurrenceIndex]] = []
+        self._lock = threading.Lock()
+
+    def index(self, local_tz, span: SpanFunction) -> OccurrenceIndex:
+        for zone, index in self._indexes:
+            if zone is local_tz or zone == local_tz:
+                return index
+        # Built outside the lock: two requests racing both build it, which
+        # costs as much as the linear scan each would have done.
+        index = OccurrenceIndex((s, e, ev) for ev in self for s, e in (span(ev, local_tz),))
+        with self._lock:
+            self._indexes = self._indexes[-(MAX_ZONES - 1):] + [(local_tz, index)]
+        return index
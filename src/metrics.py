@@ -0,0 +1,234 @@
+"""Prometheus metrics for ``GET /metrics``.
+
+A deliberately small, dependency free implementation of counters and
+histograms in the Prometheus text format. Values are kept per process, like
+the ``/stats`` counters, so with several gunicorn workers each scrape sees
+the worker that answered it.
+
+Feeds are labelled with ``feed_id(url)``, a short hash of the URL: feed URLs
+often carry secret tokens and must not end up in a monitoring system. Any
+URL can be requested, so only the first ``METRICS_MAX_FEEDS`` feeds get a
+label of their own and the rest share ``feed="other"``, which keeps the
+number of series bounded.
+"""
+import abc
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Sequence, Set, Tuple
+
+import config
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+OTHER_FEED = 'other'
+
+_feed_ids: Set[str] = set()
+_feed_ids_lock = threading.Lock()
+
+
+def feed_id(url: str) -> str:
+    digest = hashlib.sha256(url.encode('utf-8')).hexdigest()[:12]
+    with _feed_ids_lock:
+        if digest in _feed_ids:
+            return digest
+        if len(_feed_ids) >= config.METRICS_MAX_FEEDS:
+            return OTHER_FEED
+        _feed_ids.add(digest)
+    return digest
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs: Sequence[Tuple[str, Any]]) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(k, _escape(v)) for k, v in pairs) + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Mapping[str, Any]) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError("{0} expects labels {1}".format(self.name, self.labelnames))
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        ...
+
+    def render(self) -> List[str]:
+        return ['# HELP {0} {1}'.format(self.name, self.documentation),
+                '# TYPE {0} {1}'.format(self.name, self.kind)] + self._samples()
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        if not config.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return ['{0}{1} {2}'.format(self.name, _labels(list(zip(self.labelnames, key))), _number(v))
+                for key, v in items]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # per label set: [count per bucket..., sum]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        if not config.METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return int(sum(state[:-1])) if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, state in items:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets, state):
+                cumulative += n
+                lines.append('{0}_bucket{1} {2}'.format(self.name, _labels(pairs + [('le', _number(bound))]), cumulative))
+            lines.append('{0}_sum{1} {2}'.format(self.name, _labels(pairs), _number(state[-1])))
+            lines.append('{0}_count{1} {2}'.format(self.name, _labels(pairs), cumulative))
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+stage_seconds = Histogram(
+    'ical_stage_duration_seconds',
+    'Time spent per feed in each stage: fetch (including cache hits), upstream (the HTTP request), '
+    'parse, expand (lazy recurrence expansion), select (filter, sort) and enrich (building the response '
+    'events; feed="merged" for responses combining several feeds).',
+    ('stage', 'feed'))
+serialize_seconds = Histogram(
+    'ical_serialize_duration_seconds',
+    'Time spent encoding /events responses.')
+downloaded_bytes = Counter(
+    'ical_downloaded_bytes_total',
+    'Feed bytes downloaded from calendar servers.',
+    ('feed',))
+upstream_responses = Counter(
+    'ical_upstream_responses_total',
+    'Answers of calendar servers by status code ("error" when no answer arrived).',
+    ('feed', 'status'))
+events_count = Counter(
+    'ical_events_total',
+    'Events parsed from feeds, generated by lazy expansion and returned to clients.',
+    ('feed', 'kind'))
+parses = Counter(
+    'ical_parses_total',
+    'Feed parses by the parser that produced the events (icalevents or fallback).',
+    ('feed', 'parser'))
+parsed_groups = Counter(
+    'ical_incremental_groups_total',
+    'VEVENT groups of incrementally parsed feeds, reused from the previous version or parsed again.',
+    ('feed', 'kind'))
+
+METRICS: List[_Metric] = [stage_seconds, serialize_seconds, downloaded_bytes, upstream_responses, events_count, parses,
+                          parsed_groups]
+
+
+def _cache_lines(caches: Mapping[str, Mapping[str, Any]]) -> List[str]:
+    lines = []
+    for field, name, kind, documentation in (
+            ('hits', 'ical_cache_hits_total', 'counter', 'Cache lookups that found an entry.'),
+            ('misses', 'ical_cache_misses_total', 'counter', 'Cache lookups that found nothing.'),
+            ('entries', 'ical_cache_entries', 'gauge', 'Entries currently held by a cache.')):
+        lines += ['# HELP {0} {1}'.format(name, documentation), '# TYPE {0} {1}'.format(name, kind)]
+        for cache, stats in sorted(caches.items()):
+            if field in stats:
+                lines.append('{0}{1} {2}'.format(name, _labels([('cache', cache)]), stats[field]))
+    return lines
+
+
+def render(caches: Mapping[str, Mapping[str, Any]]) -> str:
+    """All metrics in the Prometheus text format; ``caches`` is a
+    ``/stats``-style mapping of cache name to its counters."""
+    lines: List[str] = []
+    for metric in METRICS:
+        lines += metric.render()
+    lines += _cache_lines(caches)
+    return '\n'.join(lines) + '\n'
+
+
+def clear() -> None:
+    for metric in METRICS:
+        metric.clear()
+    with _feed_ids_lock:
+        _feed_ids.clear()
@@ -0,0 +1,144 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import config
+import service
+
+logger = logging.getLogger(__name__)
+
+
+class _TrackedFeed:
+    __slots__ = ('url', 'lookback_days', 'horizon_days', 'username', 'password',
+                 'last_requested', 'next_refresh', 'failures')
+
+    def __init__(self, url: str, lookback_days: int, horizon_days: int,
+                 username: Optional[str], password: Optional[str], now: float, next_refresh: float):
+        self.url = url
+        self.lookback_days = lookback_days
+        self.horizon_days = horizon_days
+        self.username = username
+        self.password = password
+        self.last_requested = now
+        self.next_refresh = next_refresh
+        self.failures = 0
+
+
+class Prefetcher:
+    """Keeps recently requested feeds warm in the service caches.
+
+    ``track`` is called for every ``/events`` request. A daemon thread then
+    re-runs ``refresh`` for each tracked feed roughly every ``interval``
+    seconds, so widget polls are answered from cache instead of waiting for
+    the upstream. Failing feeds back off exponentially up to
+    ``max_backoff``; feeds that have not been requested for ``idle_timeout``
+    seconds are forgotten.
+    """
+
+    def __init__(self,
+                 refresh: Callable[[str, int, int, Optional[str], Optional[str]], None],
+                 interval: float,
+                 jitter: float = 0.1,
+                 max_backoff: float = 3600,
+                 idle_timeout: float = 3600,
+                 clock: Callable[[], float] = time.monotonic):
+        self.refresh = refresh
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self._feeds: Dict[Tuple, _TrackedFeed] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _delay(self, base: float) -> float:
+        if self.jitter <= 0:
+            return base
+        return base * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def track(self, url: str, lookback_days: int, horizon_days: int,
+              username: Optional[str], password: Optional[str]) -> None:
+        url = service.normalize_ics_url(url)
+        key = (url, service.auth_identity(username, password), lookback_days, horizon_days)
+        now = self.clock()
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is None:
+                self._feeds[key] = _TrackedFeed(url, lookback_days, horizon_days, username, password,
+                                                now, now + self._delay(self.interval))
+            else:
+                feed.last_requested = now
+        self._ensure_running()
+
+    def tracked(self) -> int:
+        with self._lock:
+            return len(self._feeds)
+
+    def run_pending(self) -> float:
+        """Refresh all due feeds and drop idle ones.
+
+        Returns the number of seconds until the next feed is due.
+        """
+        now = self.clock()
+        with self._lock:
+            for key in [k for k, f in self._feeds.items() if now - f.last_requested > self.idle_timeout]:
+                del self._feeds[key]
+            due = [f for f in self._feeds.values() if f.next_refresh <= now]
+
+        for feed in due:
+            try:
+                self.refresh(feed.url, feed.lookback_days, feed.horizon_days, feed.username, feed.password)
+            except Exception:
+                feed.failures += 1
+                backoff = min(self.max_backoff, self.interval * (2 ** feed.failures))
+                feed.next_refresh = self.clock() + self._delay(backoff)
+                logger.warning("Prefetch of feed failed (%d in a row), retrying in %.0fs",
+                               feed.failures, feed.next_refresh - self.clock())
+            else:
+                feed.failures = 0
+                feed.next_refresh = self.clock() + self._delay(self.interval)
+
+        with self._lock:
+            if not self._feeds:
+                return self.interval
+            return max(0.0, min(f.next_refresh for f in self._feeds.values()) - self.clock())
+
+    def _ensure_running(self) -> None:
+        # Started lazily so that each forked gunicorn worker gets its own
+        # thread, even when the app module was imported before the fork.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='feed-prefetcher', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                delay = self.run_pending()
+            except Exception:
+                logger.exception("Prefetcher iteration failed")
+                delay = self.interval
+            self._stop.wait(delay)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+prefetcher = Prefetcher(
+    service.refresh_feed,
+    interval=config.PREFETCH_INTERVAL,
+    jitter=config.PREFETCH_JITTER,
+    max_backoff=config.PREFETCH_MAX_BACKOFF,
+    idle_timeout=config.PREFETCH_IDLE,
+)
@@ -0,0 +1,186 @@
+"""Lazy, chronological expansion of recurring events.
+
+icalevents expands every RRULE across the whole requested window before we
+get to pick the handful of events a widget shows. The helpers here instead
+build a small index of event series once per feed and then generate
+occurrences on demand, merged across all series in start order, so the
+caller can stop as soon as it has enough.
+"""
+import datetime
+import heapq
+import re
+from typing import Dict, Iterator, List, Optional, Set
+
+import pytz
+from dateutil import rrule
+from dateutil import tz as dateutil_tz
+from icalendar import Calendar
+
+from events import ParsedEvent
+
+_UNTIL_RE = re.compile(r"UNTIL=(\d{8})(T\d{6})?(Z?)")
+
+
+def _normalize(value) -> datetime.datetime:
+    """Dates become UTC midnight, floating times UTC; aware times are kept.
+
+    This mirrors what icalevents and the fallback parser do, so all three
+    produce the same instants for the same feed. pytz zones are swapped for
+    their dateutil equivalent: rrule builds occurrences with ``replace``,
+    which would pin a pytz zone to the offset of the first occurrence and
+    shift everything after a DST change by an hour.
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=pytz.utc)
+        zone = getattr(value.tzinfo, 'zone', None)
+        if zone and zone != 'UTC' and hasattr(value.tzinfo, 'localize'):
+            tz = dateutil_tz.gettz(zone)
+            if tz is not None:
+                return value.replace(tzinfo=tz)
+        return value
+    return datetime.datetime(value.year, value.month, value.day, tzinfo=pytz.utc)
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _date_values(prop) -> List[datetime.datetime]:
+    values = []
+    for item in _as_list(prop):
+        for d in getattr(item, 'dts', []):
+            if isinstance(d.dt, (datetime.datetime, datetime.date)):
+                values.append(_normalize(d.dt))
+    return values
+
+
+def _rule_text(prop, start: datetime.datetime) -> str:
+    # Starts are always timezone-aware after _normalize, and dateutil then
+    # insists on a UTC UNTIL. A plain date or floating time is read in the
+    # zone of DTSTART (a date as the end of that day), as RFC 5545 says.
+    def fix(m):
+        if m.group(3):
+            return m.group(0)
+        local = datetime.datetime.strptime(m.group(1) + (m.group(2) or 'T235959'), '%Y%m%dT%H%M%S')
+        if hasattr(start.tzinfo, 'localize'):
+            until = start.tzinfo.localize(local)
+        else:
+            until = local.replace(tzinfo=start.tzinfo)
+        return 'UNTIL=' + until.astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')
+    return _UNTIL_RE.sub(fix, prop.to_ical().decode('utf-8'))
+
+
+class Series:
+    """One VEVENT: either a single event or the master of a recurrence."""
+
+    __slots__ = ('fields', 'start', 'duration', 'all_day', 'rule', 'overridden', 'recurrence_id')
+
+    def __init__(self, component):
+        raw_start = component.get('DTSTART').dt
+        self.all_day = not isinstance(raw_start, datetime.datetime)
+        self.start = _normalize(raw_start)
+
+        if component.get('DTEND') is not None:
+            self.duration = _normalize(component.get('DTEND').dt) - self.start
+        elif component.get('DURATION') is not None:
+            self.duration = component.get('DURATION').dt
+        else:
+            self.duration = datetime.timedelta(days=1) if self.all_day else datetime.timedelta(0)
+
+        def text(name):
+            value = component.get(name)
+            return str(value) if value is not None else None
+
+        def when(name):
+            value = component.get(name)
+            return value.dt if value is not None else None
+
+        self.fields = {
+            'summary': text('SUMMARY'),
+            'uid': text('UID'),
+            'description': text('DESCRIPTION'),
+            'location': text('LOCATION'),
+            'status': text('STATUS'),
+            'url': text('URL'),
+            'created': when('CREATED'),
+            'last_modified': when('LAST-MODIFIED'),
+        }
+        self.recurrence_id = when('RECURRENCE-ID')
+        self.overridden: Set[datetime.datetime] = set()
+
+        rules = _as_list(component.get('RRULE'))
+        rdates = _date_values(component.get('RDATE'))
+        if rules or rdates:
+            self.rule = rrule.rruleset()
+            for r in rules:
+                self.rule.rrule(rrule.rrulestr(_rule_text(r, self.start), dtstart=self.start))
+            for d in rdates:
+                self.rule.rdate(d)
+            for d in _date_values(component.get('EXDATE')):
+                self.rule.exdate(d)
+        else:
+            self.rule = None
+
+    def _occurrence(self, start: datetime.datetime) -> ParsedEvent:
+        start = start.astimezone(pytz.utc)
+        return ParsedEvent(self.fields, start=start, end=start + self.duration, all_day=self.all_day,
+                           recurrence_id=self.recurrence_id, source='lazy')
+
+    def occurrences(self, window_start: datetime.datetime, window_end: datetime.datetime) -> Iterator[ParsedEvent]:
+        """Occurrences overlapping ``[window_start, window_end)``, by start."""
+        if self.rule is None:
+            if self.start < window_end and self.start + self.duration > window_start:
+                yield self._occurrence(self.start)
+            return
+        for occ in self.rule.xafter(window_start - self.duration, inc=True):
+            if occ >= window_end:
+                return
+            if occ.astimezone(pytz.utc) in self.overridden or occ + self.duration <= window_start:
+                continue
+            yield self._occurrence(occ)
+
+
+def build_index(ics_text: str) -> List[Series]:
+    """Parse a feed into its event series, linking RECURRENCE-ID overrides
+    to the occurrences of their master they replace."""
+    calendar = Calendar.from_ical(ics_text)
+    series: List[Series] = []
+    masters: Dict[str, Series] = {}
+    overrides: List[Series] = []
+    for component in calendar.walk('VEVENT'):
+        if component.get('DTSTART') is None:
+            continue
+        s = Series(component)
+        series.append(s)
+        if s.recurrence_id is not None:
+            overrides.append(s)
+        elif s.rule is not None:
+            masters[s.fields['uid']] = s
+    for s in overrides:
+        master = masters.get(s.fields['uid'])
+        if master is not None:
+            master.overridden.add(_normalize(s.recurrence_id).astimezone(pytz.utc))
+    return series
+
+
+def expand(index: List[Series], start: datetime.datetime, end: datetime.datetime,
+           now: datetime.datetime, limit: Optional[int]) -> List[ParsedEvent]:
+    """Occurrences in ``[start, end)`` in start order, stopping once ``limit``
+    events starting after ``now`` have been produced.
+
+    Everything that is already ongoing at ``now`` comes before that point in
+    the merged stream, so it is always included.
+    """
+    merged = heapq.merge(*(s.occurrences(start, end) for s in index), key=lambda ev: ev.start)
+    results: List[ParsedEvent] = []
+    upcoming = 0
+    for ev in merged:
+        if limit is not None and upcoming >= limit and ev.start > now:
+            break
+        results.append(ev)
+        if ev.start > now:
+            upcoming += 1
+    return results
@@ -0,0 +1,160 @@
+"""Encoding and caching of ``/events`` responses.
+
+Widgets poll the same query over and over, and most of the time nothing has
+changed in between. Responses are therefore encoded once per query and
+time bucket (``ICAL_RESPONSE_CACHE_BUCKET`` seconds) and the bytes are
+served until the bucket ends, with a strong ``ETag`` and a matching
+``Cache-Control`` so Glance and reverse proxies can revalidate with
+``If-None-Match`` and get a 304.
+
+The staleness contract: a response describes the calendar as of the start
+of its bucket. ``secondsUntilStart``, ``secondsUntilEnd``, ``daysRemaining``
+and ``ongoing`` are computed against that instant, not the moment the bytes
+are sent, and ``max-age`` is the time left until the bucket ends. Because
+the reference time is the same for everyone, every worker produces the same
+bytes, and thus the same ETag, for the same feed content.
+"""
+import datetime
+import hashlib
+import json
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import pytz
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+import config
+import metrics
+import service
+import timing
+from cache import LRUCache
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
+
+def _default(o: Any) -> Any:
+    # What Flask's provider does for the types that can end up in a payload.
+    if isinstance(o, datetime.date):
+        return http_date(o)
+    raise TypeError("Object of type {0} is not JSON serializable".format(type(o).__name__))
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, default=_default, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON with sorted keys, as Flask would produce it.
+
+    orjson is used when available (and not switched off with
+    ``ICAL_JSON_ENCODER=json``); it only differs in leaving non-ASCII
+    characters unescaped.
+    """
+    if HAS_ORJSON and config.JSON_ENCODER != 'json':
+        try:
+            return orjson.dumps(obj, default=_default,
+                                option=orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # e.g. non-string keys or integers beyond 64 bit
+            pass
+    return _stdlib_dumps(obj)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Makes ``jsonify`` use ``dumps``."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj).decode('utf-8')
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b'\n', mimetype=self.mimetype)
+
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'expires', 'private')
+
+    def __init__(self, body: bytes, expires: float, private: bool):
+        self.body = body
+        self.etag = '"{0}"'.format(hashlib.blake2b(body, digest_size=16).hexdigest())
+        self.expires = expires
+        self.private = private
+
+    def headers(self, now: Optional[float] = None) -> List[Tuple[str, str]]:
+        now = time.time() if now is None else now
+        max_age = int(self.expires - now)
+        if max_age <= 0:
+            control = 'no-cache'
+        else:
+            control = '{0}, max-age={1}'.format('private' if self.private else 'public', max_age)
+        return [('ETag', self.etag), ('Cache-Control', control)]
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an ``If-None-Match`` header names this response."""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        # If-None-Match uses the weak comparison.
+        tags = [t.strip() for t in if_none_match.split(',')]
+        return any((t[2:] if t.startswith('W/') else t) == self.etag for t in tags)
+
+
+response_cache = LRUCache(config.RESPONSE_CACHE_SIZE)
+
+
+def _is_private(query: Dict[str, Any]) -> bool:
+    return any(f.get('username') or f.get('password') for f in query['feeds'])
+
+
+def query_key(query: Dict[str, Any]) -> Hashable:
+    """Everything a validated ``events_query`` result is answered from."""
+    feeds = tuple((f['url'], service.auth_identity(f.get('username'), f.get('password')), f.get('label'))
+                  for f in query['feeds'])
+    return (feeds, query['limit'], query['lookback_days'], query['horizon_days'],
+            query['expand'], query['tz'], query['fields'], query['relative'])
+
+
+def bucket(query: Dict[str, Any], clock=time.time) -> Tuple[Hashable, datetime.datetime, float]:
+    """The cache key, reference time and expiry for answering ``query`` now.
+
+    ``relative=0`` responses do not go stale with time, only when an event
+    starts or ends (``validUntil``, applied in ``store``) or the feed
+    changes, so they are kept for ``ICAL_FEED_CACHE_TTL`` at most.
+    """
+    now = clock()
+    size = config.RESPONSE_CACHE_BUCKET
+    if not query['relative'] and config.FEED_CACHE_TTL > 0:
+        return (query_key(query), None), datetime.datetime.fromtimestamp(now, pytz.utc), now + config.FEED_CACHE_TTL
+    if size <= 0:
+        return None, datetime.datetime.fromtimestamp(now, pytz.utc), now
+    start = now - now % size
+    return (query_key(query), int(start)), datetime.datetime.fromtimestamp(start, pytz.utc), start + size
+
+
+def lookup(key: Hashable, clock=time.time) -> Optional[CachedResponse]:
+    if key is None:
+        return None
+    cached = response_cache.get(key)
+    if cached is not None and cached.expires <= clock():
+        response_cache.pop(key)
+        return None
+    return cached
+
+
+def store(key: Hashable, query: Dict[str, Any], payload: Any, expires: float) -> CachedResponse:
+    valid_until = payload.get('validUntil') if isinstance(payload, dict) else None
+    if valid_until:
+        expires = min(expires, datetime.datetime.fromisoformat(valid_until).timestamp())
+    with timing.measure('serialize', metrics.serialize_seconds):
+        body = dumps(payload) + b'\n'
+    cached = CachedResponse(body, expires, _is_private(query))
+    if key is not None:
+        response_cache.set(key, cached)
+    return cached
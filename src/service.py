@@ -1,14 +1,52 @@
+import codecs
 import datetime
+import hashlib
+import io
+import heapq
+import logging
+import multiprocessing
+import threading
+import time
 import pytz
 import re
-from urllib3 import PoolManager, make_headers
 from urllib.parse import unquote
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Sequence, Tuple
 from icalevents.icalevents import events as ical_fetch
 from dateutil import parser as date_parser
 from icalevents.icalparser import Event as ICalEvent
 
-http = PoolManager()
+import backends
+import config
+import incremental
+import intervals
+import metrics
+import timing
+import recurrence
+import snapshots as snapshot_store
+import timezones
+import upstream
+from cache import LRUCache, FeedEntry, SingleFlight
+from events import EventView, ParsedEvent
+
+logger = logging.getLogger(__name__)
+
+http = upstream.build_pool_manager()
+
+# Raw ICS bodies keyed by (url, auth identity); see fetch_feed_body. Shared
+# between worker processes unless ICAL_CACHE_BACKEND is 'memory'.
+feed_cache = backends.create_backend(config.CACHE_BACKEND, config.FEED_CACHE_SIZE)
+# Parsed events keyed by (body hash, window bucket); see parse_feed.
+parse_cache = LRUCache(config.PARSE_CACHE_SIZE)
+# Both of the above, persisted across restarts; None unless
+# ICAL_SNAPSHOT_PATH is set.
+snapshots = snapshot_store.SnapshotStore(config.SNAPSHOT_PATH, config.SNAPSHOT_MAX_BYTES) if config.SNAPSHOT_PATH else None
+# Concurrent fetch_raw_events calls for the same feed and window share one
+# download and parse.
+inflight = SingleFlight()
+# Upstream requests currently running, keyed like feed_cache.
+downloads = SingleFlight()
 
 # Matches a percent-encoded '%' character (i.e. "%25") immediately followed
 # by two more hex digits. A raw ICS URL practically never legitimately
@@ -17,7 +55,18 @@ http = PoolManager()
 _DOUBLE_ENCODED_RE = re.compile(r"%25[0-9A-Fa-f]{2}")
 
 
-class ParsedEvent(Dict[str, Any]):
+class FeedTooLarge(Exception):
+    """The upstream body exceeded ``MAX_FEED_BYTES``."""
+
+
+class UpstreamError(Exception):
+    """The calendar server answered with an error and no copy of the feed
+    was cached."""
+
+
+class FeedSpec(Dict[str, Any]):
+    """One feed of a merged request: ``url`` plus optional ``username``,
+    ``password`` and ``label``."""
     pass
 
 
@@ -57,185 +106,872 @@ def clamp_int(value: Optional[int], minimum: int, maximum: int, default: int) ->
     return v
 
 
+def _unfold(lines: Iterable[str]) -> Iterator[str]:
+    """Join RFC 5545 folded lines (a line break followed by a space or tab)."""
+    current: Optional[str] = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if current is not None and line[:1] in (' ', '\t'):
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _split_property(line: str):
+    """Split ``NAME;P1=a;P2="b:c":value`` into name, params and value."""
+    head, sep, value = line.partition(':')
+    if '"' in head:
+        # A quoted parameter value may itself contain ':'
+        in_quotes = False
+        for i, ch in enumerate(line):
+            if ch == '"':
+                in_quotes = not in_quotes
+            elif ch == ':' and not in_quotes:
+                head, sep, value = line[:i], ':', line[i + 1:]
+                break
+        else:
+            return None
+    if not sep:
+        return None
+    name, _, rest = head.partition(';')
+    params: Dict[str, str] = {}
+    if rest:
+        for part in rest.split(';'):
+            key, _, val = part.partition('=')
+            params[key.strip().upper()] = val.strip().strip('"')
+    return name.strip().upper(), params, value
+
+
+def _unescape_text(value: str) -> str:
+    if '\\' not in value:
+        return value
+    return (value.replace('\\\\', '\x00').replace('\\n', '\n').replace('\\N', '\n')
+            .replace('\\,', ',').replace('\\;', ';').replace('\x00', '\\'))
+
+
+def _parse_ics_datetime(raw: str) -> datetime.datetime:
+    # Fast paths for the basic formats nearly every feed uses.
+    if len(raw) == 16 and raw[8] == 'T' and raw[15] == 'Z':
+        return datetime.datetime.strptime(raw, '%Y%m%dT%H%M%SZ').replace(tzinfo=pytz.utc)
+    if len(raw) == 15 and raw[8] == 'T':
+        return datetime.datetime.strptime(raw, '%Y%m%dT%H%M%S')
+    if len(raw) == 8 and raw.isdigit():  # date only
+        return datetime.datetime.strptime(raw, '%Y%m%d')
+    if raw.endswith('Z'):
+        return date_parser.isoparse(raw)
+    return date_parser.parse(raw)
+
+
+_TEXT_PROPERTIES = ('SUMMARY', 'UID', 'DESCRIPTION', 'LOCATION', 'STATUS')
+_WANTED_PROPERTIES = frozenset(_TEXT_PROPERTIES + ('DTSTART', 'DTEND'))
+
+
+def _feed_zone(feed_zones: Dict[str, Any], tzid: str):
+    """Zone from a VTIMEZONE block of the feed, built on first use."""
+    zone = feed_zones.get(tzid)
+    if isinstance(zone, list):
+        zone = feed_zones[tzid] = timezones.from_vtimezone(zone)
+    return zone
+
+
+def _zone(tzid: Optional[str], feed_zones: Dict[str, Any]):
+    if not tzid:
+        return None
+    return timezones.resolve(tzid) or _feed_zone(feed_zones, tzid)
+
+
+def _waits_for_zone(props: Dict[str, Any], feed_zones: Dict[str, Any]) -> bool:
+    """Whether the event uses a TZID that only a VTIMEZONE further down the
+    feed could define."""
+    for name in ('DTSTART', 'DTEND'):
+        prop = props.get(name)
+        tzid = prop[0].get('TZID') if prop else None
+        if tzid and tzid not in feed_zones and timezones.resolve(tzid) is None:
+            return True
+    return False
+
+
+def _fallback_event(props: Dict[str, Any], feed_zones: Dict[str, Any]) -> Optional[ParsedEvent]:
+    if 'DTSTART' not in props:
+        return None
+    start_params, dtstart_raw = props['DTSTART']
+    dtend = props.get('DTEND')
+    dtend_raw = dtend[1] if dtend else None
+
+    try:
+        start_dt = _parse_ics_datetime(dtstart_raw)
+        end_dt = _parse_ics_datetime(dtend_raw) if dtend_raw else start_dt
+    except Exception:
+        return None
+
+    # DTEND has its own TZID; without one it is taken to be in DTSTART's.
+    start_zone = start_params.get('TZID')
+    end_zone = (dtend[0].get('TZID') if dtend else None) or start_zone
+    start_dt = timezones.localize(start_dt, _zone(start_zone, feed_zones) if start_dt.tzinfo is None else None)
+    end_dt = timezones.localize(end_dt, _zone(end_zone, feed_zones) if end_dt.tzinfo is None else None)
+
+    # VALUE=DATE, or a bare 8 digit date, marks an all-day event
+    all_day = start_params.get('VALUE', '').upper() == 'DATE' or (len(dtstart_raw) == 8 and dtstart_raw.isdigit())
+
+    def text(name: str) -> Optional[str]:
+        prop = props.get(name)
+        return _unescape_text(prop[1]) if prop else None
+
+    return ParsedEvent(
+        summary=text('SUMMARY'),
+        uid=text('UID'),
+        start=start_dt,
+        end=end_dt,
+        description=text('DESCRIPTION'),
+        location=text('LOCATION'),
+        status=text('STATUS'),
+        all_day=all_day,
+        source='fallback'
+    )
+
+
+def iter_fallback_events(lines: Iterable[str]) -> Iterator[ParsedEvent]:
+    """Single pass over the (possibly folded) lines of an ICS document.
+
+    Every line is looked at once: folded lines are joined, and properties
+    of each VEVENT are collected as ``(params, value)`` until its END, at
+    which point the event is built. Properties of nested components such as
+    VALARM are ignored. VTIMEZONE blocks are kept aside for TZIDs that
+    ``timezones.resolve`` does not know. Events are yielded as soon as they
+    are complete, so ``lines`` may be a lazy stream; only events using a
+    TZID no VTIMEZONE has defined yet wait for the end of the calendar, as
+    RFC 5545 allows VTIMEZONEs after the events.
+    """
+    props: Optional[Dict[str, Any]] = None
+    nested = 0
+    feed_zones: Dict[str, Any] = {}
+    zone_lines: Optional[List[str]] = None
+    waiting: List[Dict[str, Any]] = []
+    for line in _unfold(lines):
+        if not line:
+            continue
+        upper = line[:15].upper()
+        if zone_lines is not None:
+            zone_lines.append(line)
+            if upper.startswith('END:VTIMEZONE'):
+                tzid = next((p[2].strip() for p in map(_split_property, zone_lines) if p and p[0] == 'TZID'), None)
+                if tzid:
+                    feed_zones[tzid] = zone_lines
+                zone_lines = None
+            continue
+        if upper.startswith('BEGIN:'):
+            if upper.startswith('BEGIN:VEVENT') and props is None:
+                props = {}
+            elif props is not None:
+                nested += 1
+            elif upper == 'BEGIN:VTIMEZONE':
+                zone_lines = [line]
+            continue
+        if upper.startswith('END:'):
+            if props is not None:
+                if nested:
+                    nested -= 1
+                elif upper.startswith('END:VEVENT'):
+                    if _waits_for_zone(props, feed_zones):
+                        waiting.append(props)
+                        event = None
+                    else:
+                        event = _fallback_event(props, feed_zones)
+                    props = None
+                    if event is not None:
+                        yield event
+            elif upper.startswith('END:VCALENDAR'):
+                yield from _completed(waiting, feed_zones)
+            continue
+        if props is None or nested:
+            continue
+        prop = _split_property(line)
+        if prop is None:
+            continue
+        name, params, value = prop
+        if name in _WANTED_PROPERTIES and name not in props:
+            props[name] = (params, value.strip())
+    yield from _completed(waiting, feed_zones)
+
+
+def _completed(waiting: List[Dict[str, Any]], feed_zones: Dict[str, Any]) -> Iterator[ParsedEvent]:
+    """Build the events that waited for the VTIMEZONEs; empties ``waiting``."""
+    for props in waiting:
+        event = _fallback_event(props, feed_zones)
+        if event is not None:
+            yield event
+    waiting.clear()
+
+
 def _fallback_parse(ics_text: str) -> List[ParsedEvent]:
     """Very small, defensive parser for VEVENT blocks when icalevents chokes.
     Only extracts DTSTART/DTEND/SUMMARY/UID/DESCRIPTION/LOCATION/STATUS.
     """
-    vevents = re.findall(r"BEGIN:VEVENT(.*?)END:VEVENT", ics_text, flags=re.DOTALL | re.IGNORECASE)
-    results: List[ParsedEvent] = []
-    for block in vevents:
-        m = re.search(r"^DTSTART(?:;([^:]+))?:(.+)$", block, flags=re.MULTILINE)
-        if not m:
-            continue
-        params = m.group(1) or ''
-        dtstart_raw = m.group(2).strip()
-        m2 = re.search(r"^DTEND(?:;([^:]+))?:(.+)$", block, flags=re.MULTILINE)
-        dtend_raw = m2.group(2).strip() if m2 else None
-
-        def _grab(name: str):
-            mm = re.search(rf"^{name}:(.+)$", block, flags=re.MULTILINE)
-            return mm.group(1).strip() if mm else None
-
-        summary = _grab('SUMMARY')
-        uid = _grab('UID')
-        description = _grab('DESCRIPTION')
-        location = _grab('LOCATION')
-        status = _grab('STATUS')
-
-        tzname = None
-        if 'TZID=' in params:
-            mtz = re.search(r"TZID=([^;]+)", params)
-            if mtz:
-                tzname = mtz.group(1)
-
-        def _parse_dt(raw: str):
-            if raw.endswith('Z'):
-                return date_parser.isoparse(raw)
-            if re.match(r"^\d{8}$", raw):  # date only
-                d = datetime.datetime.strptime(raw, '%Y%m%d').date()
-                return datetime.datetime(d.year, d.month, d.day)
-            return date_parser.parse(raw)
+    return list(iter_fallback_events(io.StringIO(ics_text)))
+
+
+_STREAM_CHUNK = 64 * 1024
+
+
+def _body_chunks(body: bytes) -> Iterator[memoryview]:
+    view = memoryview(body)
+    for i in range(0, len(view), _STREAM_CHUNK):
+        yield view[i:i + _STREAM_CHUNK]
+
+
+def iter_text_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decode UTF-8 chunks incrementally and yield complete lines.
+
+    Only the current chunk and a partial line are held as text at any time,
+    never the whole decoded document.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    pending = ''
+    for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        pending = lines.pop()
+        yield from lines
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def _stream_parse(body: bytes) -> List[ParsedEvent]:
+    return list(iter_fallback_events(iter_text_lines(_body_chunks(body))))
+
+
+def auth_identity(username: Optional[str], password: Optional[str]) -> str:
+    """Stable, non-reversible identity for the credentials used on a feed.
+
+    Used as part of cache keys so that two users sharing a feed URL with
+    different credentials never see each other's data, without keeping the
+    plain password around in the key.
+    """
+    if username is None or password is None:
+        return ''
+    return hashlib.sha256("{0}:{1}".format(username, password).encode('utf-8')).hexdigest()
 
+
+def fetch_feed_body(url: str, username: Optional[str], password: Optional[str], revalidate: bool = False) -> bytes:
+    """Download the raw ICS body, reusing the cached copy where possible.
+
+    A cached body younger than ``FEED_CACHE_TTL`` is returned without any
+    upstream request. Older entries are revalidated with ``If-None-Match`` /
+    ``If-Modified-Since`` and reused on ``304 Not Modified``; while such a
+    revalidation is already running, other callers get the stale body
+    instead of waiting for it. ``revalidate=True`` skips the freshness check
+    and always asks the upstream (used by the prefetcher).
+
+    With a shared cache backend the download additionally holds the
+    backend's lock for the feed, and whoever gets it second finds the body
+    the first one stored instead of downloading it again.
+    """
+    with timing.stage('fetch', metrics.feed_id(url)):
+        return _fetch_body(url, username, password, revalidate)
+
+
+def _fetch_body(url: str, username: Optional[str], password: Optional[str], revalidate: bool) -> bytes:
+    key = (url, auth_identity(username, password))
+    entry = _cached_entry(key)
+    if entry is not None and not revalidate:
+        if time.monotonic() - entry.fetched_at < config.FEED_CACHE_TTL:
+            return entry.body
+        if downloads.in_flight(key):
+            return entry.body
+    return downloads.do(key, lambda: _shared_download(url, username, password, key, entry, revalidate))
+
+
+def _shared_download(url: str, username: Optional[str], password: Optional[str], key, entry: Optional[FeedEntry], revalidate: bool) -> bytes:
+    with feed_cache.lock(key):
+        if feed_cache.shared:
+            latest: Optional[FeedEntry] = feed_cache.latest(key)
+            if latest is not None:
+                # Prefetchers of all workers refresh the same feeds; one
+                # revalidation per half interval is plenty.
+                fresh_for = config.PREFETCH_INTERVAL / 2 if revalidate else config.FEED_CACHE_TTL
+                if time.monotonic() - latest.fetched_at < fresh_for:
+                    return latest.body
+                entry = latest
+        return _download(url, username, password, key, entry)
+
+
+def _cached_entry(key) -> Optional[FeedEntry]:
+    entry: Optional[FeedEntry] = feed_cache.get(key)
+    if entry is None and snapshots is not None:
+        entry = snapshots.load_feed(key)
+        if entry is not None:
+            feed_cache.set(key, entry)
+    return entry
+
+
+def _download(url: str, username: Optional[str], password: Optional[str], key, entry: Optional[FeedEntry]) -> bytes:
+    headers = upstream.request_headers(username, password)
+    if entry is not None:
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+    feed = metrics.feed_id(url)
+    with timing.stage('upstream', feed):
         try:
-            start_dt = _parse_dt(dtstart_raw)
-            end_dt = _parse_dt(dtend_raw) if dtend_raw else start_dt
+            resp = http.request("GET", url, headers=headers, preload_content=False)
         except Exception:
-            continue
+            metrics.upstream_responses.inc(feed=feed, status='error')
+            raise
+        metrics.upstream_responses.inc(feed=feed, status=resp.status)
+        try:
+            if resp.status == 304 and entry is not None:
+                feed_cache.set(key, FeedEntry(entry.body, entry.etag, entry.last_modified, time.monotonic()))
+                if snapshots is not None:
+                    snapshots.touch_feed(key)
+                return entry.body
+            if not 200 <= resp.status < 300:
+                # An error page is not a calendar without events: keep
+                # serving the last good copy, or fail the request.
+                resp.drain_conn()
+                if entry is not None:
+                    logger.warning("Calendar server answered %s, serving the cached feed", resp.status)
+                    return entry.body
+                raise UpstreamError("Calendar server answered {0}".format(resp.status))
+            body = _read_body(resp, config.MAX_FEED_BYTES)
+        finally:
+            resp.release_conn()
+    metrics.downloaded_bytes.inc(len(body), feed=feed)
+
+    if resp.status == 200:
+        fresh = FeedEntry(body, resp.headers.get('ETag'), resp.headers.get('Last-Modified'), time.monotonic())
+        feed_cache.set(key, fresh)
+        if snapshots is not None:
+            snapshots.save_feed(key, fresh)
+    return body
+
+
+def _read_body(resp, max_bytes: int) -> bytes:
+    """Read a streamed response, giving up once it exceeds ``max_bytes``."""
+    length = resp.headers.get('Content-Length')
+    if max_bytes > 0 and length is not None and str(length).isdigit() and int(length) > max_bytes:
+        raise FeedTooLarge("Feed is {0} bytes, limit is {1}".format(length, max_bytes))
+    chunks: List[bytes] = []
+    total = 0
+    for chunk in resp.stream(_STREAM_CHUNK):
+        total += len(chunk)
+        if max_bytes > 0 and total > max_bytes:
+            raise FeedTooLarge("Feed exceeds the limit of {0} bytes".format(max_bytes))
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def _window_bucket(start: datetime.datetime, end: datetime.datetime):
+    """Widen ``[start, end)`` outwards to whole ``PARSE_CACHE_BUCKET`` steps.
+
+    The widened window is a superset of the requested one, so it only adds a
+    few extra events at the edges, which enrich_and_filter copes with anyway.
+    """
+    step = config.PARSE_CACHE_BUCKET
+    if step <= 0:
+        return start, end
+    lo = int(start.timestamp()) // step * step
+    hi = -(-int(end.timestamp()) // step) * step
+    return (datetime.datetime.fromtimestamp(lo, pytz.utc),
+            datetime.datetime.fromtimestamp(hi, pytz.utc))
 
-        if start_dt.tzinfo is None:
-            if tzname:
-                try:
-                    start_dt = pytz.timezone(tzname).localize(start_dt)
-                except Exception:
-                    start_dt = start_dt.replace(tzinfo=pytz.utc)
-            else:
-                start_dt = start_dt.replace(tzinfo=pytz.utc)
-        if end_dt.tzinfo is None:
-            if tzname:
-                try:
-                    end_dt = pytz.timezone(tzname).localize(end_dt)
-                except Exception:
-                    end_dt = end_dt.replace(tzinfo=pytz.utc)
-            else:
-                end_dt = end_dt.replace(tzinfo=pytz.utc)
-
-        all_day = False
-        # Recognize VALUE=DATE by having parsed start at midnight and original raw date format length of 8
-        if re.match(r"^\d{8}$", dtstart_raw):
-            all_day = True
-
-        results.append(ParsedEvent({
-            'summary': summary,
-            'uid': uid,
-            'start': start_dt,
-            'end': end_dt,
-            'description': description,
-            'location': location,
-            'status': status,
-            'all_day': all_day,
-            'source': 'fallback'
-        }))
-    return results
 
+def _parse_ics(body: bytes, start: datetime.datetime, end: datetime.datetime) -> List[ParsedEvent]:
+    return _parse_ics_with_parser(body, start, end)[0]
 
-def fetch_raw_events(url: str, start: datetime.datetime, end: datetime.datetime, username: Optional[str], password: Optional[str]) -> List[ParsedEvent]:
-    """Fetch events via icalevents first; on failure, fallback to lightweight parser."""
-    headers = make_headers(basic_auth="{0}:{1}".format(username, password)) if username is not None and password is not None else {}
-    resp = http.request("GET", url, headers=headers, timeout=15)
-    text = resp.data.decode('utf-8', errors='ignore')
+
+def _parse_ics_with_parser(body: bytes, start: datetime.datetime, end: datetime.datetime) -> Tuple[List[ParsedEvent], str]:
+    """The events of ``body`` and the parser that produced them,
+    'icalevents' or 'fallback' (known even if there are no events)."""
+    if 0 < config.STREAM_PARSE_BYTES < len(body):
+        return _stream_parse(body), 'fallback'
     try:
-        lib_events: List[ICalEvent] = ical_fetch(string_content=text, start=start, end=end, strict=False)
+        lib_events: List[ICalEvent] = ical_fetch(string_content=body.decode('utf-8', errors='ignore'), start=start, end=end, strict=False)
         parsed: List[ParsedEvent] = []
         for ev in lib_events:
             st = ev.start
             en = ev.end or ev.start
-            parsed.append(ParsedEvent({
-                'summary': ev.summary,
-                'uid': ev.uid,
-                'start': st,
-                'end': en,
-                'description': ev.description,
-                'location': ev.location,
-                'status': ev.status,
-                'all_day': ev.all_day,
-                'created': ev.created,
-                'last_modified': ev.last_modified,
-                'url': ev.url,
-                'recurrence_id': ev.recurrence_id,
-                'source': 'icalevents'
-            }))
-        return parsed
+            parsed.append(ParsedEvent(
+                summary=ev.summary,
+                uid=ev.uid,
+                start=st,
+                end=en,
+                description=ev.description,
+                location=ev.location,
+                status=ev.status,
+                all_day=ev.all_day,
+                created=ev.created,
+                last_modified=ev.last_modified,
+                url=ev.url,
+                recurrence_id=ev.recurrence_id,
+                source='icalevents'
+            ))
+        return parsed, 'icalevents'
     except Exception:
-        # fallback
-        return _fallback_parse(text)
+        # fallback, straight from the bytes so no decoded copy is kept around
+        return _stream_parse(body), 'fallback'
+
+
+# Rows parse worker processes send back (and snapshots store) are
+# ParsedEvent.row() tuples of plain values: start and end as POSIX
+# timestamps, which is all the selection needs of them, and the other dates
+# as ISO strings. No tzinfo object crosses the process boundary: zones a
+# feed defines in a VTIMEZONE cannot be rebuilt by unpickling.
+_START = ParsedEvent.FIELDS.index('start')
+_END = ParsedEvent.FIELDS.index('end')
+_ISO_FIELDS = tuple(ParsedEvent.FIELDS.index(name) for name in ('created', 'last_modified', 'recurrence_id'))
+
+
+def _pack_date(value: Any) -> Any:
+    # Aware values keep their UTC offset, so responses show the same text as
+    # after an inline parse.
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+
+def _unpack_date(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    if len(value) == 10:
+        return datetime.date.fromisoformat(value)
+    return datetime.datetime.fromisoformat(value)
+
+
+def _pack_events(events: List[ParsedEvent]) -> List[tuple]:
+    rows = []
+    for ev in events:
+        row = list(ev.row())
+        row[_START] = row[_START].timestamp()
+        row[_END] = row[_END].timestamp()
+        for i in _ISO_FIELDS:
+            row[i] = _pack_date(row[i])
+        rows.append(tuple(row))
+    return rows
+
+
+def _unpack_events(rows: List[tuple]) -> List[ParsedEvent]:
+    events = []
+    for row in rows:
+        ev = ParsedEvent.from_row(row)
+        ev.start = datetime.datetime.fromtimestamp(row[_START], pytz.utc)
+        ev.end = datetime.datetime.fromtimestamp(row[_END], pytz.utc)
+        for i in _ISO_FIELDS:
+            name = ParsedEvent.FIELDS[i]
+            setattr(ev, name, _unpack_date(row[i]))
+        events.append(ev)
+    return events
+
+
+def _parse_packed(body: bytes, start: datetime.datetime, end: datetime.datetime) -> Tuple[List[tuple], str]:
+    # Runs in a parse worker process.
+    events, parser = _parse_ics_with_parser(body, start, end)
+    return _pack_events(events), parser
+
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn rather than fork: the serving process has threads (feed
+            # pool, prefetcher) whose locks a forked child could inherit held.
+            _parse_pool = ProcessPoolExecutor(max_workers=config.PARSE_PROCESSES,
+                                              mp_context=multiprocessing.get_context('spawn'))
+        return _parse_pool
+
+
+def _reset_parse_pool(pool: ProcessPoolExecutor) -> None:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    pool.shutdown(wait=False)
+
+
+def _parse_body(body: bytes, start: datetime.datetime, end: datetime.datetime) -> List[ParsedEvent]:
+    """Parse inline, or in the process pool for large bodies.
+
+    The calling thread only waits for the result, so other requests keep
+    running while a big feed is parsed. If a worker process dies the pool is
+    replaced and this body is parsed inline.
+    """
+    return _parse_body_with_parser(body, start, end)[0]
 
 
-def enrich_and_filter(raw_events: List[ParsedEvent], now_local: datetime.datetime, local_tz, include_ended=False) -> List[ParsedEvent]:
-    enriched: List[ParsedEvent] = []
-    for e in raw_events:
-        start_local = e['start'].astimezone(local_tz)
-        end_local = e['end'].astimezone(local_tz)
+def _parse_body_with_parser(body: bytes, start: datetime.datetime, end: datetime.datetime) -> Tuple[List[ParsedEvent], str]:
+    if config.PARSE_PROCESSES <= 0 or len(body) < config.PARSE_PROCESS_BYTES:
+        return _parse_ics_with_parser(body, start, end)
+    pool = _get_parse_pool()
+    try:
+        rows, parser = pool.submit(_parse_packed, body, start, end).result()
+    except BrokenProcessPool:
+        logger.warning("Parse worker process died, parsing inline", exc_info=True)
+        _reset_parse_pool(pool)
+        return _parse_ics_with_parser(body, start, end)
+    return _unpack_events(rows), parser
+
+
+def _parse_incremental(body: bytes, start: datetime.datetime, end: datetime.datetime, url: str, feed: str) -> List[ParsedEvent]:
+    """Parse ``body``, reusing the events of VEVENT groups that are unchanged
+    since the last version of this feed parsed for the same window.
+
+    Reused and new events must come from the same parser: if icalevents
+    handles the changed groups but had failed on the previous version (or
+    the reverse), the whole body is parsed again.
+    """
+    parts = incremental.split(body)
+    key = ('parts', url, start, end)
+    previous = parse_cache.get(key)
+    todo = incremental.changed(parts, previous)
+    state = None
+    if previous is not None and len(todo) < len(parts.groups):
+        if not todo:
+            state = incremental.assemble(parts, previous, todo, [], previous.parser)
+        else:
+            if 0 < config.STREAM_PARSE_BYTES < len(body):
+                delta, parser = _stream_parse(parts.document(todo)), 'fallback'
+            else:
+                delta, parser = _parse_ics_with_parser(parts.document(todo), start, end)
+            if parser == previous.parser:
+                state = incremental.assemble(parts, previous, todo, delta, parser)
+    if state is None:
+        todo = list(parts.groups)
+        parsed, parser = _parse_body_with_parser(body, start, end)
+        state = incremental.assemble(parts, None, todo, parsed, parser)
+        if state is None:
+            parse_cache.pop(key)
+            return parsed
+    metrics.parsed_groups.inc(len(parts.groups) - len(todo), feed=feed, kind='reused')
+    metrics.parsed_groups.inc(len(todo), feed=feed, kind='parsed')
+    parse_cache.set(key, state)
+    return state.events()
+
+
+def _feed_label(url: Optional[str]) -> str:
+    return metrics.feed_id(url) if url else 'unknown'
+
+
+def parse_feed(body: bytes, start: datetime.datetime, end: datetime.datetime, url: Optional[str] = None) -> List[ParsedEvent]:
+    """Parse a raw ICS body, reusing earlier results for identical content.
+
+    The returned list is shared between callers and must not be mutated.
+    ``url`` only labels the metrics.
+    """
+    start, end = _window_bucket(start, end)
+    key = (hashlib.sha256(body).hexdigest(), start, end)
+    cached = parse_cache.get(key)
+    if cached is not None:
+        return cached
+    rows = snapshots.load_parsed(key) if snapshots is not None else None
+    if rows is not None:
+        parsed = _unpack_events(rows)
+    else:
+        feed = _feed_label(url)
+        with timing.stage('parse', feed):
+            if url is not None and 0 < config.INCREMENTAL_PARSE_BYTES <= len(body):
+                parsed = _parse_incremental(body, start, end, url, feed)
+            else:
+                parsed = _parse_body(body, start, end)
+        parser = parsed[0].source if parsed else 'none'
+        metrics.parses.inc(feed=feed, parser=parser)
+        timing.note('parse', parser)
+        metrics.events_count.inc(len(parsed), feed=feed, kind='parsed')
+        if snapshots is not None:
+            snapshots.save_parsed(key, _pack_events(parsed))
+    parsed = intervals.IndexedEvents(parsed)
+    parse_cache.set(key, parsed)
+    return parsed
+
+
+def fetch_raw_events(url: str, start: datetime.datetime, end: datetime.datetime, username: Optional[str], password: Optional[str]) -> List[ParsedEvent]:
+    """Fetch events via icalevents first; on failure, fallback to lightweight parser.
+
+    Callers asking for the same feed, credentials and window bucket while a
+    fetch is already running wait for it instead of starting their own.
+    """
+    return coalesce_events(url, username, password, start, end,
+                           lambda: parse_feed(fetch_feed_body(url, username, password), start, end, url))
+
+
+def coalesce_events(url: str, username: Optional[str], password: Optional[str],
+                    start: datetime.datetime, end: datetime.datetime,
+                    load: Callable[[], List[ParsedEvent]], variant: tuple = ()) -> List[ParsedEvent]:
+    """Run ``load`` for the events of a feed, unless a caller asking for the
+    same feed, credentials and window bucket already is; then wait for its
+    result. Used by the sync and the ASGI path alike.
+
+    ``variant`` tells apart results that are not interchangeable, such as
+    lazy expansions for a ``limit``, which never stand in for the full parse.
+    """
+    key = (url, auth_identity(username, password)) + _window_bucket(start, end) + variant
+    return inflight.do(key, load)
+
+
+def _recurrence_index(body: bytes) -> List[recurrence.Series]:
+    key = ('series', hashlib.sha256(body).hexdigest())
+    index = parse_cache.get(key)
+    if index is None:
+        index = recurrence.build_index(body.decode('utf-8', errors='ignore'))
+        parse_cache.set(key, index)
+    return index
+
 
-        # Normalize all-day events: treat end as exclusive if date-style (advance by a day if start==end)
-        if e.get('all_day') and start_local.date() == end_local.date():
-            # Make end the next midnight to express full-day span
-            end_local = (start_local + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+def fetch_lazy_events(url: str, start: datetime.datetime, end: datetime.datetime, now: datetime.datetime, limit: Optional[int], username: Optional[str], password: Optional[str]) -> List[ParsedEvent]:
+    """Like fetch_raw_events, but only expands recurrences as far as needed.
 
+    Occurrences are generated in start order across all VEVENTs and
+    generation stops once ``limit`` events starting after ``now`` exist, so
+    the cost follows the limit rather than horizon x recurrence frequency.
+    Feeds the series index cannot handle go through the regular parser.
+    Concurrent callers share one expansion, like fetch_raw_events; ``now``
+    is that of the first of them, which only differs by the time the
+    expansion takes.
+    """
+    return coalesce_events(url, username, password, start, end,
+                           lambda: lazy_events(fetch_feed_body(url, username, password), start, end, now, limit, url),
+                           variant=('lazy', limit))
+
+
+def lazy_events(body: bytes, start: datetime.datetime, end: datetime.datetime, now: datetime.datetime, limit: Optional[int], url: Optional[str] = None) -> List[ParsedEvent]:
+    feed = _feed_label(url)
+    try:
+        with timing.stage('expand', feed):
+            expanded = recurrence.expand(_recurrence_index(body), start, end, now, limit)
+    except Exception:
+        logger.debug("Lazy expansion failed, using full parse", exc_info=True)
+        return parse_feed(body, start, end, url)
+    metrics.events_count.inc(len(expanded), feed=feed, kind='expanded')
+    return expanded
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    stats: Dict[str, Dict[str, Any]] = {
+        'feed': dict(feed_cache.stats(), backend=config.CACHE_BACKEND if feed_cache.shared else 'memory'),
+        'parsed': parse_cache.stats(),
+    }
+    if snapshots is not None:
+        stats['snapshot'] = snapshots.stats()
+    return stats
+
+
+def _local_span(e: ParsedEvent, local_tz):
+    start_local = e.start.astimezone(local_tz)
+    end_local = e.end.astimezone(local_tz)
+
+    # Normalize all-day events: treat end as exclusive if date-style (advance by a day if start==end)
+    if e.all_day and start_local.date() == end_local.date():
+        # Make end the next midnight to express full-day span
+        end_local = (start_local + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return start_local, end_local
+
+
+def _enrich(e: ParsedEvent, start_local: datetime.datetime, end_local: datetime.datetime, now_local: datetime.datetime, ongoing: Optional[bool] = None) -> EventView:
+    return EventView(e, start_local, end_local, now_local, ongoing)
+
+
+def enrich_and_filter(raw_events: List[ParsedEvent], now_local: datetime.datetime, local_tz, include_ended=False) -> List[EventView]:
+    enriched: List[EventView] = []
+    for e in raw_events:
+        start_local, end_local = _local_span(e, local_tz)
         if not include_ended and end_local <= now_local:
             continue
-
-        ongoing = start_local <= now_local < end_local
-        seconds_until_start = (start_local - now_local).total_seconds()
-        seconds_until_end = (end_local - now_local).total_seconds()
-        duration_seconds = (end_local - start_local).total_seconds()
-        days_remaining = None
-        if e.get('all_day'):
-            days_remaining = max(0, (end_local.date() - now_local.date()).days - (0 if ongoing else 1))
-
-        enriched.append(ParsedEvent({
-            'name': e.get('summary'),
-            'uid': e.get('uid'),
-            'start_dt': start_local,
-            'end_dt': end_local,
-            'start': start_local.isoformat(),
-            'end': end_local.isoformat(),
-            'all_day': e.get('all_day'),
-            'secondsUntilStart': seconds_until_start,
-            'secondsUntilEnd': seconds_until_end,
-            'durationSeconds': duration_seconds,
-            'daysRemaining': days_remaining,
-            'ongoing': ongoing,
-            'url': e.get('url'),
-            'description': e.get('description'),
-            'location': e.get('location'),
-            'status': e.get('status'),
-            'created': e.get('created').isoformat() if e.get('created') else None,
-            'last_modified': e.get('last_modified').isoformat() if e.get('last_modified') else None,
-            'recurrence_id': e.get('recurrence_id'),
-            'source': e.get('source')
-        }))
+        enriched.append(_enrich(e, start_local, end_local, now_local))
     return enriched
 
 
-def sort_and_limit(enriched: List[ParsedEvent], limit: Optional[int]) -> List[ParsedEvent]:
-    enriched.sort(key=lambda ev: (not ev['ongoing'], ev['start_dt']))
+def _sort_key(ev: EventView):
+    return (not ev.ongoing, ev.start_local)
+
+
+def sort_and_limit(enriched: List[EventView], limit: Optional[int]) -> List[EventView]:
+    if limit is not None and 0 <= limit < len(enriched):
+        # Same result as sorting and slicing, without ordering the tail.
+        return heapq.nsmallest(limit, enriched, key=_sort_key)
+    enriched.sort(key=_sort_key)
     if limit is not None:
         return enriched[:limit]
     return enriched
 
 
-def get_events(url: str, lookback_days: int, horizon_days: int, limit: Optional[int], username: Optional[str], password: Optional[str], include_ended=False) -> List[ParsedEvent]:
-    url = normalize_ics_url(url)
-    now_utc = datetime.datetime.now(pytz.utc)
+def select_events(raw_events: List[ParsedEvent], now_local: datetime.datetime, local_tz, limit: Optional[int], include_ended=False) -> List[EventView]:
+    """``sort_and_limit(enrich_and_filter(...), limit)`` without the waste.
+
+    Only the local start/end and the ``ongoing`` flag are computed for every
+    occurrence; the top ``limit`` are then picked with a heap and just those
+    become EventViews. Lists from parse_feed carry an index (see
+    intervals.py) that answers the same question without looking at every
+    occurrence.
+    """
+    if isinstance(raw_events, intervals.IndexedEvents) and (limit is None or limit >= 0):
+        index = raw_events.index(local_tz, _local_span)
+        return [_enrich(e, start_local, end_local, now_local, ongoing)
+                for start_local, end_local, e, ongoing in index.select(now_local.timestamp(), limit, include_ended)]
+    candidates = []
+    for e in raw_events:
+        start_local, end_local = _local_span(e, local_tz)
+        if not include_ended and end_local <= now_local:
+            continue
+        ongoing = start_local <= now_local < end_local
+        candidates.append((not ongoing, start_local, end_local, e))
+
+    def key(c):
+        return (c[0], c[1])
+
+    if limit is not None and 0 <= limit < len(candidates):
+        chosen = heapq.nsmallest(limit, candidates, key=key)
+    else:
+        candidates.sort(key=key)
+        chosen = candidates[:limit] if limit is not None else candidates
+    return [_enrich(e, start_local, end_local, now_local) for _, start_local, end_local, e in chosen]
+
+
+def select_feed_events(url: Optional[str], raw_events: List[ParsedEvent], now_local: datetime.datetime, local_tz, limit: Optional[int], include_ended=False) -> List[EventView]:
+    """``select_events`` for the events of one feed, recorded in the metrics."""
+    feed = _feed_label(url)
+    with timing.stage('select', feed):
+        selected = select_events(raw_events, now_local, local_tz, limit, include_ended=include_ended)
+    metrics.events_count.inc(len(selected), feed=feed, kind='returned')
+    return selected
+
+
+def fetch_window(lookback_days: int, horizon_days: int, now_utc: Optional[datetime.datetime] = None):
+    if now_utc is None:
+        now_utc = datetime.datetime.now(pytz.utc)
     start = now_utc - datetime.timedelta(days=lookback_days)
     end = now_utc + datetime.timedelta(days=horizon_days)
-    local_tz = datetime.datetime.now().astimezone().tzinfo
+    return now_utc, start, end
+
+
+def refresh_feed(url: str, lookback_days: int, horizon_days: int, username: Optional[str], password: Optional[str]) -> None:
+    """Revalidate a feed upstream and warm the parsed cache for its window."""
+    _, start, end = fetch_window(lookback_days, horizon_days)
+    parse_feed(fetch_feed_body(url, username, password, revalidate=True), start, end, url)
+
+
+# Feed label of the enrich stage of a merged response, which builds the
+# dicts of all feeds at once.
+MERGED_FEED = 'merged'
+
+
+def materialize(events: List[EventView], fields: Optional[Sequence[str]] = None, feed: str = MERGED_FEED) -> List[Dict[str, Any]]:
+    """The response dicts; the only place they are built. Timed as the
+    ``enrich`` stage of ``feed``."""
+    with timing.stage('enrich', feed):
+        return [ev.to_dict(fields) for ev in events]
+
+
+def _load_events(url: str, start: datetime.datetime, end: datetime.datetime, now_utc: datetime.datetime, limit: Optional[int], username: Optional[str], password: Optional[str], expand: str) -> List[ParsedEvent]:
+    if expand == 'lazy':
+        return fetch_lazy_events(url, start, end, now_utc, limit, username, password)
+    return fetch_raw_events(url, start, end, username, password)
+
+
+def get_events(url: str, lookback_days: int, horizon_days: int, limit: Optional[int], username: Optional[str], password: Optional[str], include_ended=False, expand: str = 'full', tz: Optional[str] = None, fields: Optional[Sequence[str]] = None, now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+    url = normalize_ics_url(url)
+    now_utc, start, end = fetch_window(lookback_days, horizon_days, now)
+    local_tz = timezones.display_zone(tz)
     now_local = now_utc.astimezone(local_tz)
-    raw = fetch_raw_events(url, start, end, username, password)
-    enriched = enrich_and_filter(raw, now_local, local_tz, include_ended=include_ended)
-    final = sort_and_limit(enriched, limit)
-    # Remove internal dt objects
-    for ev in final:
-        ev.pop('start_dt', None)
-        ev.pop('end_dt', None)
-    return final
+    raw = _load_events(url, start, end, now_utc, limit, username, password, expand)
+    final = select_feed_events(url, raw, now_local, local_tz, limit, include_ended=include_ended)
+    return materialize(final, fields, metrics.feed_id(url))
+
+
+_feed_pool: Optional[ThreadPoolExecutor] = None
+_feed_pool_lock = threading.Lock()
+
+
+def _get_feed_pool() -> ThreadPoolExecutor:
+    global _feed_pool
+    with _feed_pool_lock:
+        if _feed_pool is None:
+            _feed_pool = ThreadPoolExecutor(max_workers=max(1, config.FEED_FETCH_WORKERS), thread_name_prefix='feed-fetch')
+        return _feed_pool
+
+
+def get_merged_events(feeds: List[FeedSpec], lookback_days: int, horizon_days: int, limit: Optional[int], include_ended=False, expand: str = 'full', tz: Optional[str] = None, fields: Optional[Sequence[str]] = None, now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+    """Fetch several feeds concurrently and merge them into one event list.
+
+    Each feed contributes at most ``limit`` events, already in order, which
+    are then combined with a k-way merge. Every event is tagged with ``feed`` (the position of its feed in
+    ``feeds``) and ``feedLabel``. A feed that fails is logged and left out;
+    only if every feed fails is the first error raised.
+
+    ``now`` (default: the current time) is the reference for what counts as
+    ongoing or ended and for the relative fields.
+    """
+    now_utc, start, end = fetch_window(lookback_days, horizon_days, now)
+    local_tz = timezones.display_zone(tz)
+    now_local = now_utc.astimezone(local_tz)
+    feed_limit = limit if limit is not None and limit >= 0 else None
+
+    def load(index: int, feed: FeedSpec) -> List[EventView]:
+        url = normalize_ics_url(feed['url'])
+        raw = _load_events(url, start, end, now_utc, feed_limit, feed.get('username'), feed.get('password'), expand)
+        return tag_feed(select_feed_events(url, raw, now_local, local_tz, feed_limit, include_ended=include_ended), index, feed)
+
+    pool = _get_feed_pool()
+    futures = [pool.submit(timing.bind(load), i, feed) for i, feed in enumerate(feeds)]
+    results: List[Any] = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as exc:
+            results.append(exc)
+    return materialize(merge_selected(results, limit), fields)
+
+
+def absolute_payload(events: List[Dict[str, Any]], now_utc: datetime.datetime, tz: Optional[str] = None) -> Dict[str, Any]:
+    """The ``relative=0`` response for ``events`` selected at ``now_utc``.
+
+    Besides the events it holds ``generatedAt`` and ``validUntil``: the
+    first start or end after ``generatedAt`` among the returned events,
+    which is the next moment an event becomes ongoing or drops out (and
+    another one may move up into ``limit``). Until then the response is
+    exactly what a new request would return, provided the feed itself
+    does not change. ``validUntil`` is null when no such moment exists.
+    """
+    now_local = now_utc.astimezone(timezones.display_zone(tz))
+    changes = [t for ev in events for t in (datetime.datetime.fromisoformat(ev['start']),
+                                               datetime.datetime.fromisoformat(ev['end'])) if t > now_local]
+    return {
+        'events': events,
+        'generatedAt': now_local.isoformat(),
+        'validUntil': min(changes).isoformat() if changes else None,
+    }
+
+
+def tag_feed(events: List[EventView], index: int, feed: FeedSpec) -> List[EventView]:
+    for ev in events:
+        ev.feed = index
+        ev.feed_label = feed.get('label')
+    return events
+
+
+def merge_selected(results: List[Any], limit: Optional[int]) -> List[EventView]:
+    """Merge per-feed results of select_events, in feed order.
+
+    An entry that is an exception stands for a failed feed: it is logged
+    and left out, unless every feed failed, in which case the first error
+    is raised.
+    """
+    per_feed: List[List[EventView]] = []
+    errors: List[BaseException] = []
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            logger.warning("Failed to retrieve feed #%d of merged request", index, exc_info=result)
+            errors.append(result)
+        else:
+            per_feed.append(result)
+    if errors and len(errors) == len(results):
+        raise errors[0]
+    merged = list(heapq.merge(*per_feed, key=_sort_key))
+    if limit is not None:
+        merged = merged[:limit]
+    return merged
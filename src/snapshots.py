@@ -0,0 +1,221 @@
+"""Disk-backed snapshots that survive restarts.
+
+One SQLite file holds the raw feed bodies with their validators and the
+parsed events of the service caches, so the first requests after a deploy
+are answered from disk (or with a cheap conditional GET) instead of
+downloading and parsing every feed again. The file is shared by all
+gunicorn workers: SQLite's WAL mode lets them read concurrently while one
+of them writes.
+
+Parsed events are stored as JSON, datetimes as tagged ISO strings, never
+as pickles: whoever can write to the file must not be able to run code in
+the workers.
+
+The store is best effort. Any database error is logged and treated as a
+miss, so a broken or locked file never fails a request.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+from cache import FeedEntry
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    data BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+)
+"""
+
+FEED = 'feed'
+PARSED = 'parsed'
+
+
+def _digest(key: Hashable) -> str:
+    # Feed keys contain the URL, which may carry a token; only its hash is
+    # written to disk.
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'date': value.isoformat()}
+    raise TypeError("Cannot store {0} in a snapshot".format(type(value).__name__))
+
+
+def _decode_value(obj: Dict[str, Any]) -> Any:
+    if set(obj) == {'datetime'}:
+        return datetime.datetime.fromisoformat(obj['datetime'])
+    if set(obj) == {'date'}:
+        return datetime.date.fromisoformat(obj['date'])
+    raise ValueError("Unexpected object in snapshot")
+
+
+def _dumps_rows(rows: List[tuple]) -> bytes:
+    return json.dumps(rows, default=_encode_value, separators=(',', ':')).encode('utf-8')
+
+
+def _loads_rows(data: bytes) -> List[tuple]:
+    rows = json.loads(bytes(data).decode('utf-8'), object_hook=_decode_value)
+    if not isinstance(rows, list) or not all(isinstance(row, list) for row in rows):
+        raise ValueError("Snapshot rows are not a list of lists")
+    return [tuple(row) for row in rows]
+
+
+class SnapshotStore:
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and process; connections must not cross
+        # a fork.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_SCHEMA)
+            conn.execute('CREATE INDEX IF NOT EXISTS snapshots_accessed ON snapshots (accessed)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _failed(self, action: str) -> None:
+        self.errors += 1
+        logger.warning("Snapshot store %s failed", action, exc_info=True)
+
+    def _load(self, kind: str, key: Hashable):
+        try:
+            conn = self._conn()
+            digest = _digest(key)
+            row = conn.execute('SELECT data, etag, last_modified, stored_at FROM snapshots WHERE kind = ? AND key = ?',
+                               (kind, digest)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE snapshots SET accessed = ? WHERE kind = ? AND key = ?', (time.time(), kind, digest))
+        except (sqlite3.Error, OSError):
+            self._failed('read')
+            return None
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return row
+
+    def _save(self, kind: str, key: Hashable, data: bytes, etag: Optional[str] = None,
+              last_modified: Optional[str] = None, stored_at: Optional[float] = None) -> None:
+        if 0 < self.max_bytes < len(data):
+            return
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (kind, _digest(key), data, etag, last_modified,
+                          now if stored_at is None else stored_at, now, len(data)))
+            self._evict(conn)
+        except (sqlite3.Error, OSError):
+            self._failed('write')
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        if self.max_bytes <= 0:
+            return
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM snapshots').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('SELECT kind, key, size FROM snapshots ORDER BY accessed').fetchall()
+            total = sum(size for _, _, size in rows)
+            for kind, key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                conn.execute('DELETE FROM snapshots WHERE kind = ? AND key = ?', (kind, key))
+                total -= size
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def load_feed(self, key: Hashable) -> Optional[FeedEntry]:
+        """The stored body for ``key``, with ``fetched_at`` translated to
+        ``time.monotonic()`` so the feed cache TTL keeps counting from the
+        original download."""
+        row = self._load(FEED, key)
+        if row is None:
+            return None
+        body, etag, last_modified, stored_at = row
+        age = max(0.0, time.time() - stored_at)
+        return FeedEntry(bytes(body), etag, last_modified, time.monotonic() - age)
+
+    def save_feed(self, key: Hashable, entry: FeedEntry) -> None:
+        age = max(0.0, time.monotonic() - entry.fetched_at)
+        self._save(FEED, key, entry.body, entry.etag, entry.last_modified, time.time() - age)
+
+    def touch_feed(self, key: Hashable) -> None:
+        """Mark a stored body as just revalidated (after a 304)."""
+        try:
+            self._conn().execute('UPDATE snapshots SET stored_at = ? WHERE kind = ? AND key = ?',
+                                 (time.time(), FEED, _digest(key)))
+        except (sqlite3.Error, OSError):
+            self._failed('write')
+
+    def load_parsed(self, key: Hashable) -> Optional[List[tuple]]:
+        """The rows stored by ``save_parsed``, or None."""
+        row = self._load(PARSED, key)
+        if row is None:
+            return None
+        try:
+            return _loads_rows(row[0])
+        except ValueError:
+            self._failed('decode')
+            return None
+
+    def save_parsed(self, key: Hashable, rows: List[tuple]) -> None:
+        """Store rows of str, number, bool, None, date and datetime values
+        (``ParsedEvent.row()`` tuples, as ``service._pack_events`` makes)."""
+        try:
+            data = _dumps_rows(rows)
+        except (TypeError, ValueError):
+            self._failed('encode')
+            return
+        self._save(PARSED, key, data)
+
+    def stats(self) -> Dict[str, int]:
+        try:
+            entries, size = self._conn().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM snapshots').fetchone()
+        except (sqlite3.Error, OSError):
+            self._failed('read')
+            entries, size = 0, 0
+        return {
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+        }
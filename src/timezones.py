@@ -0,0 +1,195 @@
+"""Timezone lookup for TZID parameters and the display zone.
+
+Feeds name their zones in several ways: IANA names (``Europe/Berlin``),
+Windows names from Outlook/Exchange (``W. Europe Standard Time``), IANA
+names behind a vendor prefix (``/citadel.org/20190914_1/Europe/Berlin``)
+or custom names that only make sense together with a VTIMEZONE block in
+the same feed. ``resolve`` handles the first three and caches the result,
+so calling it once per event is cheap; ``from_vtimezone`` covers the last.
+"""
+import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+import pytz
+from dateutil import tz as dateutil_tz
+from icalendar import Component
+
+import config
+
+
+class UnknownTimezone(ValueError):
+    pass
+
+
+# Windows zone names as used by Outlook/Exchange, mapped to the IANA zone
+# CLDR lists for the "001" (default) territory.
+WINDOWS_ZONES: Dict[str, str] = {
+    'Dateline Standard Time': 'Etc/GMT+12',
+    'UTC-11': 'Etc/GMT+11',
+    'Hawaiian Standard Time': 'Pacific/Honolulu',
+    'Alaskan Standard Time': 'America/Anchorage',
+    'Pacific Standard Time (Mexico)': 'America/Tijuana',
+    'Pacific Standard Time': 'America/Los_Angeles',
+    'US Mountain Standard Time': 'America/Phoenix',
+    'Mountain Standard Time (Mexico)': 'America/Mazatlan',
+    'Mountain Standard Time': 'America/Denver',
+    'Central America Standard Time': 'America/Guatemala',
+    'Central Standard Time': 'America/Chicago',
+    'Central Standard Time (Mexico)': 'America/Mexico_City',
+    'Canada Central Standard Time': 'America/Regina',
+    'SA Pacific Standard Time': 'America/Bogota',
+    'Eastern Standard Time': 'America/New_York',
+    'Eastern Standard Time (Mexico)': 'America/Cancun',
+    'US Eastern Standard Time': 'America/Indiana/Indianapolis',
+    'Cuba Standard Time': 'America/Havana',
+    'Haiti Standard Time': 'America/Port-au-Prince',
+    'Venezuela Standard Time': 'America/Caracas',
+    'Paraguay Standard Time': 'America/Asuncion',
+    'Atlantic Standard Time': 'America/Halifax',
+    'SA Western Standard Time': 'America/La_Paz',
+    'Pacific SA Standard Time': 'America/Santiago',
+    'Newfoundland Standard Time': 'America/St_Johns',
+    'E. South America Standard Time': 'America/Sao_Paulo',
+    'Argentina Standard Time': 'America/Argentina/Buenos_Aires',
+    'SA Eastern Standard Time': 'America/Cayenne',
+    'Greenland Standard Time': 'America/Godthab',
+    'Montevideo Standard Time': 'America/Montevideo',
+    'UTC-02': 'Etc/GMT+2',
+    'Azores Standard Time': 'Atlantic/Azores',
+    'Cape Verde Standard Time': 'Atlantic/Cape_Verde',
+    'UTC': 'Etc/UTC',
+    'GMT Standard Time': 'Europe/London',
+    'Greenwich Standard Time': 'Atlantic/Reykjavik',
+    'Morocco Standard Time': 'Africa/Casablanca',
+    'W. Europe Standard Time': 'Europe/Berlin',
+    'Central Europe Standard Time': 'Europe/Budapest',
+    'Romance Standard Time': 'Europe/Paris',
+    'Central European Standard Time': 'Europe/Warsaw',
+    'W. Central Africa Standard Time': 'Africa/Lagos',
+    'GTB Standard Time': 'Europe/Bucharest',
+    'E. Europe Standard Time': 'Europe/Chisinau',
+    'FLE Standard Time': 'Europe/Kiev',
+    'Kaliningrad Standard Time': 'Europe/Kaliningrad',
+    'Egypt Standard Time': 'Africa/Cairo',
+    'South Africa Standard Time': 'Africa/Johannesburg',
+    'Israel Standard Time': 'Asia/Jerusalem',
+    'Jordan Standard Time': 'Asia/Amman',
+    'Middle East Standard Time': 'Asia/Beirut',
+    'Syria Standard Time': 'Asia/Damascus',
+    'Turkey Standard Time': 'Europe/Istanbul',
+    'Belarus Standard Time': 'Europe/Minsk',
+    'Russian Standard Time': 'Europe/Moscow',
+    'Arabic Standard Time': 'Asia/Baghdad',
+    'Arab Standard Time': 'Asia/Riyadh',
+    'E. Africa Standard Time': 'Africa/Nairobi',
+    'Iran Standard Time': 'Asia/Tehran',
+    'Arabian Standard Time': 'Asia/Dubai',
+    'Azerbaijan Standard Time': 'Asia/Baku',
+    'Georgian Standard Time': 'Asia/Tbilisi',
+    'Caucasus Standard Time': 'Asia/Yerevan',
+    'Mauritius Standard Time': 'Indian/Mauritius',
+    'Afghanistan Standard Time': 'Asia/Kabul',
+    'West Asia Standard Time': 'Asia/Tashkent',
+    'Ekaterinburg Standard Time': 'Asia/Yekaterinburg',
+    'Pakistan Standard Time': 'Asia/Karachi',
+    'India Standard Time': 'Asia/Kolkata',
+    'Sri Lanka Standard Time': 'Asia/Colombo',
+    'Nepal Standard Time': 'Asia/Kathmandu',
+    'Central Asia Standard Time': 'Asia/Almaty',
+    'Bangladesh Standard Time': 'Asia/Dhaka',
+    'Myanmar Standard Time': 'Asia/Yangon',
+    'SE Asia Standard Time': 'Asia/Bangkok',
+    'N. Central Asia Standard Time': 'Asia/Novosibirsk',
+    'North Asia Standard Time': 'Asia/Krasnoyarsk',
+    'China Standard Time': 'Asia/Shanghai',
+    'North Asia East Standard Time': 'Asia/Irkutsk',
+    'Singapore Standard Time': 'Asia/Singapore',
+    'W. Australia Standard Time': 'Australia/Perth',
+    'Taipei Standard Time': 'Asia/Taipei',
+    'Ulaanbaatar Standard Time': 'Asia/Ulaanbaatar',
+    'Tokyo Standard Time': 'Asia/Tokyo',
+    'Korea Standard Time': 'Asia/Seoul',
+    'Yakutsk Standard Time': 'Asia/Yakutsk',
+    'Cen. Australia Standard Time': 'Australia/Adelaide',
+    'AUS Central Standard Time': 'Australia/Darwin',
+    'E. Australia Standard Time': 'Australia/Brisbane',
+    'AUS Eastern Standard Time': 'Australia/Sydney',
+    'West Pacific Standard Time': 'Pacific/Port_Moresby',
+    'Tasmania Standard Time': 'Australia/Hobart',
+    'Vladivostok Standard Time': 'Asia/Vladivostok',
+    'Magadan Standard Time': 'Asia/Magadan',
+    'Central Pacific Standard Time': 'Pacific/Guadalcanal',
+    'New Zealand Standard Time': 'Pacific/Auckland',
+    'UTC+12': 'Etc/GMT-12',
+    'Fiji Standard Time': 'Pacific/Fiji',
+    'Tonga Standard Time': 'Pacific/Tongatapu',
+    'Samoa Standard Time': 'Pacific/Apia',
+    'Line Islands Standard Time': 'Pacific/Kiritimati',
+}
+
+
+def _iana(name: str) -> Optional[datetime.tzinfo]:
+    try:
+        return pytz.timezone(name)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=512)
+def resolve(name: Optional[str]) -> Optional[datetime.tzinfo]:
+    """Map a TZID or ``tz=`` value to a tzinfo, or None if unknown."""
+    if not name:
+        return None
+    name = name.strip().strip('"')
+    found = _iana(name)
+    if found is not None:
+        return found
+    if name in WINDOWS_ZONES:
+        return _iana(WINDOWS_ZONES[name])
+    # Vendor prefixed IANA names, e.g. /mozilla.org/20050126_1/Europe/Berlin
+    parts = [p for p in name.split('/') if p]
+    for i in range(1, len(parts)):
+        found = _iana('/'.join(parts[i:]))
+        if found is not None:
+            return found
+    return None
+
+
+def from_vtimezone(lines: Iterable[str]) -> Optional[datetime.tzinfo]:
+    """Build a tzinfo from the unfolded lines of a VTIMEZONE block."""
+    try:
+        return Component.from_ical('\r\n'.join(lines)).to_tz()
+    except Exception:
+        return None
+
+
+def localize(dt: datetime.datetime, tz: Optional[datetime.tzinfo]) -> datetime.datetime:
+    """Attach ``tz`` to a naive datetime (UTC when ``tz`` is None)."""
+    if dt.tzinfo is not None:
+        return dt
+    if tz is None:
+        return dt.replace(tzinfo=pytz.utc)
+    if hasattr(tz, 'localize'):
+        return tz.localize(dt)
+    return dt.replace(tzinfo=tz)
+
+
+@lru_cache(maxsize=1)
+def default_zone() -> datetime.tzinfo:
+    """Zone used for output when the request does not ask for one.
+
+    ``ICAL_DISPLAY_TZ`` wins; otherwise the host's local zone is used. Unlike
+    ``datetime.now().astimezone().tzinfo`` this follows DST changes for
+    events on the other side of a transition.
+    """
+    return resolve(config.DISPLAY_TZ) or dateutil_tz.tzlocal()
+
+
+def display_zone(name: Optional[str]) -> datetime.tzinfo:
+    if not name:
+        return default_zone()
+    tz = resolve(name)
+    if tz is None:
+        raise UnknownTimezone("Unknown timezone: {0}".format(name))
+    return tz
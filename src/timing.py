@@ -0,0 +1,127 @@
+"""Per-request timing: the ``Server-Timing`` header and ``profile=1``.
+
+Stages are measured where the work happens (``service``, ``responses``)
+with ``stage``/``measure``, which feed the Prometheus histograms and, while
+a request is being answered inside ``collect()``, that request's
+``RequestTimings``. The current collector lives in a context variable;
+code that hands work to thread pools copies the context (``contextvars``)
+so stages measured there are attributed to the right request.
+"""
+import contextvars
+import cProfile
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+
+_current: 'contextvars.ContextVar[Optional[RequestTimings]]' = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Seconds per stage, summed over all feeds of a request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations: Dict[str, float] = {}
+        self.notes: Dict[str, List[str]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def note(self, name: str, text: str) -> None:
+        with self._lock:
+            notes = self.notes.setdefault(name, [])
+            if text not in notes:
+                notes.append(text)
+
+    def milliseconds(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: round(seconds * 1000, 3) for name, seconds in self.durations.items()}
+
+    def header(self) -> str:
+        """The ``Server-Timing`` value, e.g. ``fetch;dur=12.5, parse;dur=3.1;desc="icalevents"``."""
+        with self._lock:
+            names = list(self.durations) + [n for n in self.notes if n not in self.durations]
+            parts = []
+            for name in names:
+                part = name
+                if name in self.durations:
+                    part += ';dur={0:.1f}'.format(self.durations[name] * 1000)
+                if name in self.notes:
+                    part += ';desc="{0}"'.format(','.join(self.notes[name]))
+                parts.append(part)
+            return ', '.join(parts)
+
+
+@contextmanager
+def collect() -> Iterator[RequestTimings]:
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def note(name: str, text: str) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.note(name, text)
+
+
+@contextmanager
+def measure(name: str, histogram: 'metrics.Histogram', **labels: Any) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        histogram.observe(seconds, **labels)
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, seconds)
+
+
+def stage(name: str, feed: str):
+    """Time one stage of one feed (see ``metrics.stage_seconds``)."""
+    return measure(name, metrics.stage_seconds, stage=name, feed=feed)
+
+
+def bind(fn: Callable) -> Callable:
+    """``fn`` bound to a copy of the current context, to run on another thread."""
+    ctx = contextvars.copy_context()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        return ctx.run(fn, *args, **kwargs)
+    return run
+
+
+def profile_call(fn: Callable, *args: Any, top: int = 40, **kwargs: Any) -> Tuple[Any, List[Dict[str, Any]]]:
+    """Run ``fn`` under cProfile; returns its result and the ``top``
+    functions by cumulative time.
+
+    Only the calling thread is profiled: work that ``fn`` hands to a thread
+    or process pool shows up as time spent waiting for it.
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+    stats = pstats.Stats(profiler).sort_stats('cumulative')
+    functions = []
+    for func in stats.fcn_list[:top]:
+        calls, _, own, cumulative, _ = stats.stats[func]
+        filename, line, name = func
+        functions.append({
+            'function': '{0}:{1}({2})'.format(filename, line, name) if line else name,
+            'calls': calls,
+            'ownMs': round(own * 1000, 3),
+            'cumulativeMs': round(cumulative * 1000, 3),
+        })
+    return result, functions
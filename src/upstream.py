@@ -0,0 +1,80 @@
+"""The HTTP client used to download feeds.
+
+Everything about how we talk to calendar servers is configured here: pool
+sizes, keep-alive, retries, timeouts, compression and HTTP/2.
+"""
+import logging
+from typing import Dict, Optional
+
+from urllib3 import PoolManager, Retry, Timeout, make_headers
+
+import config
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli  # noqa: F401
+    HAS_BROTLI = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        HAS_BROTLI = True
+    except ImportError:
+        HAS_BROTLI = False
+
+# urllib3 decodes both transparently (br only with a brotli package).
+ACCEPT_ENCODING = 'gzip, br' if HAS_BROTLI else 'gzip'
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Redirects have their own budget, so ICAL_UPSTREAM_RETRIES=0 still follows
+# them; three is what urllib3's default allowed.
+MAX_REDIRECTS = 3
+
+
+def enable_http2() -> bool:
+    """Switch urllib3's HTTPS connections to HTTP/2, if h2 is installed.
+
+    This is process wide and only offers h2 in ALPN, so it is opt-in.
+    """
+    try:
+        from urllib3.http2 import inject_into_urllib3
+        inject_into_urllib3()
+    except Exception:
+        logger.warning("HTTP/2 requested but not available (is h2 4.x installed?), using HTTP/1.1", exc_info=True)
+        return False
+    return True
+
+
+def build_pool_manager() -> PoolManager:
+    if config.UPSTREAM_HTTP2:
+        enable_http2()
+    retries = Retry(
+        total=None,
+        connect=config.UPSTREAM_RETRIES,
+        read=config.UPSTREAM_RETRIES,
+        status=config.UPSTREAM_RETRIES,
+        other=config.UPSTREAM_RETRIES,
+        redirect=MAX_REDIRECTS,
+        backoff_factor=config.UPSTREAM_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        # A request thread (and everyone waiting for the same feed) must not
+        # sleep for whatever Retry-After a server sends.
+        retry_after_max=max(1, int(config.UPSTREAM_READ_TIMEOUT)),
+        raise_on_status=False,
+    )
+    return PoolManager(
+        num_pools=max(1, config.UPSTREAM_NUM_POOLS),
+        maxsize=max(1, config.UPSTREAM_POOL_MAXSIZE),
+        block=config.UPSTREAM_POOL_BLOCK,
+        retries=retries,
+        timeout=Timeout(connect=config.UPSTREAM_CONNECT_TIMEOUT, read=config.UPSTREAM_READ_TIMEOUT),
+    )
+
+
+def request_headers(username: Optional[str], password: Optional[str]) -> Dict[str, str]:
+    headers = {'Accept-Encoding': ACCEPT_ENCODING}
+    if username is not None and password is not None:
+        headers.update(make_headers(basic_auth="{0}:{1}".format(username, password)))
+    return headers
@@ -0,0 +1,18 @@
+import pytest
+
+import metrics
+import responses
+import service
+
+
+@pytest.fixture(autouse=True)
+def _clear_service_caches():
+    """Every test starts with cold caches so mocked HTTP calls are observed."""
+    service.feed_cache.clear()
+    service.parse_cache.clear()
+    responses.response_cache.clear()
+    metrics.clear()
+    yield
+    service.feed_cache.clear()
+    service.parse_cache.clear()
+    responses.response_cache.clear()
@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import patch
 from app import app as flask_app
+import responses
+from tests.test_asgi import _request as _feed_request
 
 
 @pytest.fixture
@@ -41,6 +43,13 @@ class TestEventsRoute:
         assert resp.status_code == 400
         assert "error" in resp.get_json()
 
+    def test_oversized_feed_returns_400(self, client):
+        from service import FeedTooLarge
+        with patch("app.get_events", side_effect=FeedTooLarge("too big")):
+            resp = client.get("/events?url=http://example.com/cal.ics")
+        assert resp.status_code == 400
+        assert "too large" in resp.get_json()["error"]
+
     def test_limit_param_passed(self, client):
         with patch("app.get_events", return_value=[]) as mock_fn:
             client.get("/events?url=http://example.com/cal.ics&limit=5")
@@ -88,3 +97,290 @@ class TestEventsRoute:
         resp = client.get("/events?limit=5")
         assert resp.status_code == 400
         assert "error" in resp.get_json()
+
+    def test_expand_defaults_to_full(self, client):
+        with patch("app.get_events", return_value=[]) as mock_fn:
+            client.get("/events?url=http://example.com/cal.ics")
+        _, kwargs = mock_fn.call_args
+        assert kwargs["expand"] == "full"
+
+    def test_expand_lazy_forwarded(self, client):
+        with patch("app.get_events", return_value=[]) as mock_fn:
+            client.get("/events?url=http://example.com/cal.ics&expand=lazy&limit=5")
+        _, kwargs = mock_fn.call_args
+        assert kwargs["expand"] == "lazy"
+
+    def test_invalid_expand_returns_400(self, client):
+        resp = client.get("/events?url=http://example.com/cal.ics&expand=sometimes")
+        assert resp.status_code == 400
+
+    def test_tz_forwarded(self, client):
+        with patch("app.get_events", return_value=[]) as mock_fn:
+            client.get("/events?url=http://example.com/cal.ics&tz=Europe/Berlin")
+        _, kwargs = mock_fn.call_args
+        assert kwargs["tz"] == "Europe/Berlin"
+
+    def test_fields_default_to_all(self, client):
+        with patch("app.get_events", return_value=[]) as mock_fn:
+            client.get("/events?url=http://example.com/cal.ics")
+        assert mock_fn.call_args.kwargs["fields"] is None
+
+    def test_fields_forwarded(self, client):
+        with patch("app.get_events", return_value=[]) as mock_fn:
+            client.get("/events?url=http://example.com/cal.ics&fields=name,start&fields=ongoing")
+        assert mock_fn.call_args.kwargs["fields"] == ("name", "start", "ongoing")
+
+    def test_unknown_field_returns_400(self, client):
+        resp = client.get("/events?url=http://example.com/cal.ics&fields=name,colour")
+        assert resp.status_code == 400
+        assert "colour" in resp.get_json()["error"]
+
+    def test_unknown_tz_returns_400(self, client):
+        with patch("app.get_events", return_value=[]) as mock_fn:
+            resp = client.get("/events?url=http://example.com/cal.ics&tz=Nowhere/Else")
+        assert resp.status_code == 400
+        mock_fn.assert_not_called()
+
+
+class TestMergedEventsRoute:
+    def test_single_url_uses_get_events(self, client):
+        with patch("app.get_events", return_value=[]) as mock_single, \
+                patch("app.get_merged_events") as mock_merged:
+            client.get("/events?url=http://example.com/a.ics")
+        mock_single.assert_called_once()
+        mock_merged.assert_not_called()
+
+    def test_repeated_url_uses_get_merged_events(self, client):
+        with patch("app.get_merged_events", return_value=[]) as mock_merged:
+            resp = client.get("/events?url=http://example.com/a.ics&url=http://example.com/b.ics&limit=4")
+        assert resp.status_code == 200
+        args, kwargs = mock_merged.call_args
+        assert [f["url"] for f in args[0]] == ["http://example.com/a.ics", "http://example.com/b.ics"]
+        assert kwargs["limit"] == 4
+
+    def test_single_credentials_apply_to_all_feeds(self, client):
+        with patch("app.get_merged_events", return_value=[]) as mock_merged:
+            client.get("/events?url=http://a/1.ics&url=http://a/2.ics&username=u&password=p")
+        feeds = mock_merged.call_args[0][0]
+        assert [(f["username"], f["password"]) for f in feeds] == [("u", "p"), ("u", "p")]
+
+    def test_single_credentials_refused_for_several_servers(self, client):
+        with patch("app.get_merged_events", return_value=[]) as mock_merged:
+            resp = client.get("/events?url=http://a/1.ics&url=http://b/2.ics&username=u&password=p")
+        assert resp.status_code == 400
+        assert "one 'username' per feed" in resp.get_json()["error"]
+        mock_merged.assert_not_called()
+
+    def test_other_port_is_another_server(self, client):
+        resp = client.get("/events?url=http://a/1.ics&url=http://a:8080/2.ics&password=p")
+        assert resp.status_code == 400
+
+    def test_single_label_applies_to_all_servers(self, client):
+        with patch("app.get_merged_events", return_value=[]) as mock_merged:
+            client.get("/events?url=http://a/1.ics&url=http://b/2.ics&label=Shared")
+        assert [f["label"] for f in mock_merged.call_args[0][0]] == ["Shared", "Shared"]
+
+    def test_per_feed_credentials_and_labels(self, client):
+        with patch("app.get_merged_events", return_value=[]) as mock_merged:
+            client.get(
+                "/events?url=http://a/1.ics&url=http://b/2.ics"
+                "&username=u&username=&password=p&password=&label=Work&label=Home"
+            )
+        feeds = mock_merged.call_args[0][0]
+        assert (feeds[0]["username"], feeds[0]["password"], feeds[0]["label"]) == ("u", "p", "Work")
+        assert (feeds[1]["username"], feeds[1]["password"], feeds[1]["label"]) == (None, None, "Home")
+
+    def test_mismatched_credentials_return_400(self, client):
+        resp = client.get("/events?url=http://a/1.ics&url=http://b/2.ics&url=http://c/3.ics&username=u&username=v")
+        assert resp.status_code == 400
+        assert "error" in resp.get_json()
+
+    def test_too_many_feeds_return_400(self, client):
+        with patch("app.config.MAX_FEEDS", 2):
+            resp = client.get("/events?url=http://a/1.ics&url=http://b/2.ics&url=http://c/3.ics")
+        assert resp.status_code == 400
+
+
+class TestResponseCache:
+    URL = "/events?url=http://example.com/cal.ics"
+
+    def test_repeated_request_served_from_cache(self, client):
+        with patch("app.get_events", return_value=[{"name": "Standup"}]) as mock_fn:
+            first = client.get(self.URL)
+            second = client.get(self.URL)
+        assert mock_fn.call_count == 1
+        assert first.data == second.data
+        assert first.headers["ETag"] == second.headers["ETag"]
+
+    def test_computed_as_of_bucket_start(self, client):
+        with patch("app.get_events", return_value=[]) as mock_fn, \
+                patch("responses.config.RESPONSE_CACHE_BUCKET", 60):
+            client.get(self.URL)
+        now = mock_fn.call_args.kwargs["now"]
+        assert now.timestamp() % 60 == 0
+
+    def test_cache_headers(self, client):
+        with patch("app.get_events", return_value=[]):
+            resp = client.get(self.URL)
+        assert resp.headers["ETag"].startswith('"')
+        assert resp.headers["Cache-Control"].startswith("public, max-age=")
+
+    def test_credentials_make_response_private(self, client):
+        with patch("app.get_events", return_value=[]):
+            resp = client.get(self.URL + "&username=u&password=p")
+        assert resp.headers["Cache-Control"].startswith("private, ")
+
+    def test_if_none_match_returns_304(self, client):
+        with patch("app.get_events", return_value=[{"name": "Standup"}]):
+            etag = client.get(self.URL).headers["ETag"]
+            resp = client.get(self.URL, headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.data == b""
+        assert resp.headers["ETag"] == etag
+
+    def test_changed_response_not_304(self, client):
+        with patch("app.get_events", return_value=[]):
+            resp = client.get(self.URL, headers={"If-None-Match": '"stale"'})
+        assert resp.status_code == 200
+
+    def test_errors_not_cached(self, client):
+        with patch("app.get_events", side_effect=RuntimeError("boom")):
+            assert client.get(self.URL).status_code == 400
+        assert len(responses.response_cache) == 0
+
+    def test_disabled_bucket_recomputes(self, client):
+        with patch("app.get_events", return_value=[]) as mock_fn, \
+                patch("responses.config.RESPONSE_CACHE_BUCKET", 0):
+            client.get(self.URL)
+            resp = client.get(self.URL)
+        assert mock_fn.call_count == 2
+        assert resp.headers["Cache-Control"] == "no-cache"
+
+
+class TestAbsoluteMode:
+    URL = "/events?url=http://example.com/cal.ics&relative=0"
+    EVENT = {"name": "Standup", "start": "2099-01-01T09:00:00+00:00", "end": "2099-01-01T10:00:00+00:00"}
+
+    def test_relative_fields_not_requested(self, client):
+        with patch("app.get_events", return_value=[]) as mock_fn:
+            client.get(self.URL)
+        fields = mock_fn.call_args.kwargs["fields"]
+        assert "secondsUntilStart" not in fields
+        assert "start" in fields
+
+    def test_reference_and_expiry_in_payload(self, client):
+        with patch("app.get_events", return_value=[self.EVENT]) as mock_fn:
+            data = client.get(self.URL + "&tz=UTC").get_json()
+        assert data["events"] == [self.EVENT]
+        assert data["validUntil"] == self.EVENT["start"]
+        assert data["generatedAt"] == mock_fn.call_args.kwargs["now"].isoformat()
+
+    def test_max_age_bounded_by_feed_ttl(self, client):
+        with patch("app.get_events", return_value=[self.EVENT]), \
+                patch("responses.config.FEED_CACHE_TTL", 300):
+            resp = client.get(self.URL)
+        assert resp.headers["Cache-Control"] in ("public, max-age=300", "public, max-age=299")
+
+    def test_explicit_relative_field_returns_400(self, client):
+        resp = client.get(self.URL + "&fields=secondsUntilStart")
+        assert resp.status_code == 400
+
+    def test_invalid_value_returns_400(self, client):
+        resp = client.get("/events?url=http://example.com/cal.ics&relative=maybe")
+        assert resp.status_code == 400
+
+
+class TestStatsRoute:
+    def test_reports_cache_counters(self, client):
+        resp = client.get("/stats")
+        assert resp.status_code == 200
+        caches = resp.get_json()["caches"]
+        for name in ("feed", "parsed", "response"):
+            assert {"hits", "misses", "entries"} <= set(caches[name])
+
+
+class TestMetricsRoute:
+    def test_prometheus_text(self, client):
+        with patch("service.http.request", side_effect=ConnectionError("down")):
+            client.get("/events?url=http://example.com/secret-token.ics")
+        resp = client.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.content_type.startswith("text/plain; version=0.0.4")
+        text = resp.get_data(as_text=True)
+        assert 'ical_upstream_responses_total{feed="' in text
+        assert 'ical_cache_misses_total{cache="response"}' in text
+        assert "secret-token" not in text
+
+    def test_disabled(self, client):
+        with patch("app.config.METRICS_ENABLED", False):
+            assert client.get("/metrics").status_code == 404
+
+
+class TestServerTiming:
+    URL = "/events?url=http://example.com/a.ics"
+
+    def test_stages_reported(self, client):
+        with patch("service.http.request", side_effect=_feed_request):
+            resp = client.get(self.URL)
+        header = resp.headers["Server-Timing"]
+        for stage in ("fetch;", "upstream;", 'parse;', 'desc="icalevents"', "select;", "enrich;", "serialize;", "total;"):
+            assert stage in header
+
+    def test_merged_feeds_measured_on_pool_threads(self, client):
+        with patch("service.http.request", side_effect=_feed_request):
+            resp = client.get(self.URL + "&url=http://example.com/b.ics")
+        assert "parse;" in resp.headers["Server-Timing"]
+
+    def test_response_cache_hit(self, client):
+        with patch("service.http.request", side_effect=_feed_request):
+            client.get(self.URL)
+            resp = client.get(self.URL)
+        header = resp.headers["Server-Timing"]
+        assert 'cache;desc="hit"' in header
+        assert "fetch;" not in header
+
+    def test_errors_not_stored(self, client):
+        resp = client.get("/events")
+        assert resp.headers["Cache-Control"] == "no-store"
+        assert "total;" in resp.headers["Server-Timing"]
+
+
+class TestProfile:
+    URL = "/events?url=http://example.com/a.ics&profile=1"
+
+    def test_disabled_by_default(self, client):
+        assert client.get(self.URL).status_code == 400
+
+    def test_profile_returned(self, client):
+        with patch("app.config.PROFILE_ENABLED", True), \
+                patch("service.http.request", side_effect=_feed_request):
+            resp = client.get(self.URL)
+        data = resp.get_json()
+        assert [e["name"] for e in data["events"]] == ["Team A"]
+        assert "parse" in data["profile"]["stagesMs"]
+        assert any("get_events" in f["function"] for f in data["profile"]["functions"])
+        assert resp.headers["Cache-Control"] == "no-store"
+
+    def test_profile_bypasses_response_cache(self, client):
+        with patch("app.config.PROFILE_ENABLED", True), \
+                patch("app.get_events", return_value=[]) as mock_fn:
+            client.get(self.URL)
+            client.get(self.URL)
+        assert mock_fn.call_count == 2
+        assert len(responses.response_cache) == 0
+
+
+class TestPrefetchTracking:
+    def test_feed_tracked_when_enabled(self, client):
+        with patch("app.config.PREFETCH_ENABLED", True), \
+                patch("app.prefetcher.track") as mock_track, \
+                patch("app.get_events", return_value=[]):
+            client.get("/events?url=http://example.com/cal.ics&lookback_days=3")
+        mock_track.assert_called_once_with("http://example.com/cal.ics", 3, 3650, None, None)
+
+    def test_feed_not_tracked_when_disabled(self, client):
+        with patch("app.config.PREFETCH_ENABLED", False), \
+                patch("app.prefetcher.track") as mock_track, \
+                patch("app.get_events", return_value=[]):
+            client.get("/events?url=http://example.com/cal.ics")
+        mock_track.assert_not_called()
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+from unittest.mock import MagicMock, patch
+
+import asgi
+import service
+from tests.test_service import _future_ics, _stream_body
+
+FEEDS = {
+    "http://example.com/a.ics": _future_ics("a@test", "Team A", 2),
+    "http://example.com/b.ics": _future_ics("b@test", "Team B", 1),
+}
+
+
+def _request(method, url, **kwargs):
+    if url not in FEEDS:
+        raise ConnectionError(url)
+    mock_resp = MagicMock()
+    mock_resp.status = 200
+    mock_resp.headers = {}
+    _stream_body(mock_resp, FEEDS[url].encode("utf-8"))
+    return mock_resp
+
+
+async def _call(path, query="", method="GET", headers=(), sent=None):
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode("ascii"),
+             "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]}
+    sent = [] if sent is None else sent
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.app(scope, receive, send)
+    body = sent[1]["body"]
+    return sent[0]["status"], json.loads(body) if body else None
+
+
+def call(path, query="", method="GET", headers=(), sent=None):
+    return asyncio.run(_call(path, query, method, headers, sent))
+
+
+class TestRoutes:
+    def test_index(self):
+        status, data = call("/")
+        assert status == 200
+        assert "message" in data
+
+    def test_stats(self):
+        status, data = call("/stats")
+        assert status == 200
+        assert "feed" in data["caches"]
+
+    def test_metrics(self):
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "path": "/metrics", "query_string": b"", "headers": []}
+        asyncio.run(asgi.app(scope, receive, send))
+        assert sent[0]["status"] == 200
+        assert dict(sent[0]["headers"])[b"content-type"].startswith(b"text/plain")
+        assert b"# TYPE ical_stage_duration_seconds histogram" in sent[1]["body"]
+
+    def test_unknown_path_returns_404(self):
+        assert call("/nope")[0] == 404
+
+    def test_post_returns_405(self):
+        assert call("/events", method="POST")[0] == 405
+
+    def test_head_has_no_body(self):
+        status, data = call("/", method="HEAD")
+        assert status == 200
+        assert data is None
+
+    def test_lifespan(self):
+        messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        asyncio.run(asgi.app({"type": "lifespan"}, receive, send))
+        assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+
+
+class TestEventsRoute:
+    def test_validation_matches_flask_app(self):
+        status, data = call("/events", "limit=5")
+        assert status == 400
+        assert data == {"error": "No URL provided"}
+
+    def test_single_feed(self):
+        with patch("service.http.request", side_effect=_request):
+            status, data = call("/events", "url=http://example.com/a.ics&tz=Asia/Kolkata")
+        assert status == 200
+        assert [e["name"] for e in data["events"]] == ["Team A"]
+        assert data["events"][0]["start"].endswith("+05:30")
+
+    def test_compact_fields(self):
+        with patch("service.http.request", side_effect=_request):
+            status, data = call("/events", "url=http://example.com/a.ics&url=http://example.com/b.ics&fields=compact")
+        assert status == 200
+        assert set(data["events"][0]) == {"name", "start", "end", "ongoing", "url", "feed", "feedLabel"}
+
+    def test_response_cached_with_etag(self):
+        with patch("service.http.request", side_effect=_request) as mock_req:
+            sent = []
+            call("/events", "url=http://example.com/a.ics", sent=sent)
+            headers = dict(sent[0]["headers"])
+            sent = []
+            status, data = call("/events", "url=http://example.com/a.ics",
+                                headers=[("If-None-Match", headers[b"etag"].decode())], sent=sent)
+        assert mock_req.call_count == 1
+        assert status == 304
+        assert data is None
+        assert dict(sent[0]["headers"])[b"etag"] == headers[b"etag"]
+        assert headers[b"cache-control"].startswith(b"public, max-age=")
+
+    def test_server_timing(self):
+        sent = []
+        with patch("service.http.request", side_effect=_request):
+            call("/events", "url=http://example.com/a.ics&url=http://example.com/b.ics", sent=sent)
+        header = dict(sent[0]["headers"])[b"server-timing"].decode()
+        for stage in ("fetch;", "parse;", "select;", "enrich;", "serialize;", "total;"):
+            assert stage in header
+
+    def test_profile(self):
+        with patch("app.config.PROFILE_ENABLED", True), \
+                patch("service.http.request", side_effect=_request):
+            status, data = call("/events", "url=http://example.com/a.ics&profile=1")
+        assert status == 200
+        assert data["profile"]["functions"]
+
+    def test_lazy_expand(self):
+        with patch("service.http.request", side_effect=_request):
+            status, data = call("/events", "url=http://example.com/a.ics&expand=lazy&limit=1")
+        assert status == 200
+        assert data["events"][0]["source"] == "lazy"
+
+    def test_merged_feeds(self):
+        with patch("service.http.request", side_effect=_request):
+            status, data = call("/events", "url=http://example.com/a.ics&url=http://example.com/b.ics&label=A&label=B")
+        assert status == 200
+        assert [(e["name"], e["feedLabel"]) for e in data["events"]] == [("Team B", "B"), ("Team A", "A")]
+
+    def test_parse_coalesced_with_the_sync_path(self):
+        with patch("service.http.request", side_effect=_request), \
+                patch("service.coalesce_events", wraps=service.coalesce_events) as mock_coalesce:
+            status, _ = call("/events", "url=http://example.com/a.ics&username=u&password=p")
+        assert status == 200
+        assert mock_coalesce.call_args[0][:3] == ("http://example.com/a.ics", "u", "p")
+
+    def test_failing_feed_returns_400(self):
+        with patch("service.http.request", side_effect=_request):
+            status, data = call("/events", "url=http://down.example.com/x.ics")
+        assert status == 400
+        assert data == {"error": "Failed to retrieve events"}
+
+    def test_slow_feeds_do_not_queue_behind_each_other(self):
+        def slow(method, url, **kwargs):
+            time.sleep(0.3)
+            return _request(method, "http://example.com/a.ics", **kwargs)
+
+        async def many():
+            return await asyncio.gather(*(_call("/events", "url=http://example.com/{0}.ics".format(i))
+                                          for i in range(20)))
+
+        with patch("service.http.request", side_effect=slow) as mock_request:
+            started = time.monotonic()
+            results = asyncio.run(many())
+            elapsed = time.monotonic() - started
+        assert mock_request.call_count == 20
+        assert all(status == 200 for status, _ in results)
+        assert elapsed < 2
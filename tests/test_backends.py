@@ -0,0 +1,257 @@
+import fnmatch
+import json
+import pickle
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import backends
+import service
+from backends import FileBackend, MemoryBackend, RedisBackend, create_backend
+from cache import FeedEntry
+from tests.test_service import MINIMAL_ICS, _response
+
+
+class FakeRedis:
+    """The subset of redis.Redis the backend uses, in memory."""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+        self.lock = threading.Lock()
+
+    def _alive(self, key):
+        deadline = self.expiry.get(key)
+        if deadline is not None and time.monotonic() >= deadline:
+            self.data.pop(key, None)
+            self.expiry.pop(key, None)
+        return key in self.data
+
+    def get(self, key):
+        with self.lock:
+            return self.data[key] if self._alive(key) else None
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        with self.lock:
+            if nx and self._alive(key):
+                return None
+            self.data[key] = value.encode("utf-8") if isinstance(value, str) else value
+            self.expiry.pop(key, None)
+            if ex is not None:
+                self.expiry[key] = time.monotonic() + ex
+            if px is not None:
+                self.expiry[key] = time.monotonic() + px / 1000
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            self.expiry.pop(key, None)
+            return 1 if self.data.pop(key, None) is not None else 0
+
+    def scan_iter(self, match="*"):
+        with self.lock:
+            keys = [k for k in list(self.data) if self._alive(k)]
+        return iter([k.encode("utf-8") for k in keys if fnmatch.fnmatchcase(k, match)])
+
+
+def _entry(body=b"BEGIN:VCALENDAR", age=0.0):
+    return FeedEntry(body, '"v1"', None, time.monotonic() - age)
+
+
+@pytest.fixture(params=["file", "redis"])
+def shared(request, tmp_path):
+    if request.param == "file":
+        return FileBackend(str(tmp_path / "cache"), max_entries=8, lock_timeout=1)
+    return RedisBackend(FakeRedis(), max_entries=8, expire=60, lock_timeout=1)
+
+
+class TestMemoryBackend:
+    def test_is_an_lru_cache_without_locking(self):
+        cache = MemoryBackend(2)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.shared is False
+        with cache.lock("a"):
+            pass
+
+
+class TestSharedBackends:
+    def test_feed_entry_round_trip_keeps_age(self, shared):
+        shared.set(("url", "anon"), _entry(age=30))
+        entry = shared.get(("url", "anon"))
+        assert entry.body == b"BEGIN:VCALENDAR"
+        assert entry.etag == '"v1"'
+        assert 29 < time.monotonic() - entry.fetched_at < 35
+
+    def test_missing_key_counts_a_miss(self, shared):
+        assert shared.get("nope", 5) == 5
+        assert shared.stats()["misses"] == 1
+
+    def test_pop_clear_len_contains(self, shared):
+        shared.set("a", _entry(b"a"))
+        shared.set("b", _entry(b"b"))
+        assert len(shared) == 2
+        assert "a" in shared
+        assert shared.pop("a").body == b"a"
+        assert "a" not in shared
+        assert shared.get("a") is None
+        shared.clear()
+        assert len(shared) == 0
+
+    def test_disabled_with_zero_entries(self, shared):
+        shared.max_entries = 0
+        shared.set("a", _entry())
+        assert len(shared) == 0
+
+    def test_only_feed_entries_are_stored(self, shared):
+        shared.set("a", {"not": "an entry"})
+        assert shared.stats()["errors"] == 1
+        assert len(shared) == 0
+
+    def test_stored_as_json_header_and_raw_body(self, shared):
+        shared.set("a", _entry(b"BEGIN:VCALENDAR\r\nbody"))
+        data = shared._get(backends._name("a"))
+        head, _, body = data.partition(b"\n")
+        assert json.loads(head)["etag"] == '"v1"'
+        assert body == b"BEGIN:VCALENDAR\r\nbody"
+
+    @pytest.mark.parametrize("data", [
+        pickle.dumps(("feed", b"body", None, None, 0.0)),
+        b'{"v": 1, "etag": 5, "last_modified": null, "fetched": 0}\nbody',
+        b'{"v": 2}\nbody',
+        b"no header",
+    ])
+    def test_foreign_data_is_a_miss(self, shared, data):
+        shared._set(backends._name("a"), data)
+        assert shared.get("a") is None
+        assert shared.stats()["errors"] == 1
+
+    def test_fresh_entries_served_from_the_process(self, shared):
+        shared.set("a", _entry(b"fresh"))
+        with patch.object(shared, "_get", side_effect=AssertionError("shared store read")):
+            assert shared.get("a").body == b"fresh"
+
+    def test_stale_entries_read_from_the_store(self, shared):
+        shared.set("a", _entry(b"old", age=3600))
+        other = _entry(b"new")
+        shared._set(backends._name("a"), backends._dumps(other))
+        assert shared.get("a").body == b"new"
+
+    def test_latest_bypasses_the_process_copy(self, shared):
+        shared.set("a", _entry(b"mine"))
+        shared._set(backends._name("a"), backends._dumps(_entry(b"other worker")))
+        assert shared.get("a").body == b"mine"
+        assert shared.latest("a").body == b"other worker"
+
+    def test_lock_is_exclusive(self, shared):
+        inside = []
+        overlap = []
+
+        def worker():
+            with shared.lock("feed"):
+                if inside:
+                    overlap.append(True)
+                inside.append(True)
+                time.sleep(0.05)
+                inside.pop()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert overlap == []
+
+    def test_lock_timeout_runs_block_anyway(self, shared):
+        shared.lock_timeout = 0.1
+        ran = []
+
+        def other():
+            with shared.lock("feed"):
+                ran.append(True)
+
+        with shared.lock("feed"):
+            t = threading.Thread(target=other)
+            t.start()
+            t.join(2)
+        assert ran == [True]
+
+
+class TestFileBackend:
+    def test_shared_between_instances(self, tmp_path):
+        FileBackend(str(tmp_path), 8).set("k", _entry(b"body"))
+        assert FileBackend(str(tmp_path), 8).get("k").body == b"body"
+
+    def test_oldest_entries_evicted(self, tmp_path):
+        cache = FileBackend(str(tmp_path), 2)
+        for key in ("a", "b", "c"):
+            cache.set(key, _entry(key.encode()))
+            time.sleep(0.02)
+        assert "a" not in cache
+        assert len(cache) == 2
+
+
+class TestRedisBackend:
+    def test_entries_expire(self):
+        client = FakeRedis()
+        cache = RedisBackend(client, 8, expire=60)
+        cache.set("k", 1)
+        assert all(deadline > time.monotonic() + 50 for deadline in client.expiry.values())
+
+    def test_lock_keys_not_counted_as_entries(self):
+        cache = RedisBackend(FakeRedis(), 8, expire=60)
+        with cache.lock("k"):
+            assert len(cache) == 0
+
+    def test_unreachable_server_is_a_miss(self):
+        client = MagicMock()
+        client.get.side_effect = ConnectionError("down")
+        cache = RedisBackend(client, 8, expire=60)
+        assert cache.get("k") is None
+        assert cache.stats()["errors"] == 1
+
+
+class TestCreateBackend:
+    def test_memory_by_default(self):
+        assert isinstance(create_backend("memory", 4), MemoryBackend)
+
+    def test_file(self, tmp_path):
+        with patch("backends.config.CACHE_DIR", str(tmp_path)):
+            assert isinstance(create_backend("file", 4), FileBackend)
+
+    def test_unavailable_backend_falls_back_to_memory(self):
+        with patch.object(RedisBackend, "from_url", side_effect=ImportError("no redis")):
+            assert isinstance(create_backend("redis", 4), MemoryBackend)
+
+    def test_unknown_name_falls_back_to_memory(self):
+        assert isinstance(create_backend("memcached", 4), MemoryBackend)
+
+
+class TestServiceWithSharedBackend:
+    URL = "http://example.com/cal.ics"
+
+    def test_second_worker_reuses_first_download(self, tmp_path):
+        worker_a = FileBackend(str(tmp_path), 8)
+        worker_b = FileBackend(str(tmp_path), 8)
+        with patch("service.feed_cache", worker_a), patch("service.http.request", return_value=_response(MINIMAL_ICS)):
+            service.fetch_feed_body(self.URL, None, None)
+        with patch("service.feed_cache", worker_b), patch("service.http.request") as mock_req:
+            assert service.fetch_feed_body(self.URL, None, None) == MINIMAL_ICS.encode("utf-8")
+        mock_req.assert_not_called()
+
+    def test_download_rechecks_cache_after_lock(self):
+        cache = RedisBackend(FakeRedis(), 8, expire=60)
+        key = (self.URL, service.auth_identity(None, None))
+        stale = FeedEntry(b"old", None, None, time.monotonic() - 3600)
+        cache.set(key, _entry(b"fetched by another worker"))
+        with patch("service.feed_cache", cache), patch("service.http.request") as mock_req:
+            body = service._shared_download(self.URL, None, None, key, stale, revalidate=False)
+        assert body == b"fetched by another worker"
+        mock_req.assert_not_called()
+
+    def test_stats_name_backend(self, tmp_path):
+        with patch("service.feed_cache", FileBackend(str(tmp_path), 8)), \
+                patch("service.config.CACHE_BACKEND", "file"):
+            assert service.cache_stats()["feed"]["backend"] == "file"
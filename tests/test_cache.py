@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+from cache import LRUCache, SingleFlight
+
+
+class TestLRUCache:
+    def test_get_missing_returns_default(self):
+        cache = LRUCache(2)
+        assert cache.get("missing") is None
+        assert cache.get("missing", 5) == 5
+
+    def test_set_and_get(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert "a" in cache
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now the oldest
+        cache.set("c", 3)
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+        assert len(cache) == 2
+
+    def test_zero_size_disables_cache(self):
+        cache = LRUCache(0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_pop_and_clear(self):
+        cache = LRUCache(3)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.pop("a") == 1
+        assert cache.pop("a") is None
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_concurrent_writes_respect_bound(self):
+        cache = LRUCache(10)
+
+        def writer(offset):
+            for i in range(200):
+                cache.set((offset, i), i)
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(cache) == 10
+
+
+class TestSingleFlight:
+    def _run_concurrently(self, flight, key, fn, n=5):
+        results, errors = [], []
+
+        def worker():
+            try:
+                results.append(flight.do(key, fn))
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=worker) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, errors
+
+    def test_concurrent_callers_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.1)
+            return "body"
+
+        results, errors = self._run_concurrently(flight, "k", slow)
+        assert errors == []
+        assert results == ["body"] * 5
+        assert len(calls) == 1
+
+    def test_exception_propagates_to_all_waiters(self):
+        flight = SingleFlight()
+
+        def failing():
+            time.sleep(0.1)
+            raise ValueError("upstream down")
+
+        results, errors = self._run_concurrently(flight, "k", failing)
+        assert results == []
+        assert len(errors) == 5
+        assert all(isinstance(e, ValueError) for e in errors)
+
+    def test_sequential_calls_are_not_deduplicated(self):
+        flight = SingleFlight()
+        calls = []
+        flight.do("k", lambda: calls.append(1))
+        flight.do("k", lambda: calls.append(1))
+        assert len(calls) == 2
+        assert not flight.in_flight("k")
+
+    def test_different_keys_run_independently(self):
+        flight = SingleFlight()
+        assert flight.do("a", lambda: 1) == 1
+        assert flight.do("b", lambda: 2) == 2
+
+    def test_key_released_after_failure(self):
+        flight = SingleFlight()
+        with pytest.raises(RuntimeError):
+            flight.do("k", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+        assert flight.do("k", lambda: "ok") == "ok"
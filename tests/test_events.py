@@ -0,0 +1,139 @@
+import datetime
+
+import pytest
+import pytz
+
+from unittest.mock import MagicMock, patch
+
+from events import FIELD_NAMES, RELATIVE_FIELDS, EventView, ParsedEvent, absolute_fields, parse_fields
+
+UTC = pytz.utc
+NOW = datetime.datetime(2028, 6, 15, 12, 0, tzinfo=UTC)
+
+
+def _event(**kwargs):
+    fields = dict(summary="Standup", uid="s@test", start=NOW + datetime.timedelta(hours=1),
+                  end=NOW + datetime.timedelta(hours=2), all_day=False, source="fallback")
+    fields.update(kwargs)
+    return ParsedEvent(fields)
+
+
+class TestParsedEvent:
+    def test_slotted(self):
+        assert not hasattr(_event(), "__dict__")
+
+    def test_mapping_access(self):
+        ev = _event()
+        assert ev["summary"] == "Standup"
+        assert ev.get("location") is None
+        assert ev.get("nope", 1) == 1
+        assert "summary" in ev
+        assert "nope" not in ev
+        with pytest.raises(KeyError):
+            ev["nope"]
+
+    def test_unknown_field_rejected(self):
+        with pytest.raises(TypeError):
+            ParsedEvent(name="x")
+
+    def test_row_round_trip(self):
+        ev = _event(location="Room 1")
+        assert ParsedEvent.from_row(ev.row()) == ev
+
+    def test_setitem(self):
+        ev = _event()
+        ev["location"] = "Room 2"
+        assert ev.location == "Room 2"
+        with pytest.raises(KeyError):
+            ev["feed"] = 1
+
+
+class TestEventView:
+    def _view(self, **kwargs):
+        ev = _event(**kwargs)
+        return EventView(ev, ev.start, ev.end, NOW)
+
+    def test_fields_computed_on_demand(self):
+        view = self._view()
+        assert view["name"] == "Standup"
+        assert view["start"] == (NOW + datetime.timedelta(hours=1)).isoformat()
+        assert view["secondsUntilStart"] == 3600
+        assert view["durationSeconds"] == 3600
+        assert view["ongoing"] is False
+        assert view["daysRemaining"] is None
+
+    def test_to_dict_has_response_fields_only(self):
+        data = self._view(created=NOW).to_dict()
+        assert "start_dt" not in data
+        assert "feed" not in data
+        assert data["created"] == NOW.isoformat()
+        assert len(data) == 18
+
+    def test_feed_fields_once_tagged(self):
+        view = self._view()
+        view.feed = 0
+        view.feed_label = "Work"
+        data = view.to_dict()
+        assert data["feed"] == 0
+        assert data["feedLabel"] == "Work"
+
+    def test_ongoing_derived_from_now(self):
+        ev = _event(start=NOW - datetime.timedelta(hours=1))
+        assert EventView(ev, ev.start, ev.end, NOW).ongoing is True
+
+
+class TestFieldProjection:
+    def _view(self):
+        ev = _event(description="x" * 10000)
+        return EventView(ev, ev.start, ev.end, NOW)
+
+    def test_only_requested_fields_returned(self):
+        assert list(self._view().to_dict(("name", "ongoing"))) == ["name", "ongoing"]
+
+    def test_unrequested_fields_not_computed(self):
+        spy = MagicMock(return_value="rendered")
+        with patch.dict("events._VIEW_FIELDS", {"end": spy}):
+            self._view().to_dict(("name", "start"))
+        spy.assert_not_called()
+
+    def test_feed_fields_only_for_merged_events(self):
+        view = self._view()
+        assert "feedLabel" not in view.to_dict(("name", "feedLabel"))
+        view.feed = 1
+        assert view.to_dict(("name", "feedLabel")) == {"name": "Standup", "feedLabel": None}
+
+
+class TestParseFields:
+    def test_default_is_everything(self):
+        assert parse_fields([]) is None
+        assert parse_fields(["all"]) is None
+
+    def test_comma_separated_and_repeated(self):
+        assert parse_fields(["name, start", "end", "name"]) == ("name", "start", "end")
+
+    def test_compact_preset(self):
+        assert parse_fields(["compact"]) == ("name", "start", "end", "ongoing", "url", "feed", "feedLabel")
+
+    def test_preset_combined_with_fields(self):
+        assert parse_fields(["compact,location"])[-1] == "location"
+
+    def test_unknown_field_rejected(self):
+        with pytest.raises(ValueError, match="Unknown field 'colour'"):
+            parse_fields(["name,colour"])
+
+    def test_every_field_name_accepted(self):
+        assert parse_fields([",".join(FIELD_NAMES)]) == FIELD_NAMES
+
+
+class TestAbsoluteFields:
+    def test_default_drops_relative_fields(self):
+        fields = absolute_fields(None)
+        assert not set(RELATIVE_FIELDS) & set(fields)
+        assert {"start", "end", "ongoing", "feedLabel"} <= set(fields)
+
+    def test_start_and_end_always_included(self):
+        assert absolute_fields(("name",)) == ("start", "end", "name")
+
+    def test_explicit_relative_field_rejected(self):
+        with pytest.raises(ValueError, match="secondsUntilStart"):
+            absolute_fields(("name", "secondsUntilStart"))
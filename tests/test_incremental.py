@@ -0,0 +1,160 @@
+import pytest
+
+import incremental
+from events import ParsedEvent
+from incremental import PartsState, assemble, block_uid, changed, split
+
+FEED = (
+    b"BEGIN:VCALENDAR\r\n"
+    b"VERSION:2.0\r\n"
+    b"X-WR-TIMEZONE:Europe/Berlin\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"UID:standup@test\r\n"
+    b"DTSTAMP:20280101T000000Z\r\n"
+    b"DTSTART:20280601T090000Z\r\n"
+    b"RRULE:FREQ=DAILY;COUNT=5\r\n"
+    b"SUMMARY:Standup\r\n"
+    b"END:VEVENT\r\n"
+    b"BEGIN:VTIMEZONE\r\n"
+    b"TZID:Custom\r\n"
+    b"END:VTIMEZONE\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"UID:offsite@test\r\n"
+    b"DTSTART:20280604T120000Z\r\n"
+    b"SUMMARY:Offsite\r\n"
+    b"END:VEVENT\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"UID:standup@test\r\n"
+    b"RECURRENCE-ID:20280603T090000Z\r\n"
+    b"DTSTART:20280603T110000Z\r\n"
+    b"SUMMARY:Standup (moved)\r\n"
+    b"END:VEVENT\r\n"
+    b"END:VCALENDAR\r\n"
+)
+
+
+def _event(uid, summary="x"):
+    return ParsedEvent(uid=uid, summary=summary)
+
+
+# ---------------------------------------------------------------------------
+# split / block_uid
+# ---------------------------------------------------------------------------
+
+class TestSplit:
+    def test_groups_blocks_by_uid(self):
+        parts = split(FEED)
+        assert list(parts.groups) == ["standup@test", "offsite@test"]
+        assert len(parts.groups["standup@test"]) == 2
+        assert parts.groups["standup@test"][1].startswith(b"BEGIN:VEVENT\r\nUID:standup@test\r\nRECURRENCE-ID")
+
+    def test_frame_keeps_everything_but_vevents(self):
+        frame = split(FEED).frame
+        assert b"VEVENT" not in frame
+        assert b"X-WR-TIMEZONE:Europe/Berlin" in frame
+        assert b"BEGIN:VTIMEZONE" in frame
+        assert frame.endswith(b"END:VCALENDAR\r\n")
+
+    def test_document_puts_groups_before_end_of_calendar(self):
+        doc = split(FEED).document(["offsite@test"])
+        assert doc.count(b"BEGIN:VEVENT") == 1
+        assert b"UID:offsite@test" in doc
+        assert doc.index(b"END:VEVENT") < doc.index(b"END:VCALENDAR")
+        assert b"BEGIN:VTIMEZONE" in doc
+
+    def test_folded_uid(self):
+        assert block_uid(b"BEGIN:VEVENT\r\nUID:abc\r\n def@test\r\nEND:VEVENT\r\n") == "abcdef@test"
+
+    def test_alarm_uid_ignored(self):
+        block = (b"BEGIN:VEVENT\r\nBEGIN:VALARM\r\nUID:alarm@test\r\nEND:VALARM\r\n"
+                 b"UID:event@test\r\nEND:VEVENT\r\n")
+        assert block_uid(block) == "event@test"
+
+    @pytest.mark.parametrize("block", [
+        b"BEGIN:VEVENT\r\nSUMMARY:no uid\r\nEND:VEVENT\r\n",
+        b"BEGIN:VEVENT\r\nUID:caf\xc3\xa9@test\r\nEND:VEVENT\r\n",
+        b"BEGIN:VEVENT\r\nUID:a\\,b@test\r\nEND:VEVENT\r\n",
+    ])
+    def test_unusable_uids_share_the_none_group(self, block):
+        assert block_uid(block) is None
+
+    def test_lf_line_endings(self):
+        parts = split(FEED.replace(b"\r\n", b"\n"))
+        assert list(parts.groups) == ["standup@test", "offsite@test"]
+
+
+# ---------------------------------------------------------------------------
+# changed / assemble
+# ---------------------------------------------------------------------------
+
+class TestChanged:
+    def _state(self, parts):
+        return assemble(parts, None, list(parts.groups),
+                        [_event("standup@test"), _event("offsite@test"), _event("standup@test")], "icalevents")
+
+    def test_everything_without_previous_state(self):
+        parts = split(FEED)
+        assert changed(parts, None) == ["standup@test", "offsite@test"]
+
+    def test_only_edited_group(self):
+        previous = self._state(split(FEED))
+        parts = split(FEED.replace(b"SUMMARY:Offsite", b"SUMMARY:Offsite (Berlin)"))
+        assert changed(parts, previous) == ["offsite@test"]
+
+    def test_edited_override_marks_its_series(self):
+        previous = self._state(split(FEED))
+        parts = split(FEED.replace(b"Standup (moved)", b"Standup (moved again)"))
+        assert changed(parts, previous) == ["standup@test"]
+
+    def test_dtstamp_ignored(self):
+        previous = self._state(split(FEED))
+        parts = split(FEED.replace(b"DTSTAMP:20280101T000000Z", b"DTSTAMP:20280102T000000Z"))
+        assert changed(parts, previous) == []
+
+    def test_frame_change_invalidates_all(self):
+        previous = self._state(split(FEED))
+        parts = split(FEED.replace(b"Europe/Berlin", b"Asia/Tokyo"))
+        assert changed(parts, previous) == ["standup@test", "offsite@test"]
+
+    def test_new_group(self):
+        previous = self._state(split(FEED))
+        extra = b"BEGIN:VEVENT\r\nUID:new@test\r\nDTSTART:20280605T120000Z\r\nEND:VEVENT\r\n"
+        parts = split(FEED.replace(b"END:VCALENDAR", extra + b"END:VCALENDAR"))
+        assert changed(parts, previous) == ["new@test"]
+
+
+class TestAssemble:
+    def test_reuses_unchanged_groups(self):
+        parts = split(FEED)
+        series = [_event("standup@test"), _event("standup@test")]
+        previous = assemble(parts, None, list(parts.groups), series + [_event("offsite@test")], "icalevents")
+        edited = split(FEED.replace(b"SUMMARY:Offsite", b"SUMMARY:Offsite (Berlin)"))
+        moved = _event("offsite@test", "Offsite (Berlin)")
+        state = assemble(edited, previous, ["offsite@test"], [moved], "icalevents")
+        assert isinstance(state, PartsState)
+        assert state.groups["standup@test"][1] == series
+        assert state.events() == series + [moved]
+        assert state.parser == "icalevents"
+
+    def test_removed_group_dropped(self):
+        parts = split(FEED)
+        previous = assemble(parts, None, list(parts.groups), [_event("standup@test"), _event("offsite@test")], "icalevents")
+        start = FEED.index(b"BEGIN:VEVENT\r\nUID:offsite@test")
+        end = FEED.index(b"END:VEVENT\r\n", start) + len(b"END:VEVENT\r\n")
+        shorter = split(FEED[:start] + FEED[end:])
+        state = assemble(shorter, previous, changed(shorter, previous), [], "icalevents")
+        assert [e["uid"] for e in state.events()] == ["standup@test"]
+
+    def test_unknown_uid_goes_to_none_group(self):
+        feed = FEED.replace(b"UID:offsite@test\r\n", b"")
+        parts = split(feed)
+        state = assemble(parts, None, list(parts.groups), [_event("standup@test"), _event("random-uuid")], "icalevents")
+        assert [e["uid"] for e in state.groups[None][1]] == ["random-uuid"]
+
+    def test_unattributable_event_rejected(self):
+        parts = split(FEED)
+        assert assemble(parts, None, list(parts.groups), [_event("elsewhere@test")], "icalevents") is None
+
+    def test_digests_ignore_dtstamp_only(self):
+        assert incremental._digest([b"DTSTAMP:1\r\nX:1\r\n"]) == incremental._digest([b"DTSTAMP:2\r\nX:1\r\n"])
+        assert incremental._digest([b"X:1\r\n"]) != incremental._digest([b"X:2\r\n"])
@@ -0,0 +1,144 @@
+import datetime
+import random
+
+import pytest
+import pytz
+
+import service
+from events import ParsedEvent
+from intervals import IndexedEvents, OccurrenceIndex
+from service import select_events
+
+UTC = pytz.utc
+BERLIN = pytz.timezone("Europe/Berlin")
+NOW = datetime.datetime(2028, 6, 15, 12, 0, tzinfo=UTC)
+
+
+def _event(uid, start, minutes, all_day=False):
+    return ParsedEvent(uid=uid, summary=uid, start=start, end=start + datetime.timedelta(minutes=minutes),
+                       all_day=all_day, source="icalevents")
+
+
+def _random_events(count, seed):
+    rng = random.Random(seed)
+    events = []
+    for i in range(count):
+        start = NOW + datetime.timedelta(minutes=rng.randrange(-30 * 24 * 4, 30 * 24 * 4) * 15)
+        kind = rng.random()
+        if kind < 0.1:
+            day = start.replace(hour=0, minute=0)
+            events.append(_event("day-{0}".format(i), day, 0 if kind < 0.05 else 24 * 60 * rng.randrange(1, 4), True))
+        elif kind < 0.15:
+            events.append(_event("long-{0}".format(i), start, rng.randrange(1, 60) * 24 * 60))
+        elif kind < 0.2:
+            events.append(_event("point-{0}".format(i), start, 0))
+        else:
+            events.append(_event("event-{0}".format(i), start, rng.choice((15, 30, 60, 90, 240))))
+    return events
+
+
+def _keys(views):
+    return [(v.event.uid, v.start_local, v.end_local, v.ongoing) for v in views]
+
+
+def _linear(events, now_local, tz, limit, include_ended=False):
+    return select_events(list(events), now_local, tz, limit, include_ended=include_ended)
+
+
+# ---------------------------------------------------------------------------
+# select_events with and without the index
+# ---------------------------------------------------------------------------
+
+class TestIndexedSelect:
+    @pytest.mark.parametrize("seed", range(5))
+    @pytest.mark.parametrize("limit", [None, 0, 1, 5, 50])
+    def test_matches_linear_scan(self, seed, limit):
+        events = _random_events(400, seed)
+        indexed = IndexedEvents(events)
+        for tz in (UTC, BERLIN):
+            for offset in (0, 7, 15 * 60 + 3):
+                now_local = (NOW + datetime.timedelta(minutes=offset)).astimezone(tz)
+                assert _keys(select_events(indexed, now_local, tz, limit)) == \
+                    _keys(_linear(events, now_local, tz, limit))
+
+    @pytest.mark.parametrize("limit", [None, 3, 30])
+    def test_include_ended_matches_linear_scan(self, limit):
+        events = _random_events(200, 7)
+        now_local = NOW.astimezone(BERLIN)
+        assert _keys(select_events(IndexedEvents(events), now_local, BERLIN, limit, include_ended=True)) == \
+            _keys(_linear(events, now_local, BERLIN, limit, include_ended=True))
+
+    def test_ties_keep_feed_order(self):
+        events = [_event("b", NOW, 60), _event("a", NOW, 60), _event("c", NOW + datetime.timedelta(hours=1), 60),
+                  _event("d", NOW + datetime.timedelta(hours=1), 60)]
+        selected = select_events(IndexedEvents(events), NOW, UTC, None)
+        assert [v.event.uid for v in selected] == ["b", "a", "c", "d"]
+        assert [v.ongoing for v in selected] == [True, True, False, False]
+
+    def test_ongoing_beyond_limit_are_cut(self):
+        events = [_event("o{0}".format(i), NOW - datetime.timedelta(minutes=i + 1), 120) for i in range(4)]
+        events.append(_event("later", NOW + datetime.timedelta(hours=1), 30))
+        selected = select_events(IndexedEvents(events), NOW, UTC, 2)
+        assert [v.event.uid for v in selected] == ["o3", "o2"]
+
+    def test_ending_now_is_ended(self):
+        events = [_event("ends", NOW - datetime.timedelta(hours=1), 60), _event("starts", NOW, 60)]
+        selected = select_events(IndexedEvents(events), NOW, UTC, None)
+        assert [(v.event.uid, v.ongoing) for v in selected] == [("starts", True)]
+
+    def test_index_built_once_per_zone(self, monkeypatch):
+        calls = []
+        local_span = service._local_span
+
+        def span(e, tz):
+            calls.append(tz)
+            return local_span(e, tz)
+
+        monkeypatch.setattr(service, "_local_span", span)
+        indexed = IndexedEvents(_random_events(50, 1))
+        for _ in range(3):
+            select_events(indexed, NOW, UTC, 5)
+            select_events(indexed, NOW.astimezone(BERLIN), BERLIN, 5)
+        assert len(calls) == 100
+
+    def test_plain_lists_are_scanned(self):
+        events = _random_events(20, 2)
+        assert _keys(select_events(events, NOW, UTC, 5)) == _keys(select_events(IndexedEvents(events), NOW, UTC, 5))
+
+
+# ---------------------------------------------------------------------------
+# OccurrenceIndex
+# ---------------------------------------------------------------------------
+
+class TestOccurrenceIndex:
+    def _index(self, spans):
+        return OccurrenceIndex((NOW + datetime.timedelta(minutes=s), NOW + datetime.timedelta(minutes=e), ParsedEvent(uid=str(i)))
+                               for i, (s, e) in enumerate(spans))
+
+    def test_ongoing_finds_long_and_short_events(self):
+        index = self._index([(-60 * 24 * 300, 60 * 24 * 300), (-10, 10), (-30, -5), (5, 10), (-1, 1)])
+        now = NOW.timestamp()
+        assert [index._rows[i][4].uid for i in index.ongoing(now)] == ["0", "1", "4"]
+
+    def test_following_skips_ended_and_ongoing(self):
+        index = self._index([(-30, -5), (-10, 10), (5, 10), (20, 30), (40, 50)])
+        now = NOW.timestamp()
+        assert [index._rows[i][4].uid for i in index.following(now, 2)] == ["2", "3"]
+        assert [index._rows[i][4].uid for i in index.following(now, None, include_ended=True)] == ["0", "2", "3", "4"]
+
+    def test_empty(self):
+        index = OccurrenceIndex([])
+        assert len(index) == 0
+        assert index.select(NOW.timestamp(), 5) == []
+
+
+class TestParseFeedIndex:
+    def test_parsed_lists_are_indexed(self):
+        body = (
+            "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nBEGIN:VEVENT\r\nUID:a@test\r\n"
+            "DTSTART:20280615T110000Z\r\nDTEND:20280615T130000Z\r\nSUMMARY:A\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n"
+        ).encode("utf-8")
+        parsed = service.parse_feed(body, NOW - datetime.timedelta(days=14), NOW + datetime.timedelta(days=30))
+        assert isinstance(parsed, IndexedEvents)
+        selected = select_events(parsed, NOW, UTC, 5)
+        assert [(v.event.uid, v.ongoing) for v in selected] == [("a@test", True)]
@@ -0,0 +1,134 @@
+from unittest.mock import patch
+
+import pytest
+
+import metrics
+from metrics import Counter, Histogram, feed_id, render
+from tests.test_service import _future_ics, _response
+from service import fetch_raw_events, fetch_window, get_events, get_merged_events
+
+URL = "http://example.com/cal.ics?token=s3cret"
+
+
+# ---------------------------------------------------------------------------
+# Counter / Histogram
+# ---------------------------------------------------------------------------
+
+class TestCounter:
+    def test_renders_per_label_set(self):
+        c = Counter("x_total", "Things.", ("feed",))
+        c.inc(feed="a")
+        c.inc(2, feed="a")
+        c.inc(feed="b")
+        assert c.render() == ['# HELP x_total Things.', '# TYPE x_total counter',
+                              'x_total{feed="a"} 3', 'x_total{feed="b"} 1']
+
+    def test_label_values_escaped(self):
+        c = Counter("x_total", "Things.", ("feed",))
+        c.inc(feed='a"b\\')
+        assert c.render()[-1] == 'x_total{feed="a\\"b\\\\"} 1'
+
+    def test_wrong_labels_rejected(self):
+        with pytest.raises(ValueError):
+            Counter("x_total", "Things.", ("feed",)).inc(stage="a")
+
+    def test_disabled(self):
+        c = Counter("x_total", "Things.")
+        with patch("metrics.config.METRICS_ENABLED", False):
+            c.inc()
+        assert c.value() == 0
+
+
+class TestHistogram:
+    def test_cumulative_buckets(self):
+        h = Histogram("t_seconds", "Time.", ("stage",), buckets=(0.1, 1))
+        for v in (0.05, 0.5, 0.7, 3):
+            h.observe(v, stage="parse")
+        assert h.render()[2:] == [
+            't_seconds_bucket{stage="parse",le="0.1"} 1',
+            't_seconds_bucket{stage="parse",le="1"} 3',
+            't_seconds_bucket{stage="parse",le="+Inf"} 4',
+            't_seconds_sum{stage="parse"} 4.25',
+            't_seconds_count{stage="parse"} 4',
+        ]
+
+    def test_time(self):
+        h = Histogram("t_seconds", "Time.")
+        with h.time():
+            pass
+        assert h.count() == 1
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------------
+
+class TestInstrumentation:
+    def _fetch(self, body, status=200):
+        _, start, end = fetch_window(14, 3650)
+        with patch("service.http.request", return_value=_response(body, status)):
+            return fetch_raw_events(URL, start, end, None, None)
+
+    def test_feed_id_hides_url(self):
+        assert len(feed_id(URL)) == 12
+        assert feed_id(URL) != feed_id("http://example.com/other.ics")
+
+    def test_feed_labels_capped(self):
+        with patch("metrics.config.METRICS_MAX_FEEDS", 2):
+            first = feed_id("http://example.com/1.ics")
+            second = feed_id("http://example.com/2.ics")
+            assert feed_id("http://example.com/3.ics") == "other"
+            assert feed_id("http://example.com/1.ics") == first
+            assert feed_id("http://example.com/2.ics") == second
+
+    def test_download_recorded(self):
+        body = _future_ics("m@test", "Meeting", 1).encode()
+        self._fetch(body)
+        feed = feed_id(URL)
+        assert metrics.downloaded_bytes.value(feed=feed) == len(body)
+        assert metrics.upstream_responses.value(feed=feed, status=200) == 1
+        assert metrics.stage_seconds.count(stage="upstream", feed=feed) == 1
+        assert metrics.stage_seconds.count(stage="fetch", feed=feed) == 1
+
+    def test_parse_recorded(self):
+        self._fetch(_future_ics("m@test", "Meeting", 1).encode())
+        feed = feed_id(URL)
+        assert metrics.stage_seconds.count(stage="parse", feed=feed) == 1
+        assert metrics.parses.value(feed=feed, parser="icalevents") == 1
+        assert metrics.events_count.value(feed=feed, kind="parsed") == 1
+
+    def test_fallback_parser_counted(self):
+        body = b"BEGIN:VCALENDAR\nBEGIN:VEVENT\nUID:x\nSUMMARY:Broken\nDTSTART:20990101T090000Z\nEND:VEVENT\nEND:VCALENDAR\n"
+        with patch("service.ical_fetch", side_effect=ValueError("bad")):
+            self._fetch(body)
+        assert metrics.parses.value(feed=feed_id(URL), parser="fallback") == 1
+
+    def test_upstream_error_counted(self):
+        _, start, end = fetch_window(14, 3650)
+        with patch("service.http.request", side_effect=ConnectionError("down")):
+            with pytest.raises(ConnectionError):
+                fetch_raw_events(URL, start, end, None, None)
+        assert metrics.upstream_responses.value(feed=feed_id(URL), status="error") == 1
+
+    def test_returned_and_expanded_events(self):
+        with patch("service.http.request", return_value=_response(_future_ics("m@test", "Meeting", 1).encode())):
+            get_events(URL, 14, 3650, None, None, None, expand="lazy")
+        feed = feed_id(URL)
+        assert metrics.events_count.value(feed=feed, kind="expanded") == 1
+        assert metrics.events_count.value(feed=feed, kind="returned") == 1
+        assert metrics.stage_seconds.count(stage="select", feed=feed) == 1
+        assert metrics.stage_seconds.count(stage="enrich", feed=feed) == 1
+
+    def test_merged_enrich_stage(self):
+        with patch("service.http.request", return_value=_response(_future_ics("m@test", "Meeting", 1).encode())):
+            get_merged_events([{"url": URL}, {"url": URL + "?b"}], 14, 3650, None)
+        assert metrics.stage_seconds.count(stage="enrich", feed="merged") == 1
+
+
+class TestRender:
+    def test_contains_metrics_and_caches(self):
+        text = render({"feed": {"hits": 3, "misses": 1, "entries": 2}})
+        assert "# TYPE ical_stage_duration_seconds histogram" in text
+        assert 'ical_cache_hits_total{cache="feed"} 3' in text
+        assert 'ical_cache_entries{cache="feed"} 2' in text
+        assert text.endswith("\n")
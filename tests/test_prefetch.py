@@ -0,0 +1,102 @@
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+from prefetch import Prefetcher
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def _prefetcher(refresh, clock, **kwargs):
+    p = Prefetcher(refresh, interval=60, jitter=0, clock=clock, **kwargs)
+    # Drive run_pending by hand instead of from the background thread.
+    p._ensure_running = lambda: None
+    return p
+
+
+class TestPrefetcher:
+    def test_feed_not_refreshed_before_interval(self, clock):
+        refresh = MagicMock()
+        p = _prefetcher(refresh, clock)
+        p.track("http://example.com/cal.ics", 14, 3650, None, None)
+        clock.now += 30
+        p.run_pending()
+        refresh.assert_not_called()
+
+    def test_feed_refreshed_after_interval(self, clock):
+        refresh = MagicMock()
+        p = _prefetcher(refresh, clock)
+        p.track("http://example.com/cal.ics", 14, 3650, "user", "pass")
+        clock.now += 61
+        p.run_pending()
+        refresh.assert_called_once_with("http://example.com/cal.ics", 14, 3650, "user", "pass")
+
+    def test_repeated_tracking_is_one_feed(self, clock):
+        p = _prefetcher(MagicMock(), clock)
+        for _ in range(3):
+            p.track("http://example.com/cal.ics", 14, 3650, None, None)
+        assert p.tracked() == 1
+
+    def test_returns_delay_until_next_due(self, clock):
+        p = _prefetcher(MagicMock(), clock)
+        p.track("http://example.com/cal.ics", 14, 3650, None, None)
+        clock.now += 61
+        assert p.run_pending() == pytest.approx(60)
+
+    def test_failing_feed_backs_off(self, clock):
+        refresh = MagicMock(side_effect=Exception("upstream down"))
+        p = _prefetcher(refresh, clock, max_backoff=200)
+        p.track("http://example.com/cal.ics", 14, 3650, None, None)
+        clock.now += 61
+        assert p.run_pending() == pytest.approx(120)
+        clock.now += 120
+        assert p.run_pending() == pytest.approx(200)  # capped by max_backoff
+        assert refresh.call_count == 2
+
+    def test_backoff_reset_after_success(self, clock):
+        refresh = MagicMock(side_effect=[Exception("upstream down"), None])
+        p = _prefetcher(refresh, clock)
+        p.track("http://example.com/cal.ics", 14, 3650, None, None)
+        clock.now += 61
+        p.run_pending()
+        clock.now += 120
+        assert p.run_pending() == pytest.approx(60)
+
+    def test_idle_feed_evicted(self, clock):
+        refresh = MagicMock()
+        p = _prefetcher(refresh, clock, idle_timeout=300)
+        p.track("http://example.com/cal.ics", 14, 3650, None, None)
+        clock.now += 301
+        p.run_pending()
+        assert p.tracked() == 0
+        refresh.assert_not_called()
+
+    def test_jitter_stays_within_bounds(self, clock):
+        p = Prefetcher(MagicMock(), interval=100, jitter=0.1, clock=clock)
+        for _ in range(50):
+            assert 90 <= p._delay(100) <= 110
+
+    def test_background_thread_refreshes(self):
+        refresh = MagicMock()
+        p = Prefetcher(refresh, interval=0.01, jitter=0)
+        try:
+            p.track("http://example.com/cal.ics", 14, 3650, None, None)
+            for _ in range(100):
+                if refresh.called:
+                    break
+                time.sleep(0.01)
+        finally:
+            p.stop()
+        assert refresh.called
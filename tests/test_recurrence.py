@@ -0,0 +1,138 @@
+import datetime
+
+import pytest
+import pytz
+from icalevents.icalevents import events as ical_fetch
+
+from recurrence import build_index, expand
+from tests.test_service import _read_fixture
+
+UTC = pytz.utc
+
+STANDUP_ICS = """\
+BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+UID:standup@test
+SUMMARY:Standup
+DTSTART;TZID=Europe/Berlin:20280601T090000
+DTEND;TZID=Europe/Berlin:20280601T091500
+RRULE:FREQ=DAILY
+EXDATE;TZID=Europe/Berlin:20280603T090000
+END:VEVENT
+BEGIN:VEVENT
+UID:standup@test
+SUMMARY:Standup (moved)
+RECURRENCE-ID;TZID=Europe/Berlin:20280605T090000
+DTSTART;TZID=Europe/Berlin:20280605T110000
+DTEND;TZID=Europe/Berlin:20280605T111500
+END:VEVENT
+BEGIN:VEVENT
+UID:single@test
+SUMMARY:Offsite
+DTSTART:20280604T120000Z
+DTEND:20280604T130000Z
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+def _expand(text, now, limit, days=3650):
+    start = now - datetime.timedelta(days=1)
+    end = now + datetime.timedelta(days=days)
+    return expand(build_index(text), start, end, now, limit)
+
+
+class TestLazyExpansion:
+    NOW = datetime.datetime(2028, 6, 2, 8, 0, tzinfo=UTC)
+
+    def test_stops_after_limit_upcoming(self):
+        result = _expand(STANDUP_ICS, self.NOW, 3)
+        upcoming = [e for e in result if e["start"] > self.NOW]
+        assert len(upcoming) == 3
+
+    def test_occurrences_in_start_order(self):
+        result = _expand(STANDUP_ICS, self.NOW, 6)
+        starts = [e["start"] for e in result]
+        assert starts == sorted(starts)
+
+    def test_exdate_skipped(self):
+        result = _expand(STANDUP_ICS, self.NOW, 6)
+        assert datetime.datetime(2028, 6, 3, 7, 0, tzinfo=UTC) not in [e["start"] for e in result]
+
+    def test_override_replaces_occurrence(self):
+        result = _expand(STANDUP_ICS, self.NOW, 6)
+        on_fifth = [e for e in result if e["start"].date() == datetime.date(2028, 6, 5)]
+        assert [(e["summary"], e["start"].hour) for e in on_fifth] == [("Standup (moved)", 9)]
+        assert on_fifth[0]["recurrence_id"] is not None
+
+    def test_single_events_interleaved(self):
+        result = _expand(STANDUP_ICS, self.NOW, 3)
+        assert [e["summary"] for e in result if e["start"] > self.NOW] == ["Standup", "Offsite", "Standup (moved)"]
+
+    def test_ongoing_occurrence_included(self):
+        now = datetime.datetime(2028, 6, 2, 7, 5, tzinfo=UTC)
+        result = _expand(STANDUP_ICS, now, 1)
+        assert result[-2]["start"] <= now < result[-2]["end"]
+
+    def test_dst_keeps_wall_clock_time(self):
+        now = datetime.datetime(2028, 10, 27, 0, 0, tzinfo=UTC)
+        result = _expand(STANDUP_ICS, now, 3)
+        berlin = pytz.timezone("Europe/Berlin")
+        assert {e["start"].astimezone(berlin).hour for e in result} == {9}
+        assert {e["start"].hour for e in result} == {7, 8}
+
+    def test_until_as_plain_date(self):
+        text = STANDUP_ICS.replace("RRULE:FREQ=DAILY", "RRULE:FREQ=DAILY;UNTIL=20280610")
+        result = _expand(text, self.NOW, None)
+        assert max(e["start"] for e in result if e["summary"] == "Standup").date() == datetime.date(2028, 6, 10)
+
+    def test_until_date_ends_the_day_in_the_start_zone(self):
+        text = STANDUP_ICS.replace("Europe/Berlin", "Asia/Tokyo").replace("T09", "T08").replace(
+            "RRULE:FREQ=DAILY", "RRULE:FREQ=DAILY;UNTIL=20281103")
+        now = datetime.datetime(2028, 11, 1, 0, 0, tzinfo=UTC)
+        tokyo = pytz.timezone("Asia/Tokyo")
+        days = [e["start"].astimezone(tokyo).date() for e in _expand(text, now, None) if e["summary"] == "Standup"]
+        assert max(days) == datetime.date(2028, 11, 3)
+
+    def test_floating_until_in_the_start_zone(self):
+        text = STANDUP_ICS.replace("Europe/Berlin", "America/New_York").replace(
+            "RRULE:FREQ=DAILY", "RRULE:FREQ=DAILY;UNTIL=20281025T090000")
+        now = datetime.datetime(2028, 10, 20, 0, 0, tzinfo=UTC)
+        new_york = pytz.timezone("America/New_York")
+        days = [e["start"].astimezone(new_york).date() for e in _expand(text, now, None) if e["summary"] == "Standup"]
+        assert max(days) == datetime.date(2028, 10, 25)
+
+    def test_work_bounded_by_limit(self):
+        # An unbounded daily rule over a ten year horizon would be ~3650
+        # occurrences; only the requested few are generated.
+        result = _expand(STANDUP_ICS, self.NOW, 2)
+        assert len(result) <= 4
+
+    def test_all_day_event_as_utc_midnight(self):
+        text = """\
+BEGIN:VCALENDAR
+BEGIN:VEVENT
+UID:bday@test
+SUMMARY:Birthday
+DTSTART;VALUE=DATE:20280616
+RRULE:FREQ=YEARLY
+END:VEVENT
+END:VCALENDAR
+"""
+        result = _expand(text, self.NOW, 2)
+        assert [e["start"] for e in result] == [
+            datetime.datetime(2028, 6, 16, tzinfo=UTC),
+            datetime.datetime(2029, 6, 16, tzinfo=UTC),
+        ]
+        assert all(e["all_day"] for e in result)
+        assert result[0]["end"] - result[0]["start"] == datetime.timedelta(days=1)
+
+    @pytest.mark.parametrize("fixture", ["TestfileSimple.ics"])
+    def test_same_instants_as_icalevents(self, fixture):
+        text = _read_fixture(fixture)
+        start = datetime.datetime(2020, 1, 1, tzinfo=UTC)
+        end = datetime.datetime(2030, 1, 1, tzinfo=UTC)
+        lazy = sorted((e["start"], e["end"]) for e in expand(build_index(text), start, end, start, None))
+        full = sorted((e.start, e.end) for e in ical_fetch(string_content=text, start=start, end=end, strict=False))
+        assert lazy == full
@@ -0,0 +1,134 @@
+import datetime
+import json
+from unittest.mock import patch
+
+import pytest
+import pytz
+
+import responses
+from responses import CachedResponse, bucket, dumps, query_key
+from service import FeedSpec
+
+
+def _query(**overrides):
+    query = {
+        "feeds": [FeedSpec(url="http://example.com/cal.ics", username=None, password=None)],
+        "limit": 5,
+        "lookback_days": 14,
+        "horizon_days": 3650,
+        "expand": "full",
+        "tz": None,
+        "fields": None,
+        "relative": True,
+    }
+    query.update(overrides)
+    return query
+
+
+# ---------------------------------------------------------------------------
+# dumps
+# ---------------------------------------------------------------------------
+
+class TestDumps:
+    PAYLOAD = {"events": [{"name": "Standup", "secondsUntilStart": 3600.0, "ongoing": False, "url": None}],
+               "b": 1, "a": [1, 2]}
+
+    def test_compact_sorted_json(self):
+        assert dumps(self.PAYLOAD) == json.dumps(self.PAYLOAD, sort_keys=True, separators=(",", ":")).encode()
+
+    def test_stdlib_encoder_gives_same_bytes(self):
+        with patch("responses.config.JSON_ENCODER", "json"):
+            stdlib = dumps(self.PAYLOAD)
+        assert stdlib == dumps(self.PAYLOAD)
+
+    def test_datetimes_rendered_like_flask(self):
+        value = {"recurrence_id": datetime.datetime(2025, 1, 6, 9, 0, tzinfo=pytz.utc)}
+        expected = b'{"recurrence_id":"Mon, 06 Jan 2025 09:00:00 GMT"}'
+        assert dumps(value) == expected
+        with patch("responses.config.JSON_ENCODER", "json"):
+            assert dumps(value) == expected
+
+    def test_falls_back_for_values_orjson_rejects(self):
+        assert json.loads(dumps({"big": 2 ** 70})) == {"big": 2 ** 70}
+
+
+# ---------------------------------------------------------------------------
+# CachedResponse
+# ---------------------------------------------------------------------------
+
+class TestCachedResponse:
+    def test_etag_depends_on_body(self):
+        assert CachedResponse(b"a", 0, False).etag == CachedResponse(b"a", 10, True).etag
+        assert CachedResponse(b"a", 0, False).etag != CachedResponse(b"b", 0, False).etag
+
+    def test_max_age_runs_to_expiry(self):
+        headers = dict(CachedResponse(b"a", 1060, False).headers(now=1015))
+        assert headers["Cache-Control"] == "public, max-age=45"
+
+    def test_private_when_credentials_used(self):
+        assert dict(CachedResponse(b"a", 1060, True).headers(now=1000))["Cache-Control"] == "private, max-age=60"
+
+    def test_expired_response_must_revalidate(self):
+        assert dict(CachedResponse(b"a", 1000, False).headers(now=1000))["Cache-Control"] == "no-cache"
+
+    @pytest.mark.parametrize("header", ['"x", {etag}', "W/{etag}", "*"])
+    def test_matches(self, header):
+        cached = CachedResponse(b"a", 0, False)
+        assert cached.matches(header.format(etag=cached.etag))
+
+    def test_does_not_match_other_tags(self):
+        assert not CachedResponse(b"a", 0, False).matches('"other"')
+        assert not CachedResponse(b"a", 0, False).matches(None)
+
+
+# ---------------------------------------------------------------------------
+# bucket
+# ---------------------------------------------------------------------------
+
+class TestBucket:
+    def test_reference_time_is_bucket_start(self):
+        key, now, expires = bucket(_query(), clock=lambda: 1000000030.5)
+        assert now == datetime.datetime.fromtimestamp(1000000020, pytz.utc)
+        assert expires == 1000000080
+        assert key == (query_key(_query()), 1000000020)
+
+    def test_same_key_within_bucket(self):
+        assert bucket(_query(), clock=lambda: 1000000021)[0] == bucket(_query(), clock=lambda: 1000000079)[0]
+        assert bucket(_query(), clock=lambda: 1000000079)[0] != bucket(_query(), clock=lambda: 1000000080)[0]
+
+    def test_disabled_uses_current_time(self):
+        with patch("responses.config.RESPONSE_CACHE_BUCKET", 0):
+            key, now, _ = bucket(_query(), clock=lambda: 1000000030.5)
+        assert key is None
+        assert now.timestamp() == 1000000030.5
+
+    def test_key_depends_on_parameters(self):
+        assert query_key(_query()) != query_key(_query(fields=("name",)))
+        assert query_key(_query()) != query_key(_query(tz="Europe/Berlin"))
+
+    def test_key_does_not_contain_password(self):
+        feeds = [FeedSpec(url="http://example.com/cal.ics", username="u", password="secret")]
+        assert "secret" not in repr(query_key(_query(feeds=feeds)))
+
+    def test_store_skips_cache_without_key(self):
+        responses.store(None, _query(), {"events": []}, 0)
+        assert len(responses.response_cache) == 0
+
+    def test_absolute_mode_not_bucketed(self):
+        with patch("responses.config.FEED_CACHE_TTL", 300):
+            early = bucket(_query(relative=False), clock=lambda: 1000000021)
+            late = bucket(_query(relative=False), clock=lambda: 1000000099)
+        assert early[0] == late[0]
+        assert early[1].timestamp() == 1000000021
+        assert early[2] == 1000000321
+
+    def test_store_expires_at_valid_until(self):
+        payload = {"events": [], "validUntil": "2001-09-09T01:47:00+00:00"}
+        cached = responses.store("k", _query(relative=False), payload, 1000000321)
+        assert cached.expires == 1000000020
+
+    def test_lookup_drops_expired_entries(self):
+        responses.store("k", _query(), {"events": []}, 1000000080)
+        assert responses.lookup("k", clock=lambda: 1000000079) is not None
+        assert responses.lookup("k", clock=lambda: 1000000080) is None
+        assert len(responses.response_cache) == 0
@@ -1,5 +1,7 @@
 import datetime
 import os
+import threading
+import time
 import pytest
 import pytz
 from unittest.mock import patch, MagicMock
@@ -10,10 +12,22 @@ from service import (
     _fallback_parse,
     enrich_and_filter,
     sort_and_limit,
+    select_events,
     fetch_raw_events,
+    fetch_lazy_events,
+    fetch_feed_body,
+    parse_feed,
     get_events,
+    get_merged_events,
+    absolute_payload,
+    iter_text_lines,
+    FeedSpec,
+    FeedTooLarge,
+    EventView,
     ParsedEvent,
 )
+import metrics
+import service
 
 FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
 
@@ -23,6 +37,29 @@ def _read_fixture(name: str) -> str:
         return f.read()
 
 
+def _stream_body(mock_resp, body: bytes, chunk_size: int = 7):
+    """Serve ``body`` through ``resp.stream()`` in small chunks, the way
+    fetch_feed_body reads it with ``preload_content=False``."""
+    def stream(*args, **kwargs):
+        return iter([body[i:i + chunk_size] for i in range(0, len(body), chunk_size)])
+    mock_resp.stream.side_effect = stream
+
+
+def _response(body, status: int = 200, headers=None, chunk_size: int = 7):
+    """A mocked upstream response with ``status`` and ``headers``, streaming
+    ``body`` (text or bytes)."""
+    mock_resp = MagicMock()
+    mock_resp.status = status
+    mock_resp.headers = dict(headers or {})
+    _stream_body(mock_resp, body.encode("utf-8") if isinstance(body, str) else body, chunk_size)
+    return mock_resp
+
+
+def _instants(events):
+    """What a parse must agree on, whichever path produced ``events``."""
+    return sorted((e["uid"], e["start"].timestamp(), e["end"].timestamp(), e["summary"]) for e in events)
+
+
 # ---------------------------------------------------------------------------
 # clamp_int
 # ---------------------------------------------------------------------------
@@ -171,6 +208,94 @@ class TestFallbackParse:
     def test_empty_string_returns_empty(self):
         assert _fallback_parse("") == []
 
+    def test_folded_lines_are_unfolded(self):
+        text = (
+            "BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nUID:folded@test\r\n"
+            "SUMMARY:A very long\r\n  summary that was\r\n\tfolded\r\n"
+            "DTSTART;TZID=Europe/\r\n Berlin:20280615T100000\r\n"
+            "END:VEVENT\r\nEND:VCALENDAR\r\n"
+        )
+        events = _fallback_parse(text)
+        assert events[0]["summary"] == "A very long summary that wasfolded"
+        assert events[0]["start"].utcoffset() == datetime.timedelta(hours=2)
+
+    def test_text_values_unescaped(self):
+        text = MINIMAL_ICS.replace("SUMMARY:Minimal Event", "SUMMARY:Lunch\\, then walk\\nback\\\\home")
+        assert _fallback_parse(text)[0]["summary"] == "Lunch, then walk\nback\\home"
+
+    def test_quoted_parameter_with_colon(self):
+        text = MINIMAL_ICS.replace(
+            "SUMMARY:Minimal Event",
+            'LOCATION;ALTREP="http://example.com/room:1":Room 1\nSUMMARY:Minimal Event',
+        )
+        assert _fallback_parse(text)[0]["location"] == "Room 1"
+
+    def test_nested_valarm_properties_ignored(self):
+        text = MINIMAL_ICS.replace(
+            "UID:minimal@test",
+            "BEGIN:VALARM\nACTION:DISPLAY\nDESCRIPTION:Reminder\nEND:VALARM\nUID:minimal@test\nDESCRIPTION:Real",
+        )
+        events = _fallback_parse(text)
+        assert len(events) == 1
+        assert events[0]["description"] == "Real"
+
+    def test_value_date_parameter_marks_all_day(self):
+        events = _fallback_parse(ALL_DAY_ICS)
+        assert events[0]["start"] == datetime.datetime(2028, 6, 16, tzinfo=UTC)
+        assert events[0]["end"] == datetime.datetime(2028, 6, 17, tzinfo=UTC)
+
+    def test_utc_offset_datetime(self):
+        text = MINIMAL_ICS.replace("DTSTART:20280615T100000Z", "DTSTART:20280615T140000+0200")
+        assert _fallback_parse(text)[0]["start"] == datetime.datetime(2028, 6, 15, 12, 0, tzinfo=UTC)
+
+    def test_windows_tzid(self):
+        text = TZID_ICS.replace("Europe/Berlin", "W. Europe Standard Time")
+        assert _fallback_parse(text)[0]["start"] == datetime.datetime(2028, 6, 15, 8, 0, tzinfo=UTC)
+
+    def test_custom_tzid_uses_feed_vtimezone(self):
+        vtimezone = (
+            "BEGIN:VTIMEZONE\nTZID:Office\n"
+            "BEGIN:STANDARD\nDTSTART:19700101T000000\nTZOFFSETFROM:-0300\nTZOFFSETTO:-0300\nEND:STANDARD\n"
+            "END:VTIMEZONE\n"
+        )
+        text = TZID_ICS.replace("BEGIN:VEVENT", vtimezone + "BEGIN:VEVENT").replace("Europe/Berlin", "Office")
+        events = _fallback_parse(text)
+        assert len(events) == 1
+        assert events[0]["start"] == datetime.datetime(2028, 6, 15, 13, 0, tzinfo=UTC)
+
+    def test_vtimezone_after_the_events(self):
+        vtimezone = (
+            "BEGIN:VTIMEZONE\nTZID:Field Office\n"
+            "BEGIN:STANDARD\nDTSTART:19700101T000000\nTZOFFSETFROM:-0500\nTZOFFSETTO:-0500\nEND:STANDARD\n"
+            "END:VTIMEZONE\n"
+        )
+        text = TZID_ICS.replace("END:VCALENDAR", vtimezone + "END:VCALENDAR").replace("Europe/Berlin", "Field Office")
+        text = text.replace("T100000", "T040000").replace("T110000", "T050000")
+        events = _fallback_parse(text)
+        assert len(events) == 1
+        assert events[0]["start"] == datetime.datetime(2028, 6, 15, 9, 0, tzinfo=UTC)
+
+    def test_dtend_uses_its_own_tzid(self):
+        text = TZID_ICS.replace("DTEND;TZID=Europe/Berlin:20280615T110000", "DTEND;TZID=Europe/London:20280615T110000")
+        event = _fallback_parse(text)[0]
+        assert event["start"] == datetime.datetime(2028, 6, 15, 8, 0, tzinfo=UTC)
+        assert event["end"] == datetime.datetime(2028, 6, 15, 10, 0, tzinfo=UTC)
+
+    def test_dtend_without_tzid_in_the_start_zone(self):
+        text = TZID_ICS.replace("DTEND;TZID=Europe/Berlin:", "DTEND:")
+        assert _fallback_parse(text)[0]["end"] == datetime.datetime(2028, 6, 15, 9, 0, tzinfo=UTC)
+
+    def test_trailing_whitespace_after_end_vtimezone(self):
+        vtimezone = (
+            "BEGIN:VTIMEZONE\nTZID:Office\n"
+            "BEGIN:STANDARD\nDTSTART:19700101T000000\nTZOFFSETFROM:-0300\nTZOFFSETTO:-0300\nEND:STANDARD\n"
+            "END:VTIMEZONE \n"
+        )
+        text = TZID_ICS.replace("BEGIN:VEVENT", vtimezone + "BEGIN:VEVENT").replace("Europe/Berlin", "Office")
+        events = _fallback_parse(text)
+        assert len(events) == 1
+        assert events[0]["start"] == datetime.datetime(2028, 6, 15, 13, 0, tzinfo=UTC)
+
 
 # ---------------------------------------------------------------------------
 # enrich_and_filter
@@ -300,9 +425,6 @@ class TestEnrichAndFilter:
         ev = _make_event("Clean", start, end)
         enriched = enrich_and_filter([ev], now, UTC)
         sort_and_limit(enriched, None)
-        for e in enriched:
-            e.pop("start_dt", None)
-            e.pop("end_dt", None)
         assert "start_dt" not in enriched[0]
         assert "end_dt" not in enriched[0]
 
@@ -312,18 +434,11 @@ class TestEnrichAndFilter:
 # ---------------------------------------------------------------------------
 
 class TestSortAndLimit:
-    def _make_enriched(self, name: str, start_offset_h: int, ongoing: bool) -> ParsedEvent:
+    def _make_enriched(self, name: str, start_offset_h: int, ongoing: bool) -> EventView:
         now = datetime.datetime(2028, 6, 15, 12, 0, 0, tzinfo=UTC)
         start = now + datetime.timedelta(hours=start_offset_h)
         end = start + datetime.timedelta(hours=1)
-        return ParsedEvent({
-            "name": name,
-            "ongoing": ongoing,
-            "start_dt": start,
-            "end_dt": end,
-            "start": start.isoformat(),
-            "end": end.isoformat(),
-        })
+        return EventView(_make_event(name, start, end), start, end, now, ongoing=ongoing)
 
     def test_ongoing_sorted_before_future(self):
         future = self._make_enriched("Future", 2, False)
@@ -352,6 +467,46 @@ class TestSortAndLimit:
         result = sort_and_limit(events, 0)
         assert len(result) == 0
 
+    def test_partial_selection_keeps_order(self):
+        events = [self._make_enriched(f"E{i}", i, False) for i in (5, 3, 9, 1, 7)]
+        events.append(self._make_enriched("Ongoing", -1, True))
+        result = sort_and_limit(events, 3)
+        assert [e["name"] for e in result] == ["Ongoing", "E1", "E3"]
+
+
+# ---------------------------------------------------------------------------
+# select_events (top-N without enriching discarded events)
+# ---------------------------------------------------------------------------
+
+class TestSelectEvents:
+    NOW = datetime.datetime(2028, 6, 15, 12, 0, 0, tzinfo=UTC)
+
+    def _events(self):
+        hour = datetime.timedelta(hours=1)
+        return [
+            _make_event("Later", self.NOW + 5 * hour, self.NOW + 6 * hour),
+            _make_event("Past", self.NOW - 5 * hour, self.NOW - 4 * hour),
+            _make_event("Soon", self.NOW + hour, self.NOW + 2 * hour),
+            _make_event("Ongoing", self.NOW - 3 * hour, self.NOW + hour),
+            _make_event("Soonish", self.NOW + 2 * hour, self.NOW + 3 * hour),
+        ]
+
+    @pytest.mark.parametrize("limit", [None, 0, 1, 2, 3, 10])
+    @pytest.mark.parametrize("include_ended", [False, True])
+    def test_matches_enrich_then_sort(self, limit, include_ended):
+        expected = sort_and_limit(enrich_and_filter(self._events(), self.NOW, UTC, include_ended=include_ended), limit)
+        result = select_events(self._events(), self.NOW, UTC, limit, include_ended=include_ended)
+        assert result == expected
+
+    def test_ongoing_first(self):
+        result = select_events(self._events(), self.NOW, UTC, 2)
+        assert [e["name"] for e in result] == ["Ongoing", "Soon"]
+
+    def test_only_survivors_are_enriched(self):
+        with patch("service._enrich", wraps=service._enrich) as mock_enrich:
+            select_events(self._events(), self.NOW, UTC, 2)
+        assert mock_enrich.call_count == 2
+
 
 # ---------------------------------------------------------------------------
 # Regression tests
@@ -470,8 +625,7 @@ class TestRegressions:
         the already-fetched text instead of issuing a second HTTP request."""
         now = datetime.datetime(2028, 1, 1, tzinfo=UTC)
         end = now + datetime.timedelta(days=365)
-        mock_resp = MagicMock()
-        mock_resp.data = MINIMAL_ICS.encode("utf-8")
+        mock_resp = _response(MINIMAL_ICS)
         with patch("service.http.request", return_value=mock_resp) as mock_req:
             with patch("service.ical_fetch", side_effect=Exception("parse error")):
                 fetch_raw_events("http://example.com/cal.ics", now, end, None, None)
@@ -484,8 +638,7 @@ class TestRegressions:
         be present in the outgoing HTTP request."""
         now = datetime.datetime(2028, 1, 1, tzinfo=UTC)
         end = now + datetime.timedelta(days=365)
-        mock_resp = MagicMock()
-        mock_resp.data = MINIMAL_ICS.encode("utf-8")
+        mock_resp = _response(MINIMAL_ICS)
         with patch("service.http.request", return_value=mock_resp) as mock_req:
             with patch("service.ical_fetch", return_value=[]):
                 fetch_raw_events("http://example.com/cal.ics", now, end, "alice", "secret")
@@ -504,8 +657,7 @@ class TestRegressions:
         a garbage 'Basic Tm9uZTpOb25l' header on every unauthenticated request."""
         now = datetime.datetime(2028, 1, 1, tzinfo=UTC)
         end = now + datetime.timedelta(days=365)
-        mock_resp = MagicMock()
-        mock_resp.data = MINIMAL_ICS.encode("utf-8")
+        mock_resp = _response(MINIMAL_ICS)
         with patch("service.http.request", return_value=mock_resp) as mock_req:
             with patch("service.ical_fetch", return_value=[]):
                 fetch_raw_events("http://example.com/cal.ics", now, end, username, password)
@@ -520,15 +672,10 @@ class TestRegressions:
 # ---------------------------------------------------------------------------
 
 class TestFetchRawEvents:
-    def _mock_response(self, text: str):
-        mock_resp = MagicMock()
-        mock_resp.data = text.encode("utf-8")
-        return mock_resp
-
     def test_returns_fallback_on_icalevents_failure(self):
         now = datetime.datetime(2028, 1, 1, tzinfo=UTC)
         end = now + datetime.timedelta(days=365)
-        with patch("service.http.request", return_value=self._mock_response(MINIMAL_ICS)):
+        with patch("service.http.request", return_value=_response(MINIMAL_ICS)):
             with patch("service.ical_fetch", side_effect=Exception("parse error")):
                 events = fetch_raw_events("http://example.com/cal.ics", now, end, None, None)
         assert any(e["source"] == "fallback" for e in events)
@@ -537,11 +684,567 @@ class TestFetchRawEvents:
         now = datetime.datetime(2028, 1, 1, tzinfo=UTC)
         end = now + datetime.timedelta(days=1000)
         text = _read_fixture("TestfileSimple.ics")
-        with patch("service.http.request", return_value=self._mock_response(text)):
+        with patch("service.http.request", return_value=_response(text)):
             events = fetch_raw_events("http://example.com/cal.ics", now, end, None, None)
         assert len(events) > 0
 
 
+# ---------------------------------------------------------------------------
+# fetch_feed_body (conditional GET cache)
+# ---------------------------------------------------------------------------
+
+class TestFeedCache:
+    URL = "http://example.com/cal.ics"
+
+    def test_fresh_entry_served_without_request(self):
+        with patch("service.http.request", return_value=_response(MINIMAL_ICS, headers={"ETag": '"v1"'})) as mock_req:
+            first = fetch_feed_body(self.URL, None, None)
+            second = fetch_feed_body(self.URL, None, None)
+        assert first == second
+        assert mock_req.call_count == 1
+
+    def test_expired_entry_revalidated_with_validators(self):
+        responses = [
+            _response(MINIMAL_ICS, headers={"ETag": '"v1"', "Last-Modified": "Wed, 14 Jun 2028 10:00:00 GMT"}),
+            _response(b"", status=304),
+        ]
+        with patch.object(service.config, "FEED_CACHE_TTL", 0):
+            with patch("service.http.request", side_effect=responses) as mock_req:
+                first = fetch_feed_body(self.URL, None, None)
+                second = fetch_feed_body(self.URL, None, None)
+        assert second == first
+        _, kwargs = mock_req.call_args
+        assert kwargs["headers"]["If-None-Match"] == '"v1"'
+        assert kwargs["headers"]["If-Modified-Since"] == "Wed, 14 Jun 2028 10:00:00 GMT"
+
+    def test_changed_feed_replaces_cached_body(self):
+        responses = [
+            _response(MINIMAL_ICS, headers={"ETag": '"v1"'}),
+            _response(TZID_ICS, headers={"ETag": '"v2"'}),
+        ]
+        with patch.object(service.config, "FEED_CACHE_TTL", 0):
+            with patch("service.http.request", side_effect=responses):
+                fetch_feed_body(self.URL, None, None)
+                second = fetch_feed_body(self.URL, None, None)
+        assert second == TZID_ICS.encode("utf-8")
+
+    def test_error_responses_raise_and_are_not_cached(self):
+        error = _response(b"", status=500)
+        with patch("service.http.request", return_value=error) as mock_req:
+            with pytest.raises(service.UpstreamError):
+                fetch_feed_body(self.URL, None, None)
+            with pytest.raises(service.UpstreamError):
+                fetch_feed_body(self.URL, None, None)
+        assert mock_req.call_count == 2
+        assert (self.URL, "") not in service.feed_cache
+
+    @pytest.mark.parametrize("status", [401, 503])
+    def test_error_response_serves_cached_body(self, status):
+        responses = [_response(MINIMAL_ICS, headers={"ETag": '"v1"'}), _response(b"", status=status)]
+        with patch.object(service.config, "FEED_CACHE_TTL", 0):
+            with patch("service.http.request", side_effect=responses):
+                first = fetch_feed_body(self.URL, None, None)
+                assert fetch_feed_body(self.URL, None, None) == first
+        assert service.feed_cache.get((self.URL, "")).body == first
+
+    def test_not_modified_without_cached_body_raises(self):
+        with patch("service.http.request", return_value=_response(b"", status=304)):
+            with pytest.raises(service.UpstreamError):
+                fetch_feed_body(self.URL, None, None)
+
+    def test_credentials_are_part_of_cache_key(self):
+        with patch("service.http.request", return_value=_response(MINIMAL_ICS)) as mock_req:
+            fetch_feed_body(self.URL, "alice", "secret")
+            fetch_feed_body(self.URL, "bob", "secret")
+            fetch_feed_body(self.URL, None, None)
+        assert mock_req.call_count == 3
+
+    def test_stale_body_served_while_revalidation_running(self):
+        with patch("service.http.request", return_value=_response(MINIMAL_ICS, headers={"ETag": '"v1"'})):
+            first = fetch_feed_body(self.URL, None, None)
+        key = (self.URL, "")
+        with patch.object(service.config, "FEED_CACHE_TTL", 0):
+            with patch.object(service.downloads, "in_flight", return_value=True):
+                with patch("service.http.request") as mock_req:
+                    assert fetch_feed_body(self.URL, None, None) == first
+        mock_req.assert_not_called()
+        assert key in service.feed_cache
+
+    def test_revalidate_bypasses_fresh_entry(self):
+        responses = [_response(MINIMAL_ICS, headers={"ETag": '"v1"'}), _response(b"", status=304)]
+        with patch("service.http.request", side_effect=responses) as mock_req:
+            fetch_feed_body(self.URL, None, None)
+            fetch_feed_body(self.URL, None, None, revalidate=True)
+        assert mock_req.call_count == 2
+        _, kwargs = mock_req.call_args
+        assert kwargs["headers"]["If-None-Match"] == '"v1"'
+
+    def test_cache_key_does_not_contain_password(self):
+        with patch("service.http.request", return_value=_response(MINIMAL_ICS)):
+            fetch_feed_body(self.URL, "alice", "hunter2")
+        assert not any("hunter2" in str(key) for key in service.feed_cache._data)
+
+
+# ---------------------------------------------------------------------------
+# Streaming download and incremental decoding
+# ---------------------------------------------------------------------------
+
+class TestStreamingBody:
+    URL = "http://example.com/cal.ics"
+
+    def test_body_read_as_stream(self):
+        resp = _response(MINIMAL_ICS, chunk_size=16)
+        with patch("service.http.request", return_value=resp) as mock_req:
+            assert fetch_feed_body(self.URL, None, None) == MINIMAL_ICS.encode("utf-8")
+        assert mock_req.call_args.kwargs["preload_content"] is False
+        resp.release_conn.assert_called_once()
+
+    def test_oversized_stream_aborted(self):
+        resp = _response(b"x" * 100, chunk_size=16)
+        with patch.object(service.config, "MAX_FEED_BYTES", 40):
+            with patch("service.http.request", return_value=resp):
+                with pytest.raises(FeedTooLarge):
+                    fetch_feed_body(self.URL, None, None)
+        resp.release_conn.assert_called_once()
+        assert len(service.feed_cache) == 0
+
+    def test_oversized_content_length_rejected_before_reading(self):
+        resp = _response(b"x" * 100, headers={"Content-Length": "100"}, chunk_size=16)
+        with patch.object(service.config, "MAX_FEED_BYTES", 40):
+            with patch("service.http.request", return_value=resp):
+                with pytest.raises(FeedTooLarge):
+                    fetch_feed_body(self.URL, None, None)
+        resp.stream.assert_not_called()
+
+    def test_gzip_body_decoded_and_compression_requested(self):
+        import gzip
+        import io
+        from urllib3 import HTTPResponse
+        body = MINIMAL_ICS.encode("utf-8")
+        resp = HTTPResponse(body=io.BytesIO(gzip.compress(body)), headers={"Content-Encoding": "gzip"},
+                            status=200, preload_content=False)
+        with patch("service.http.request", return_value=resp) as mock_req:
+            assert fetch_feed_body(self.URL, None, None) == body
+        assert "gzip" in mock_req.call_args.kwargs["headers"]["Accept-Encoding"]
+
+    def test_lines_decoded_across_chunk_boundaries(self):
+        body = "SUMMARY:Grüße aus Köln\r\nLOCATION:東京\r\nEND".encode("utf-8")
+        chunks = [body[i:i + 3] for i in range(0, len(body), 3)]
+        assert list(iter_text_lines(chunks)) == ["SUMMARY:Grüße aus Köln\r", "LOCATION:東京\r", "END"]
+
+    def test_large_bodies_use_streaming_parser(self):
+        body = MINIMAL_ICS.encode("utf-8")
+        start = datetime.datetime(2028, 1, 1, tzinfo=UTC)
+        with patch.object(service.config, "STREAM_PARSE_BYTES", 10):
+            with patch("service.ical_fetch") as mock_fetch:
+                events = parse_feed(body, start, start + datetime.timedelta(days=365))
+        mock_fetch.assert_not_called()
+        assert [e["source"] for e in events] == ["fallback"]
+
+
+# ---------------------------------------------------------------------------
+# parse_feed (parsed event cache)
+# ---------------------------------------------------------------------------
+
+class TestParseCache:
+    START = datetime.datetime(2028, 1, 1, 9, 17, tzinfo=UTC)
+    END = datetime.datetime(2029, 1, 1, 9, 17, tzinfo=UTC)
+
+    def test_identical_body_parsed_once(self):
+        body = MINIMAL_ICS.encode("utf-8")
+        with patch("service.ical_fetch", wraps=service.ical_fetch) as mock_fetch:
+            first = parse_feed(body, self.START, self.END)
+            second = parse_feed(body, self.START, self.END)
+        assert mock_fetch.call_count == 1
+        assert second is first
+        assert service.parse_cache.stats()["hits"] == 1
+        assert service.parse_cache.stats()["misses"] == 1
+
+    def test_nearby_windows_share_entry(self):
+        body = MINIMAL_ICS.encode("utf-8")
+        later = datetime.timedelta(minutes=20)
+        with patch("service.ical_fetch", wraps=service.ical_fetch) as mock_fetch:
+            parse_feed(body, self.START, self.END)
+            parse_feed(body, self.START + later, self.END + later)
+        assert mock_fetch.call_count == 1
+
+    def test_window_widened_to_bucket_boundaries(self):
+        body = MINIMAL_ICS.encode("utf-8")
+        with patch("service.ical_fetch", return_value=[]) as mock_fetch:
+            parse_feed(body, self.START, self.END)
+        _, kwargs = mock_fetch.call_args
+        assert kwargs["start"] == datetime.datetime(2028, 1, 1, 9, 0, tzinfo=UTC)
+        assert kwargs["end"] == datetime.datetime(2029, 1, 1, 10, 0, tzinfo=UTC)
+
+    def test_changed_body_is_reparsed(self):
+        with patch("service.ical_fetch", wraps=service.ical_fetch) as mock_fetch:
+            parse_feed(MINIMAL_ICS.encode("utf-8"), self.START, self.END)
+            parse_feed(TZID_ICS.encode("utf-8"), self.START, self.END)
+        assert mock_fetch.call_count == 2
+
+    def test_fallback_results_cached_too(self):
+        body = MINIMAL_ICS.encode("utf-8")
+        with patch("service.ical_fetch", side_effect=Exception("parse error")) as mock_fetch:
+            first = parse_feed(body, self.START, self.END)
+            parse_feed(body, self.START, self.END)
+        assert mock_fetch.call_count == 1
+        assert first[0]["source"] == "fallback"
+
+
+class TestIncrementalParse:
+    START = datetime.datetime(2028, 1, 1, tzinfo=UTC)
+    END = datetime.datetime(2029, 1, 1, tzinfo=UTC)
+    URL = "http://example.com/big.ics"
+
+    @pytest.fixture(autouse=True)
+    def incremental_enabled(self):
+        with patch("service.config.INCREMENTAL_PARSE_BYTES", 1):
+            yield
+
+    def _feed(self, events=20, summary=None):
+        blocks = []
+        for i in range(events):
+            title = summary if summary and i == 3 else "Event {0}".format(i)
+            blocks.append(
+                "BEGIN:VEVENT\r\nUID:event-{0}@test\r\nDTSTAMP:2028010{1}T000000Z\r\n"
+                "DTSTART:202806{2:02d}T090000Z\r\nDTEND:202806{2:02d}T100000Z\r\n"
+                "SUMMARY:{3}\r\nEND:VEVENT\r\n".format(i, 1 if summary is None else 2, i % 28 + 1, title))
+        series = (
+            "BEGIN:VEVENT\r\nUID:series@test\r\nDTSTART:20280601T080000Z\r\nDTEND:20280601T081500Z\r\n"
+            "RRULE:FREQ=DAILY;COUNT=10\r\nSUMMARY:Standup\r\nEND:VEVENT\r\n"
+            "BEGIN:VEVENT\r\nUID:series@test\r\nRECURRENCE-ID:20280603T080000Z\r\n"
+            "DTSTART:20280603T100000Z\r\nDTEND:20280603T101500Z\r\nSUMMARY:Standup (moved)\r\nEND:VEVENT\r\n")
+        return ("BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" + "".join(blocks) + series + "END:VCALENDAR\r\n").encode("utf-8")
+
+    def test_matches_full_parse(self):
+        body = self._feed()
+        assert _instants(parse_feed(body, self.START, self.END, self.URL)) == \
+            _instants(service._parse_ics(body, self.START, self.END))
+
+    def test_only_changed_event_reparsed(self):
+        parse_feed(self._feed(), self.START, self.END, self.URL)
+        edited = self._feed(summary="Renamed")
+        with patch("service.ical_fetch", wraps=service.ical_fetch) as mock_fetch:
+            events = parse_feed(edited, self.START, self.END, self.URL)
+        content = mock_fetch.call_args[1]["string_content"]
+        assert content.count("BEGIN:VEVENT") == 1
+        assert "UID:event-3@test" in content
+        assert _instants(events) == _instants(service._parse_ics(edited, self.START, self.END))
+        feed = metrics.feed_id(self.URL)
+        assert metrics.parsed_groups.value(feed=feed, kind="parsed") == 22
+        assert metrics.parsed_groups.value(feed=feed, kind="reused") == 20
+
+    def test_edited_override_reparses_its_series(self):
+        body = self._feed()
+        parse_feed(body, self.START, self.END, self.URL)
+        edited = body.replace(b"Standup (moved)", b"Standup (moved again)")
+        with patch("service.ical_fetch", wraps=service.ical_fetch) as mock_fetch:
+            events = parse_feed(edited, self.START, self.END, self.URL)
+        content = mock_fetch.call_args[1]["string_content"]
+        assert content.count("UID:series@test") == 2
+        assert "UID:event-" not in content
+        moved = [e for e in events if e["summary"] == "Standup (moved again)"]
+        assert len(moved) == 1
+        assert len([e for e in events if e["uid"] == "series@test"]) == 10
+
+    def test_dtstamp_only_changes_need_no_parse(self):
+        parse_feed(self._feed(), self.START, self.END, self.URL)
+        restamped = self._feed().replace(b"DTSTAMP:20280101", b"DTSTAMP:20280105")
+        with patch("service.ical_fetch", wraps=service.ical_fetch) as mock_fetch:
+            events = parse_feed(restamped, self.START, self.END, self.URL)
+        mock_fetch.assert_not_called()
+        assert len(events) == 30
+
+    def test_other_window_parses_everything(self):
+        parse_feed(self._feed(), self.START, self.END, self.URL)
+        later = datetime.timedelta(days=1)
+        with patch("service.ical_fetch", wraps=service.ical_fetch) as mock_fetch:
+            parse_feed(self._feed(summary="Renamed"), self.START + later, self.END + later, self.URL)
+        assert mock_fetch.call_args[1]["string_content"].count("BEGIN:VEVENT") == 22
+
+    def test_small_feeds_parsed_whole(self):
+        with patch("service.config.INCREMENTAL_PARSE_BYTES", 1024 * 1024), \
+                patch("service.incremental.split") as mock_split:
+            parse_feed(self._feed(), self.START, self.END, self.URL)
+        mock_split.assert_not_called()
+
+    def test_failed_delta_parse_reparses_everything(self):
+        parse_feed(self._feed(), self.START, self.END, self.URL)
+        with patch("service.ical_fetch", side_effect=Exception("parse error")) as mock_fetch:
+            events = parse_feed(self._feed(summary="Renamed"), self.START, self.END, self.URL)
+        assert mock_fetch.call_args[1]["string_content"].count("BEGIN:VEVENT") == 22
+        assert {e["source"] for e in events} == {"fallback"}
+
+    def test_delta_parse_not_mixed_into_fallback_events(self):
+        with patch("service.ical_fetch", side_effect=Exception("parse error")):
+            parse_feed(self._feed(), self.START, self.END, self.URL)
+        edited = self._feed(summary="Renamed")
+        events = parse_feed(edited, self.START, self.END, self.URL)
+        assert {e["source"] for e in events} == {"icalevents"}
+        assert _instants(events) == _instants(service._parse_ics(edited, self.START, self.END))
+        feed = metrics.feed_id(self.URL)
+        assert metrics.parsed_groups.value(feed=feed, kind="reused") == 0
+
+
+# ---------------------------------------------------------------------------
+# on-disk snapshots (warm restarts)
+# ---------------------------------------------------------------------------
+
+class TestSnapshots:
+    URL = "http://example.com/cal.ics"
+    START = datetime.datetime(2028, 1, 1, tzinfo=UTC)
+    END = datetime.datetime(2029, 1, 1, tzinfo=UTC)
+
+    @pytest.fixture(autouse=True)
+    def store(self, tmp_path):
+        from snapshots import SnapshotStore
+        store = SnapshotStore(str(tmp_path / "snapshots.db"), 0)
+        with patch("service.snapshots", store):
+            yield store
+
+    def _restart(self):
+        service.feed_cache.clear()
+        service.parse_cache.clear()
+
+    def test_fresh_body_served_from_disk_after_restart(self):
+        with patch("service.http.request", return_value=_response(MINIMAL_ICS, headers={"ETag": '"v1"'})):
+            fetch_feed_body(self.URL, None, None)
+        self._restart()
+        with patch("service.http.request") as mock_req:
+            assert fetch_feed_body(self.URL, None, None) == MINIMAL_ICS.encode("utf-8")
+        mock_req.assert_not_called()
+
+    def test_stale_body_revalidated_with_stored_etag(self):
+        with patch("service.http.request", return_value=_response(MINIMAL_ICS, headers={"ETag": '"v1"'})):
+            fetch_feed_body(self.URL, None, None)
+        self._restart()
+        with patch.object(service.config, "FEED_CACHE_TTL", 0):
+            with patch("service.http.request", return_value=_response(MINIMAL_ICS, status=304, headers={"ETag": '"v1"'})) as mock_req:
+                assert fetch_feed_body(self.URL, None, None) == MINIMAL_ICS.encode("utf-8")
+        assert mock_req.call_args.kwargs["headers"]["If-None-Match"] == '"v1"'
+
+    def test_parsed_events_served_from_disk_after_restart(self):
+        body = MINIMAL_ICS.encode("utf-8")
+        first = parse_feed(body, self.START, self.END)
+        self._restart()
+        with patch("service.ical_fetch") as mock_fetch:
+            second = parse_feed(body, self.START, self.END)
+        mock_fetch.assert_not_called()
+        assert second[0]["summary"] == first[0]["summary"]
+        assert second[0]["start"] == first[0]["start"]
+
+    def test_stats_include_snapshot_store(self):
+        assert "snapshot" in service.cache_stats()
+
+
+# ---------------------------------------------------------------------------
+# parsing in worker processes
+# ---------------------------------------------------------------------------
+
+class TestParseProcesses:
+    START = datetime.datetime(2020, 1, 1, tzinfo=UTC)
+    END = datetime.datetime(2035, 1, 1, tzinfo=UTC)
+
+    @pytest.fixture
+    def pool_enabled(self):
+        with patch("service.config.PARSE_PROCESSES", 1), patch("service.config.PARSE_PROCESS_BYTES", 0):
+            yield
+        if service._parse_pool is not None:
+            service._reset_parse_pool(service._parse_pool)
+
+    def test_pool_result_matches_inline_parse(self, pool_enabled):
+        body = _read_fixture("Testfile.ics").encode("utf-8")
+        inline = service._parse_ics(body, self.START, self.END)
+        pooled = service._parse_body(body, self.START, self.END)
+        assert service._parse_pool is not None
+        assert _instants(pooled) == _instants(inline)
+        assert all(isinstance(e, ParsedEvent) for e in pooled)
+
+    def test_small_bodies_parsed_inline(self):
+        with patch("service.config.PARSE_PROCESSES", 1), \
+                patch("service.config.PARSE_PROCESS_BYTES", 1024 * 1024), \
+                patch("service._get_parse_pool") as mock_pool:
+            events = service._parse_body(MINIMAL_ICS.encode("utf-8"), self.START, self.END)
+        mock_pool.assert_not_called()
+        assert len(events) == 1
+
+    def test_packed_rows_round_trip(self):
+        events = _fallback_parse(TZID_ICS)
+        rows = service._pack_events(events)
+        assert isinstance(rows[0], tuple)
+        unpacked = service._unpack_events(rows)
+        assert unpacked[0]["start"] == events[0]["start"]
+        assert unpacked[0]["summary"] == "Berlin Event"
+
+    def test_feed_defined_zone_crosses_the_pool(self, pool_enabled):
+        body = (
+            "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+            "BEGIN:VTIMEZONE\r\nTZID:Custom Zone\r\n"
+            "BEGIN:STANDARD\r\nDTSTART:19700101T030000\r\nTZOFFSETFROM:-0400\r\nTZOFFSETTO:-0500\r\n"
+            "RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU\r\nEND:STANDARD\r\n"
+            "BEGIN:DAYLIGHT\r\nDTSTART:19700101T020000\r\nTZOFFSETFROM:-0500\r\nTZOFFSETTO:-0400\r\n"
+            "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU\r\nEND:DAYLIGHT\r\nEND:VTIMEZONE\r\n"
+            "BEGIN:VEVENT\r\nUID:weekly@test\r\nDTSTART;TZID=Custom Zone:20280605T090000\r\n"
+            "DTEND;TZID=Custom Zone:20280605T100000\r\nRRULE:FREQ=WEEKLY;COUNT=3\r\n"
+            "CREATED;TZID=Custom Zone:20280101T090000\r\nSUMMARY:Weekly\r\nEND:VEVENT\r\n"
+            "BEGIN:VEVENT\r\nUID:weekly@test\r\nRECURRENCE-ID;TZID=Custom Zone:20280612T090000\r\n"
+            "DTSTART;TZID=Custom Zone:20280612T110000\r\nDTEND;TZID=Custom Zone:20280612T120000\r\n"
+            "SUMMARY:Weekly (moved)\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n"
+        ).encode("utf-8")
+        inline = service._parse_ics(body, self.START, self.END)
+        pool = service._get_parse_pool()
+        pooled = service._parse_body(body, self.START, self.END)
+        assert service._parse_pool is pool
+        assert _instants(pooled) == _instants(inline)
+        moved = [e for e in pooled if e["summary"] == "Weekly (moved)"]
+        expected = [e for e in inline if e["summary"] == "Weekly (moved)"]
+        assert moved[0]["recurrence_id"].isoformat() == expected[0]["recurrence_id"].isoformat()
+
+    def test_packed_rows_hold_no_timezones(self):
+        berlin = pytz.timezone("Europe/Berlin")
+        ev = _make_event("Dates", datetime.datetime(2028, 6, 1, 9, tzinfo=UTC), datetime.datetime(2028, 6, 1, 10, tzinfo=UTC),
+                         created=berlin.localize(datetime.datetime(2028, 1, 2, 3, 4)),
+                         last_modified=datetime.datetime(2028, 1, 2, 3, 4), recurrence_id=datetime.date(2028, 6, 1))
+        row = service._pack_events([ev])[0]
+        assert not any(isinstance(v, (datetime.date, datetime.tzinfo)) for v in row)
+        unpacked = service._unpack_events([row])[0]
+        assert unpacked["created"] == ev["created"]
+        assert unpacked["created"].isoformat() == "2028-01-02T03:04:00+01:00"
+        assert unpacked["last_modified"] == datetime.datetime(2028, 1, 2, 3, 4)
+        assert unpacked["recurrence_id"] == datetime.date(2028, 6, 1)
+
+    def test_broken_pool_falls_back_inline(self, pool_enabled):
+        from concurrent.futures.process import BrokenProcessPool
+        broken = MagicMock()
+        broken.submit.side_effect = BrokenProcessPool("worker died")
+        with patch("service._get_parse_pool", return_value=broken):
+            events = service._parse_body(MINIMAL_ICS.encode("utf-8"), self.START, self.END)
+        assert len(events) == 1
+        broken.shutdown.assert_called_once()
+
+
+# ---------------------------------------------------------------------------
+# fetch_raw_events (single-flight coalescing)
+# ---------------------------------------------------------------------------
+
+class TestFetchCoalescing:
+    def test_concurrent_fetches_share_one_download(self):
+        now = datetime.datetime(2028, 1, 1, tzinfo=UTC)
+        end = now + datetime.timedelta(days=365)
+        mock_resp = _response(MINIMAL_ICS)
+
+        def slow_request(*args, **kwargs):
+            time.sleep(0.1)
+            return mock_resp
+
+        results = []
+
+        def worker():
+            results.append(fetch_raw_events("http://example.com/cal.ics", now, end, None, None))
+
+        with patch("service.http.request", side_effect=slow_request) as mock_req:
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        assert mock_req.call_count == 1
+        assert len(results) == 4
+        assert all(r is results[0] for r in results)
+
+
+# ---------------------------------------------------------------------------
+# fetch_lazy_events (limit-bounded recurrence expansion)
+# ---------------------------------------------------------------------------
+
+DAILY_ICS = """\
+BEGIN:VCALENDAR
+VERSION:2.0
+BEGIN:VEVENT
+UID:daily@test
+SUMMARY:Daily
+DTSTART:20280101T090000Z
+DTEND:20280101T091500Z
+RRULE:FREQ=DAILY
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+class TestFetchLazyEvents:
+    NOW = datetime.datetime(2028, 6, 15, 12, 0, tzinfo=UTC)
+
+    def _fetch(self, text, limit):
+        mock_resp = _response(text)
+        start = self.NOW - datetime.timedelta(days=14)
+        end = self.NOW + datetime.timedelta(days=3650)
+        with patch("service.http.request", return_value=mock_resp):
+            return fetch_lazy_events("http://example.com/cal.ics", start, end, self.NOW, limit, None, None)
+
+    def test_expansion_bounded_by_limit(self):
+        events = self._fetch(DAILY_ICS, 5)
+        assert len([e for e in events if e["start"] > self.NOW]) == 5
+        assert len(events) < 30
+        assert all(e["source"] == "lazy" for e in events)
+
+    def test_series_index_cached_per_body(self):
+        with patch("service.recurrence.build_index", wraps=service.recurrence.build_index) as mock_build:
+            self._fetch(DAILY_ICS, 5)
+            self._fetch(DAILY_ICS, 3)
+        assert mock_build.call_count == 1
+
+    def test_falls_back_to_full_parse(self):
+        with patch("service.recurrence.build_index", side_effect=ValueError("broken")):
+            events = self._fetch(MINIMAL_ICS, 5)
+        assert [e["summary"] for e in events] == ["Minimal Event"]
+
+    def test_concurrent_expansions_coalesced(self):
+        mock_resp = _response(DAILY_ICS)
+        start = self.NOW - datetime.timedelta(days=14)
+        end = self.NOW + datetime.timedelta(days=3650)
+        expand = service.recurrence.expand
+
+        def slow_expand(*args, **kwargs):
+            time.sleep(0.1)
+            return expand(*args, **kwargs)
+
+        results = []
+
+        def worker():
+            results.append(fetch_lazy_events("http://example.com/cal.ics", start, end, self.NOW, 5, None, None))
+
+        with patch("service.http.request", return_value=mock_resp) as mock_request, \
+                patch("service.recurrence.expand", side_effect=slow_expand) as mock_expand:
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        assert mock_request.call_count == 1
+        assert mock_expand.call_count == 1
+        assert len(results) == 4
+        assert all(r is results[0] for r in results)
+
+    def test_lazy_and_full_not_coalesced(self):
+        start = self.NOW - datetime.timedelta(days=14)
+        end = self.NOW + datetime.timedelta(days=3650)
+        with patch("service.inflight.do", wraps=service.inflight.do) as mock_do:
+            self._fetch(DAILY_ICS, 5)
+            with patch("service.http.request", side_effect=AssertionError("cached")):
+                fetch_raw_events("http://example.com/cal.ics", start, end, None, None)
+        lazy_key, full_key = (c[0][0] for c in mock_do.call_args_list)
+        assert lazy_key[:-2] == full_key
+        assert lazy_key[-2:] == ("lazy", 5)
+
+    def test_get_events_lazy_matches_full(self):
+        mock_resp = _response(DAILY_ICS)
+        kwargs = dict(lookback_days=14, horizon_days=3650, limit=4, username=None, password=None)
+        with patch("service.http.request", return_value=mock_resp):
+            full = get_events("http://example.com/cal.ics", **kwargs)
+            lazy = get_events("http://example.com/cal.ics", expand="lazy", **kwargs)
+        assert [(e["start"], e["end"]) for e in lazy] == [(e["start"], e["end"]) for e in full]
+
+
 # ---------------------------------------------------------------------------
 # get_events (end-to-end with mocked HTTP)
 # ---------------------------------------------------------------------------
@@ -549,8 +1252,7 @@ class TestFetchRawEvents:
 class TestGetEvents:
     def test_returns_list(self):
         text = _read_fixture("TestfileSimple.ics")
-        mock_resp = MagicMock()
-        mock_resp.data = text.encode("utf-8")
+        mock_resp = _response(text)
         with patch("service.http.request", return_value=mock_resp):
             result = get_events(
                 "http://example.com/cal.ics",
@@ -564,8 +1266,7 @@ class TestGetEvents:
 
     def test_limit_respected(self):
         text = _read_fixture("Testfile.ics")
-        mock_resp = MagicMock()
-        mock_resp.data = text.encode("utf-8")
+        mock_resp = _response(text)
         with patch("service.http.request", return_value=mock_resp):
             result = get_events(
                 "http://example.com/cal.ics",
@@ -579,8 +1280,7 @@ class TestGetEvents:
 
     def test_no_start_dt_or_end_dt_in_output(self):
         text = _read_fixture("TestfileSimple.ics")
-        mock_resp = MagicMock()
-        mock_resp.data = text.encode("utf-8")
+        mock_resp = _response(text)
         with patch("service.http.request", return_value=mock_resp):
             result = get_events(
                 "http://example.com/cal.ics",
@@ -593,3 +1293,150 @@ class TestGetEvents:
         for ev in result:
             assert "start_dt" not in ev
             assert "end_dt" not in ev
+
+    def test_tz_sets_output_offset(self):
+        mock_resp = _response(_future_ics("tz@test", "Call", 1))
+        with patch("service.http.request", return_value=mock_resp):
+            result = get_events(
+                "http://example.com/cal.ics",
+                lookback_days=14,
+                horizon_days=3650,
+                limit=None,
+                username=None,
+                password=None,
+                tz="Asia/Kolkata",
+            )
+        assert result[0]["start"].endswith("+05:30")
+
+    def test_fields_limit_output(self):
+        text = _read_fixture("Testfile.ics")
+        mock_resp = _response(text)
+        with patch("service.http.request", return_value=mock_resp):
+            result = get_events(
+                "http://example.com/cal.ics",
+                lookback_days=14,
+                horizon_days=3650,
+                limit=3,
+                username=None,
+                password=None,
+                fields=("name", "start"),
+            )
+        assert result
+        assert all(set(ev) == {"name", "start"} for ev in result)
+
+    def test_unknown_tz_raises(self):
+        with pytest.raises(ValueError):
+            get_events("http://example.com/cal.ics", 14, 3650, None, None, None, tz="Nowhere/Else")
+
+
+# ---------------------------------------------------------------------------
+# absolute_payload (relative=0)
+# ---------------------------------------------------------------------------
+
+class TestAbsolutePayload:
+    NOW = datetime.datetime(2028, 6, 15, 12, 0, tzinfo=pytz.utc)
+
+    def _event(self, start_hours, end_hours):
+        start = self.NOW + datetime.timedelta(hours=start_hours)
+        end = self.NOW + datetime.timedelta(hours=end_hours)
+        return {"start": start.isoformat(), "end": end.isoformat()}
+
+    def test_valid_until_next_start_or_end(self):
+        events = [self._event(-1, 3), self._event(2, 4), self._event(5, 6)]
+        payload = absolute_payload(events, self.NOW, "UTC")
+        assert payload["events"] is events
+        assert payload["generatedAt"] == "2028-06-15T12:00:00+00:00"
+        assert payload["validUntil"] == "2028-06-15T14:00:00+00:00"
+
+    def test_ongoing_event_ending_first(self):
+        payload = absolute_payload([self._event(-1, 1), self._event(2, 3)], self.NOW, "UTC")
+        assert payload["validUntil"] == "2028-06-15T13:00:00+00:00"
+
+    def test_offsets_compared_as_instants(self):
+        events = [self._event(2, 3)]
+        events[0]["start"] = (self.NOW + datetime.timedelta(hours=2)).astimezone(pytz.timezone("Asia/Kolkata")).isoformat()
+        payload = absolute_payload(events, self.NOW, "Asia/Kolkata")
+        assert payload["generatedAt"] == "2028-06-15T17:30:00+05:30"
+        assert datetime.datetime.fromisoformat(payload["validUntil"]) == self.NOW + datetime.timedelta(hours=2)
+
+    def test_nothing_left_to_change(self):
+        assert absolute_payload([], self.NOW, "UTC")["validUntil"] is None
+
+
+# ---------------------------------------------------------------------------
+# get_merged_events (several feeds, fetched concurrently)
+# ---------------------------------------------------------------------------
+
+def _future_ics(uid: str, summary: str, days_ahead: int) -> str:
+    start = datetime.datetime.now(UTC) + datetime.timedelta(days=days_ahead)
+    end = start + datetime.timedelta(hours=1)
+    return (
+        "BEGIN:VCALENDAR\nVERSION:2.0\nBEGIN:VEVENT\n"
+        f"UID:{uid}\nSUMMARY:{summary}\n"
+        f"DTSTART:{start:%Y%m%dT%H%M%SZ}\nDTEND:{end:%Y%m%dT%H%M%SZ}\n"
+        "END:VEVENT\nEND:VCALENDAR\n"
+    )
+
+
+class TestGetMergedEvents:
+    FEEDS = {
+        "http://example.com/a.ics": _future_ics("a@test", "Team A", 2),
+        "http://example.com/b.ics": _future_ics("b@test", "Team B", 1),
+    }
+
+    def _request(self, method, url, **kwargs):
+        if url not in self.FEEDS:
+            raise ConnectionError(url)
+        return _response(self.FEEDS[url])
+
+    def _merged(self, feeds, limit=None):
+        with patch("service.http.request", side_effect=self._request):
+            return get_merged_events(feeds, lookback_days=14, horizon_days=30, limit=limit)
+
+    def test_events_merged_in_start_order_and_tagged(self):
+        feeds = [
+            FeedSpec(url="http://example.com/a.ics", label="A"),
+            FeedSpec(url="http://example.com/b.ics"),
+        ]
+        result = self._merged(feeds)
+        assert [e["name"] for e in result] == ["Team B", "Team A"]
+        assert [e["feed"] for e in result] == [1, 0]
+        assert [e["feedLabel"] for e in result] == [None, "A"]
+        assert all("start_dt" not in e for e in result)
+
+    def test_limit_applies_to_merged_list(self):
+        feeds = [FeedSpec(url=u) for u in self.FEEDS]
+        result = self._merged(feeds, limit=1)
+        assert [e["name"] for e in result] == ["Team B"]
+
+    def test_failing_feed_is_skipped(self):
+        feeds = [FeedSpec(url="http://example.com/a.ics"), FeedSpec(url="http://down.example.com/x.ics")]
+        result = self._merged(feeds)
+        assert [e["name"] for e in result] == ["Team A"]
+
+    def test_all_feeds_failing_raises(self):
+        feeds = [FeedSpec(url="http://down.example.com/x.ics"), FeedSpec(url="http://down.example.com/y.ics")]
+        with pytest.raises(ConnectionError):
+            self._merged(feeds)
+
+    def test_feeds_fetched_concurrently(self):
+        def slow(method, url, **kwargs):
+            time.sleep(0.2)
+            return self._request(method, url, **kwargs)
+
+        feeds = [FeedSpec(url=u) for u in self.FEEDS]
+        started = time.monotonic()
+        with patch("service.http.request", side_effect=slow):
+            get_merged_events(feeds, lookback_days=14, horizon_days=30, limit=None)
+        assert time.monotonic() - started < 0.35
+
+    def test_per_feed_credentials_used(self):
+        feeds = [
+            FeedSpec(url="http://example.com/a.ics", username="alice", password="one"),
+            FeedSpec(url="http://example.com/b.ics"),
+        ]
+        with patch("service.http.request", side_effect=self._request) as mock_req:
+            get_merged_events(feeds, lookback_days=14, horizon_days=30, limit=None)
+        headers_by_url = {c.args[1]: c.kwargs["headers"] for c in mock_req.call_args_list}
+        assert "authorization" in headers_by_url["http://example.com/a.ics"]
+        assert "authorization" not in headers_by_url["http://example.com/b.ics"]
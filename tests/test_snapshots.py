@@ -0,0 +1,127 @@
+import datetime
+import json
+import os
+import pickle
+import sqlite3
+import time
+
+import pytest
+import pytz
+
+from cache import FeedEntry
+from snapshots import SnapshotStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / "snapshots.db"), max_bytes=0)
+
+
+class TestFeeds:
+    def test_round_trip(self, store):
+        store.save_feed(("u", "i"), FeedEntry(b"BEGIN:VCALENDAR", '"v1"', "Mon, 01 Jan 2028", time.monotonic()))
+        entry = store.load_feed(("u", "i"))
+        assert entry.body == b"BEGIN:VCALENDAR"
+        assert entry.etag == '"v1"'
+        assert entry.last_modified == "Mon, 01 Jan 2028"
+
+    def test_missing_key(self, store):
+        assert store.load_feed(("u", "i")) is None
+        assert store.stats()["misses"] == 1
+
+    def test_age_survives_reload(self, store):
+        store.save_feed("k", FeedEntry(b"x", None, None, time.monotonic() - 120))
+        entry = store.load_feed("k")
+        assert 119 < time.monotonic() - entry.fetched_at < 125
+
+    def test_touch_resets_age(self, store):
+        store.save_feed("k", FeedEntry(b"x", None, None, time.monotonic() - 120))
+        store.touch_feed("k")
+        assert time.monotonic() - store.load_feed("k").fetched_at < 5
+
+    def test_shared_between_instances(self, tmp_path):
+        path = str(tmp_path / "shared.db")
+        SnapshotStore(path, 0).save_feed("k", FeedEntry(b"body", None, None, time.monotonic()))
+        assert SnapshotStore(path, 0).load_feed("k").body == b"body"
+
+    def test_url_not_stored_in_plain_text(self, store):
+        store.save_feed(("https://example.com/cal.ics?token=secret", "anon"), FeedEntry(b"x", None, None, time.monotonic()))
+        with open(store.path, "rb") as f:
+            raw = f.read()
+        wal = store.path + "-wal"
+        if os.path.exists(wal):
+            with open(wal, "rb") as f:
+                raw += f.read()
+        assert b"secret" not in raw
+
+
+class TestParsed:
+    def test_round_trip(self, store):
+        store.save_parsed(("hash", 1, 2), [("Summary", 1.0, 2.0)])
+        assert store.load_parsed(("hash", 1, 2)) == [("Summary", 1.0, 2.0)]
+
+    def test_dates_round_trip(self, store):
+        created = pytz.timezone("Europe/Berlin").localize(datetime.datetime(2028, 1, 2, 3, 4, 5))
+        row = ("Summary", None, True, created, datetime.datetime(2028, 1, 2, 3, 4), datetime.date(2028, 1, 2))
+        store.save_parsed("k", [row])
+        loaded = store.load_parsed("k")[0]
+        assert loaded == row
+        assert loaded[3].utcoffset() == datetime.timedelta(hours=1)
+
+    def test_stored_as_json(self, store):
+        store.save_parsed("k", [("Summary", datetime.datetime(2028, 1, 2, tzinfo=pytz.utc))])
+        data = sqlite3.connect(store.path).execute("SELECT data FROM snapshots").fetchone()[0]
+        assert json.loads(data) == [["Summary", {"datetime": "2028-01-02T00:00:00+00:00"}]]
+
+    def test_unsupported_value_not_stored(self, store):
+        store.save_parsed("k", [(object(),)])
+        assert store.stats()["entries"] == 0
+        assert store.stats()["errors"] == 1
+
+    def test_pickle_is_a_miss(self, store):
+        store.save_parsed("k", [("x",)])
+        conn = sqlite3.connect(store.path)
+        conn.execute("UPDATE snapshots SET data = ?", (pickle.dumps([("x",)]),))
+        conn.commit()
+        conn.close()
+        assert store.load_parsed("k") is None
+        assert store.stats()["errors"] == 1
+
+    def test_corrupt_value_is_a_miss(self, store):
+        store.save_parsed("k", [1])
+        conn = sqlite3.connect(store.path)
+        conn.execute("UPDATE snapshots SET data = ?", (b"not a pickle",))
+        conn.commit()
+        conn.close()
+        assert store.load_parsed("k") is None
+        assert store.stats()["errors"] == 1
+
+
+class TestEviction:
+    def test_least_recently_used_evicted_over_budget(self, tmp_path):
+        store = SnapshotStore(str(tmp_path / "small.db"), max_bytes=250)
+        for name in ("a", "b"):
+            store.save_feed(name, FeedEntry(b"x" * 100, None, None, time.monotonic()))
+            time.sleep(0.01)
+        store.load_feed("a")
+        time.sleep(0.01)
+        store.save_feed("c", FeedEntry(b"x" * 100, None, None, time.monotonic()))
+        assert store.load_feed("b") is None
+        assert store.load_feed("a") is not None
+        assert store.load_feed("c") is not None
+        assert store.stats()["bytes"] <= 250
+
+    def test_oversized_value_not_stored(self, tmp_path):
+        store = SnapshotStore(str(tmp_path / "small.db"), max_bytes=10)
+        store.save_feed("k", FeedEntry(b"x" * 100, None, None, time.monotonic()))
+        assert store.stats()["entries"] == 0
+
+
+class TestErrors:
+    def test_unusable_path_is_logged_not_raised(self, tmp_path):
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+        store = SnapshotStore(str(blocker / "snapshots.db"), 0)
+        store.save_feed("k", FeedEntry(b"x", None, None, time.monotonic()))
+        assert store.load_feed("k") is None
+        assert store.stats()["errors"] == 3
@@ -0,0 +1,98 @@
+import datetime
+from unittest.mock import patch
+
+import pytest
+import pytz
+
+import timezones
+from timezones import WINDOWS_ZONES, UnknownTimezone, display_zone, from_vtimezone, localize, resolve
+
+CUSTOM_VTIMEZONE = """\
+BEGIN:VTIMEZONE
+TZID:Custom Office Time
+BEGIN:STANDARD
+DTSTART:19701025T030000
+TZOFFSETFROM:+0200
+TZOFFSETTO:+0100
+RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU
+END:STANDARD
+BEGIN:DAYLIGHT
+DTSTART:19700329T020000
+TZOFFSETFROM:+0100
+TZOFFSETTO:+0200
+RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU
+END:DAYLIGHT
+END:VTIMEZONE
+"""
+
+
+class TestResolve:
+    def test_iana_name(self):
+        assert resolve("Europe/Berlin").zone == "Europe/Berlin"
+
+    def test_quoted_name(self):
+        assert resolve('"Europe/Berlin"').zone == "Europe/Berlin"
+
+    @pytest.mark.parametrize("windows_name", sorted(WINDOWS_ZONES))
+    def test_every_windows_zone_resolves(self, windows_name):
+        assert resolve(windows_name) is not None
+
+    def test_windows_name(self):
+        assert resolve("W. Europe Standard Time").zone == "Europe/Berlin"
+
+    def test_vendor_prefix(self):
+        assert resolve("/citadel.org/20190914_1/Europe/Berlin").zone == "Europe/Berlin"
+
+    def test_unknown_returns_none(self):
+        assert resolve("Custom Office Time") is None
+        assert resolve("") is None
+        assert resolve(None) is None
+
+    def test_results_are_cached(self):
+        resolve.cache_clear()
+        with patch("timezones.pytz.timezone", wraps=pytz.timezone) as spy:
+            resolve("Europe/Paris")
+            resolve("Europe/Paris")
+        assert spy.call_count == 1
+
+
+class TestFromVtimezone:
+    def test_custom_zone_follows_dst(self):
+        tz = from_vtimezone(CUSTOM_VTIMEZONE.splitlines())
+        winter = localize(datetime.datetime(2028, 1, 15, 10, 0), tz)
+        summer = localize(datetime.datetime(2028, 6, 15, 10, 0), tz)
+        assert winter.utcoffset() == datetime.timedelta(hours=1)
+        assert summer.utcoffset() == datetime.timedelta(hours=2)
+
+    def test_invalid_block_returns_none(self):
+        assert from_vtimezone(["BEGIN:VTIMEZONE", "END:VEVENT"]) is None
+
+
+class TestLocalize:
+    def test_naive_without_zone_is_utc(self):
+        assert localize(datetime.datetime(2028, 6, 15, 10), None).tzinfo is pytz.utc
+
+    def test_pytz_zone_uses_correct_offset(self):
+        dt = localize(datetime.datetime(2028, 6, 15, 10), pytz.timezone("Europe/Berlin"))
+        assert dt.utcoffset() == datetime.timedelta(hours=2)
+
+    def test_aware_value_is_kept(self):
+        dt = datetime.datetime(2028, 6, 15, 10, tzinfo=pytz.utc)
+        assert localize(dt, pytz.timezone("Europe/Berlin")) is dt
+
+
+class TestDisplayZone:
+    def test_named_zone(self):
+        assert display_zone("America/New_York").zone == "America/New_York"
+
+    def test_unknown_zone_raises(self):
+        with pytest.raises(UnknownTimezone):
+            display_zone("Mars/Olympus_Mons")
+
+    def test_default_from_config(self):
+        timezones.default_zone.cache_clear()
+        try:
+            with patch("timezones.config.DISPLAY_TZ", "Asia/Tokyo"):
+                assert display_zone(None).zone == "Asia/Tokyo"
+        finally:
+            timezones.default_zone.cache_clear()
@@ -0,0 +1,68 @@
+import threading
+
+import timing
+from metrics import Histogram
+from timing import RequestTimings, bind, collect, measure, profile_call
+
+
+class TestRequestTimings:
+    def test_header(self):
+        t = RequestTimings()
+        t.add("fetch", 0.0125)
+        t.add("parse", 0.002)
+        t.add("parse", 0.001)
+        t.note("parse", "icalevents")
+        t.note("parse", "fallback")
+        t.note("cache", "hit")
+        assert t.header() == 'fetch;dur=12.5, parse;dur=3.0;desc="icalevents,fallback", cache;desc="hit"'
+
+    def test_milliseconds(self):
+        t = RequestTimings()
+        t.add("select", 0.25)
+        assert t.milliseconds() == {"select": 250.0}
+
+
+class TestCollect:
+    def test_measure_records_in_current_request(self):
+        h = Histogram("t_seconds", "Time.")
+        with collect() as t:
+            with measure("serialize", h):
+                pass
+        assert "serialize" in t.durations
+        assert h.count() == 1
+
+    def test_nothing_recorded_outside_a_request(self):
+        h = Histogram("t_seconds", "Time.")
+        with measure("serialize", h):
+            pass
+        assert timing.current() is None
+        assert h.count() == 1
+
+    def test_bind_carries_request_to_other_threads(self):
+        h = Histogram("t_seconds", "Time.")
+
+        def work():
+            with measure("parse", h):
+                timing.note("parse", "fallback")
+
+        with collect() as t:
+            thread = threading.Thread(target=bind(work))
+            thread.start()
+            thread.join()
+        assert "parse" in t.durations
+        assert t.notes == {"parse": ["fallback"]}
+
+
+class TestProfileCall:
+    def test_returns_result_and_functions(self):
+        def inner():
+            return sum(range(1000))
+
+        def outer():
+            return inner()
+
+        result, functions = profile_call(outer, top=5)
+        assert result == sum(range(1000))
+        assert len(functions) <= 5
+        assert any("outer" in f["function"] for f in functions)
+        assert {"function", "calls", "ownMs", "cumulativeMs"} == set(functions[0])
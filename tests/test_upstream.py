@@ -0,0 +1,111 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+
+import upstream
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.startswith("/hop/"):
+            left = int(self.path.rsplit("/", 1)[1])
+            self.send_response(302)
+            self.send_header("Location", "/hop/{0}".format(left - 1) if left > 1 else "/feed.ics")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path == "/busy":
+            self.send_response(503)
+            self.send_header("Retry-After", "30")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header("Content-Length", "15")
+            self.end_headers()
+            self.wfile.write(b"BEGIN:VCALENDAR")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{0}".format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class TestBuildPoolManager:
+    def test_pool_settings_from_config(self):
+        with patch("upstream.config.UPSTREAM_POOL_MAXSIZE", 25), \
+                patch("upstream.config.UPSTREAM_POOL_BLOCK", True), \
+                patch("upstream.config.UPSTREAM_NUM_POOLS", 7):
+            manager = upstream.build_pool_manager()
+        assert manager.connection_pool_kw["maxsize"] == 25
+        assert manager.connection_pool_kw["block"] is True
+        assert manager.pools._maxsize == 7
+
+    def test_retries_and_timeouts(self):
+        with patch("upstream.config.UPSTREAM_RETRIES", 4), \
+                patch("upstream.config.UPSTREAM_CONNECT_TIMEOUT", 2.5), \
+                patch("upstream.config.UPSTREAM_READ_TIMEOUT", 30):
+            manager = upstream.build_pool_manager()
+        retries = manager.connection_pool_kw["retries"]
+        timeout = manager.connection_pool_kw["timeout"]
+        assert (retries.connect, retries.read, retries.status) == (4, 4, 4)
+        assert retries.retry_after_max == 30
+        assert 503 in retries.status_forcelist
+        assert retries.raise_on_status is False
+        assert timeout.connect_timeout == 2.5
+        assert timeout.read_timeout == 30
+
+    def test_redirects_followed_without_retries(self, server):
+        with patch("upstream.config.UPSTREAM_RETRIES", 0):
+            manager = upstream.build_pool_manager()
+        resp = manager.request("GET", server + "/hop/1")
+        assert (resp.status, resp.data) == (200, b"BEGIN:VCALENDAR")
+
+    def test_redirect_chain_not_limited_by_retries(self, server):
+        with patch("upstream.config.UPSTREAM_RETRIES", 1):
+            manager = upstream.build_pool_manager()
+        assert manager.request("GET", server + "/hop/3").status == 200
+
+    def test_retry_after_capped(self, server):
+        with patch("upstream.config.UPSTREAM_RETRIES", 1), \
+                patch("upstream.config.UPSTREAM_BACKOFF", 0), \
+                patch("upstream.config.UPSTREAM_READ_TIMEOUT", 1):
+            manager = upstream.build_pool_manager()
+        started = time.monotonic()
+        assert manager.request("GET", server + "/busy").status == 503
+        assert time.monotonic() - started < 5
+
+    def test_http2_without_h2_keeps_http11(self):
+        with patch("urllib3.http2.inject_into_urllib3", side_effect=ImportError("no h2")):
+            assert upstream.enable_http2() is False
+            with patch("upstream.config.UPSTREAM_HTTP2", True):
+                assert upstream.build_pool_manager() is not None
+
+
+class TestRequestHeaders:
+    def test_accept_encoding_always_sent(self):
+        headers = upstream.request_headers(None, None)
+        assert headers == {"Accept-Encoding": upstream.ACCEPT_ENCODING}
+        assert upstream.ACCEPT_ENCODING.startswith("gzip")
+
+    def test_brotli_offered_only_when_available(self):
+        assert ("br" in upstream.ACCEPT_ENCODING) == upstream.HAS_BROTLI
+
+    def test_basic_auth(self):
+        headers = upstream.request_headers("alice", "secret")
+        assert headers["authorization"].startswith("Basic ")
+
+    def test_auth_needs_both_parts(self):
+        assert "authorization" not in upstream.request_headers("alice", None)